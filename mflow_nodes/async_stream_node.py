@@ -0,0 +1,309 @@
+import asyncio
+import copy
+import os
+from logging import getLogger
+
+import zmq
+import zmq.asyncio
+
+from mflow_nodes import config
+from mflow_nodes.rest_api.async_rest_server import serve_web_interface
+from mflow_nodes.rest_api.rest_server import RestInterfacedProcess
+from mflow_nodes.stream_tools.mflow_message import get_passthrough_mflow_message, MessageDispatcher, \
+    ReceiveStatistics
+from mflow_nodes.stream_tools.shared_statistics import SharedStatisticsBuffer
+
+_logger = getLogger(__name__)
+
+
+def start_async_stream_node(instance_name, processor, processor_parameters=None,
+                            connection_address=None, control_host=None, control_port=None,
+                            start_node_immediately=False, receive_raw=False, queue_size=None):
+    """
+    Start the ZMQ processing node in a single asyncio event loop.
+    The receiving, processing, parameter updates and the REST api all run in the current process and thread.
+    :param instance_name: Name of the processor instance. Used for the REST api path.
+    :param processor: Stream mflow_processor that does the actual work on the stream data.
+    :param processor_parameters: Initial parameters to set on the processor.
+    :param connection_address: Fully qualified ZMQ stream connection address. Default: "tcp://127.0.0.1:40000"
+    :param control_host: Binding host for the control REST API.
+    :param control_port: Binding port for the control REST API.
+    :param start_node_immediately: If true, the processor will be started at node startup.
+    :param receive_raw: Pass the raw ZMQ messages to the mflow_processor.
+    :param queue_size: ZMQ queue size.
+    :return: None
+    """
+    connection_address = connection_address or config.DEFAULT_CONNECT_ADDRESS
+    control_host = control_host or config.DEFAULT_REST_HOST
+    control_port = control_port or config.DEFAULT_REST_PORT
+
+    _logger.debug("Async node set to connect to '%s', with control address '%s:%s'." % (connection_address,
+                                                                                        control_host,
+                                                                                        control_port))
+
+    asyncio.run(run_async_stream_node(instance_name=instance_name,
+                                      node_manager=AsyncNodeManager(processor=processor,
+                                                                    connection_address=connection_address,
+                                                                    initial_parameters=processor_parameters,
+                                                                    receive_raw=receive_raw,
+                                                                    queue_size=queue_size),
+                                      control_host=control_host,
+                                      control_port=control_port,
+                                      start_node_immediately=start_node_immediately))
+
+
+async def run_async_stream_node(instance_name, node_manager, control_host, control_port, start_node_immediately):
+    """
+    Run the node and its REST api until the task is cancelled (for example with Ctrl+C).
+    :param instance_name: Name of the processor instance. Used for the REST api path.
+    :param node_manager: AsyncNodeManager to run.
+    :param control_host: Binding host for the control REST API.
+    :param control_port: Binding port for the control REST API.
+    :param start_node_immediately: If true, the processor will be started at node startup.
+    """
+    if start_node_immediately:
+        # Exceptions at startup are not caught on purpose, like in the process node.
+        await node_manager.start()
+
+    server = await serve_web_interface(process=node_manager, instance_name=instance_name,
+                                       host=control_host, port=control_port)
+
+    try:
+        # Serve until cancelled.
+        await asyncio.Event().wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await node_manager.stop()
+        node_manager.close()
+
+
+class AsyncNodeManager(RestInterfacedProcess):
+    """
+    Run the processor on the stream received with an asyncio ZMQ socket.
+
+    Compared to the NodeManager, there is no processor process: start and stop only create and cancel the node task,
+    and parameters are set directly on the processor. The processor runs in the event loop, so the REST api is
+    served between messages (or batches).
+    """
+
+    def __init__(self, processor, connection_address, initial_parameters=None, receive_raw=False, queue_size=None):
+        """
+        Constructor.
+        :param processor: Processor to run on the stream.
+        :param connection_address: Fully qualified ZMQ stream connection address.
+        :param initial_parameters: Initial parameters to set on the processor.
+        :param receive_raw: Pass the raw ZMQ messages to the processor.
+        :param queue_size: ZMQ queue size.
+        """
+        self.processor_instance = processor
+        self.connection_address = connection_address
+        self.receive_raw = receive_raw
+        self.queue_size = queue_size or config.DEFAULT_ZMQ_QUEUE_LENGTH
+
+        self.initial_parameters = initial_parameters or {}
+        self.current_parameters = copy.deepcopy(self.initial_parameters)
+
+        self.statistics = SharedStatisticsBuffer(config.DEFAULT_STATISTICS_BUFFER_LENGTH)
+        self.context = zmq.asyncio.Context(io_threads=config.ZMQ_IO_THREADS)
+        self._node_task = None
+
+        # Process parameters.
+        self.n_messages = None
+        self.disable_processing = False
+        self.batch_size = config.DEFAULT_BATCH_SIZE
+        self.batch_window = config.DEFAULT_BATCH_WINDOW
+
+        self._process_name = getattr(self.processor_instance, "__name__",
+                                     self.processor_instance.__class__.__name__)
+
+    def is_running(self):
+        return self._node_task is not None and not self._node_task.done()
+
+    async def start(self):
+        """
+        Start the processor and the node task.
+        """
+        await self.stop()
+
+        _logger.debug("Starting node.")
+
+        self.statistics.reset()
+        self.set_parameters(self.current_parameters)
+        self.processor_instance.start()
+
+        socket = self.context.socket(zmq.PULL)
+        socket.set_hwm(self.queue_size)
+        socket.connect(self.connection_address)
+
+        self._node_task = asyncio.ensure_future(self._run_node(socket))
+
+    async def stop(self):
+        """
+        Cancel the node task, and wait for the processor to stop.
+        """
+        if self._node_task is None:
+            return
+
+        _logger.debug("Stopping node.")
+
+        self._node_task.cancel()
+
+        try:
+            await self._node_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            _logger.error(e)
+
+        self._node_task = None
+
+    async def _receive_message(self, socket, receive_statistics, dispatcher):
+        """
+        Receive the next message and wrap it with its handler.
+        :return MflowMessage or None if no handler is available.
+        """
+        frames = await socket.recv_multipart(copy=False)
+        receive_statistics.update(sum(len(frame) for frame in frames))
+
+        return get_passthrough_mflow_message(frames, receive_statistics, dispatcher=dispatcher)
+
+    async def _receive_batch(self, socket, receive_statistics, dispatcher, max_batch_size):
+        """
+        Collect up to max_batch_size messages, waiting at most batch_window milliseconds after the first one.
+        """
+        loop = asyncio.get_running_loop()
+        messages = []
+
+        message = await self._receive_message(socket, receive_statistics, dispatcher)
+        if message is not None:
+            messages.append(message)
+
+        batch_end_time = loop.time() + self.batch_window / 1000
+
+        while len(messages) < max_batch_size:
+            remaining_time = batch_end_time - loop.time()
+            if remaining_time <= 0 or not await socket.poll(remaining_time * 1000, zmq.POLLIN):
+                break
+
+            message = await self._receive_message(socket, receive_statistics, dispatcher)
+            if message is not None:
+                messages.append(message)
+
+        return messages
+
+    async def _run_node(self, socket):
+        receive_statistics = ReceiveStatistics()
+        dispatcher = MessageDispatcher(self.receive_raw)
+        total_messages = 0
+
+        try:
+            while self.processor_instance.is_running():
+                # Do not collect more messages than needed to reach n_messages.
+                max_batch_size = min(self.batch_size, self.n_messages - total_messages) \
+                    if self.n_messages else self.batch_size
+                messages = await self._receive_batch(socket, receive_statistics, dispatcher, max_batch_size)
+
+                if not messages or self.disable_processing:
+                    continue
+
+                if len(messages) > 1:
+                    self.processor_instance.process_messages(messages)
+                else:
+                    self.processor_instance.process_message(messages[0])
+
+                total_messages += len(messages)
+                self.statistics.save_statistics(receive_statistics, len(messages))
+
+                if self.n_messages and total_messages >= self.n_messages:
+                    _logger.info("Received %d frames. Stopping.", total_messages)
+                    break
+
+                # Let the REST api and the other tasks run between batches.
+                await asyncio.sleep(0)
+
+        finally:
+            socket.close(linger=0)
+            self.statistics.flush()
+            self.processor_instance.stop()
+
+    def set_parameters(self, parameters):
+        """
+        Set the parameters directly on the node (process parameters) or on the processor.
+        :param parameters: Dictionary of parameters.
+        """
+        for parameter_name, parameter_value in parameters.items():
+            self.current_parameters[parameter_name] = parameter_value
+
+            if parameter_name in config.PROCESS_PARAMETERS:
+                self._set_process_parameter(parameter_name, parameter_value)
+            else:
+                self.processor_instance.set_parameter((parameter_name, parameter_value))
+
+    def _set_process_parameter(self, parameter_name, parameter_value):
+        _logger.debug("Update process parameter '%s'='%s'", parameter_name, parameter_value)
+
+        # The node and the REST api run in the same process, so the UID and GID apply to both.
+        if parameter_name == config.PARAMETER_PROCESS_GID:
+            if parameter_value is not None:
+                os.setgid(parameter_value)
+
+        elif parameter_name == config.PARAMETER_PROCESS_UID:
+            if parameter_value is not None:
+                os.setuid(parameter_value)
+
+        elif parameter_name == config.PARAMETER_N_MESSAGES:
+            self.n_messages = parameter_value
+
+            # Processors can use the number of messages as well (for example to preallocate the output).
+            if hasattr(self.processor_instance, parameter_name):
+                self.processor_instance.set_parameter((parameter_name, parameter_value))
+
+        elif parameter_name == config.PARAMETER_DISABLE_PROCESSING:
+            self.disable_processing = parameter_value
+
+        elif parameter_name == config.PARAMETER_BATCH_SIZE:
+            batch_size = parameter_value or config.DEFAULT_BATCH_SIZE
+
+            if batch_size < 1:
+                raise ValueError("Batch size must be at least 1, but %s was provided." % batch_size)
+
+            self.batch_size = batch_size
+
+        elif parameter_name == config.PARAMETER_BATCH_WINDOW:
+            self.batch_window = parameter_value or 0
+
+    def get_process_name(self):
+        return self._process_name
+
+    def get_process_help(self):
+        return RestInterfacedProcess.get_process_help(self.processor_instance)
+
+    def get_parameters(self):
+        if hasattr(self.processor_instance, "get_parameters"):
+            all_parameters = self.processor_instance.get_parameters()
+        else:
+            all_parameters = RestInterfacedProcess.get_parameters(self.processor_instance)
+        all_parameters.update(self.current_parameters)
+
+        return all_parameters
+
+    def get_statistics(self):
+        return self.statistics.get_statistics()
+
+    def get_statistics_raw(self):
+        return self.statistics.get_statistics_raw()
+
+    def get_processor_statistics(self):
+        if hasattr(self.processor_instance, "get_statistics"):
+            return self.processor_instance.get_statistics()
+
+    def get_handoff_statistics(self):
+        return {"handoff": "asyncio"}
+
+    async def reset(self):
+        await self.stop()
+        self.current_parameters = copy.deepcopy(self.initial_parameters)
+
+    def close(self):
+        self.context.term()
@@ -13,7 +13,23 @@ DEFAULT_REST_HOST = "http://0.0.0.0"
 DEFAULT_REST_PORT = 41000
 DEFAULT_DATA_QUEUE_LENGTH = 16
 DEFAULT_N_RECEIVING_THREADS = 1
-DEFAULT_STATISTICS_BUFFER_LENGTH = 100
+# Hand-off between the receiving threads and the processor: "queue" or "ring_buffer".
+HANDOFF_QUEUE = "queue"
+HANDOFF_RING_BUFFER = "ring_buffer"
+DEFAULT_HANDOFF = HANDOFF_QUEUE
+# Overload policy of the data queue: block, drop_oldest, drop_newest, keep_every_nth or rate_cap.
+DEFAULT_OVERLOAD_POLICY = "block"
+# Number of most recent dropped frame index ranges reported.
+DEFAULT_OVERLOAD_DROPPED_RANGES = 100
+# Ring buffer slot sizes. The default slot fits a 2048x2048 frame of 32 bit values.
+DEFAULT_RING_BUFFER_SLOT_BYTES = 2048 * 2048 * 4
+DEFAULT_RING_BUFFER_HEADER_BYTES = 16 * 1024
+DEFAULT_RING_BUFFER_MAX_FRAMES = 8
+DEFAULT_STATISTICS_BUFFER_LENGTH = 1000
+# Node runtime: "process" (processor in its own process) or "asyncio" (everything in one event loop).
+RUNTIME_PROCESS = "process"
+RUNTIME_ASYNCIO = "asyncio"
+DEFAULT_RUNTIME = RUNTIME_PROCESS
 DEFAULT_STARTUP_TIMEOUT = 5
 # Default logging level
 DEFAULT_LOGGING_LEVEL = "DEBUG"
@@ -30,6 +46,53 @@ ZMQ_IO_THREADS = 1
 DEFAULT_RECEIVE_TIMEOUT = 1000
 DEFAULT_QUEUE_READ_INTERVAL = 0
 DEFAULT_ZMQ_QUEUE_LENGTH = 32
+# Time (in seconds) to wait on the data queue before re-checking the node status.
+DEFAULT_DATA_QUEUE_TIMEOUT = 0.1
+
+# Distribution of the forwarded messages to multiple destinations: "broadcast" or "load_balance".
+DEFAULT_FORWARDER_DISTRIBUTION = "broadcast"
+# Maximum number of messages in the outbound queue of the background sender.
+DEFAULT_SEND_QUEUE_SIZE = 256
+# What the background sender does with the messages when its queue is full: "block", "drop" or "spill".
+DEFAULT_SEND_OVERFLOW_POLICY = "block"
+
+# Proxy function workers: "thread" or "process".
+DEFAULT_PROXY_EXECUTOR = "thread"
+# Maximum number of messages waiting for the proxy function workers.
+DEFAULT_PROXY_MAX_IN_FLIGHT = 16
+
+# Compression processor defaults.
+# Codec to compress the frames with: "zlib", "bz2" or "lzma".
+DEFAULT_COMPRESSION_CODEC = "zlib"
+# Compression level of the codec.
+DEFAULT_COMPRESSION_LEVEL = 1
+# Number of threads compressing the frames.
+DEFAULT_COMPRESSION_THREADS = 4
+
+# File writer defaults.
+# Time (in seconds) between the flushes of the written frames to disk.
+DEFAULT_WRITER_FLUSH_INTERVAL = 1
+# Number of frames to preallocate, when the series length is not known.
+DEFAULT_WRITER_INITIAL_FRAMES = 1024
+# Maximum number of frames in a series file. Frames further from the first frame of the series are not written.
+DEFAULT_WRITER_MAX_FRAMES = 1000000
+
+# Test stream generator defaults.
+# Number of preallocated frames the generator cycles through.
+DEFAULT_GENERATOR_POOL_SIZE = 16
+# Time (in seconds) before each send deadline that the pacing spins instead of sleeping.
+DEFAULT_GENERATOR_SPIN_TIME = 0.001
+
+# Merge node defaults.
+# Maximum number of messages held back to restore the frame index order.
+DEFAULT_MERGE_REORDER_WINDOW = 64
+# Time (in seconds) to wait for a missing frame before skipping it.
+DEFAULT_MERGE_MISSING_FRAME_TIMEOUT = 1
+
+# Process pool defaults.
+DEFAULT_POOL_DISPATCH_MODE = "round_robin"
+# Maximum number of messages dispatched to each worker at once.
+DEFAULT_POOL_MAX_IN_FLIGHT = 4
 
 # REST Interface defaults.
 API_PATH_FORMAT = "/api/v1/{instance_name}/{{url}}"
@@ -43,5 +106,13 @@ PARAMETER_PROCESS_UID = "process_uid"
 PARAMETER_PROCESS_GID = "process_gid"
 PARAMETER_N_MESSAGES = "n_messages"
 PARAMETER_DISABLE_PROCESSING = "disable_processing"
-PROCESS_PARAMETERS = [PARAMETER_PROCESS_UID, PARAMETER_PROCESS_GID, PARAMETER_N_MESSAGES, PARAMETER_DISABLE_PROCESSING]
+PARAMETER_BATCH_SIZE = "batch_size"
+PARAMETER_BATCH_WINDOW = "batch_window"
+PROCESS_PARAMETERS = [PARAMETER_PROCESS_UID, PARAMETER_PROCESS_GID, PARAMETER_N_MESSAGES, PARAMETER_DISABLE_PROCESSING,
+                      PARAMETER_BATCH_SIZE, PARAMETER_BATCH_WINDOW]
+
+# Batch processing defaults. Batch size 1 calls process_message for each message.
+DEFAULT_BATCH_SIZE = 1
+# Maximum time (in milliseconds) to wait for a batch to fill up.
+DEFAULT_BATCH_WINDOW = 10
 
@@ -1,27 +1,79 @@
+import ctypes
 import uuid
-from argparse import Namespace
-from collections import deque
 from logging import getLogger
+from queue import Queue as DataQueue
+from threading import Thread, Lock
 
 import multiprocessing
 
 import copy
-from mflow.tools import ThroughputStatistics
 from multiprocessing import Process, Event, Queue
+from multiprocessing.sharedctypes import RawValue
 
 from mflow_nodes import config
 from mflow_nodes.rest_api.rest_server import RestInterfacedProcess
+from mflow_nodes.stream_tools.overload_policy import OverloadPolicy, OverloadPolicyQueue, POLICY_BLOCK, \
+    POLICY_DROP_OLDEST
+from mflow_nodes.stream_tools.ring_buffer import RingBuffer, RingBufferQueue
+from mflow_nodes.stream_tools.shared_statistics import SharedStatisticsBuffer
 
 _logger = getLogger(__name__)
 
 
+class ParameterQueue(object):
+    """
+    Queue for passing parameters to the processor process, with a shared memory generation counter.
+    The processor loop checks for new parameters with a single integer compare, and reads from the
+    queue only when the counter has changed.
+    """
+
+    def __init__(self):
+        self._queue = Queue()
+        self._write_lock = Lock()
+        # Number of parameters put to and read from the queue. Shared, because the processor process is restarted.
+        self._generation = RawValue(ctypes.c_uint64, 0)
+        self._read_generation = RawValue(ctypes.c_uint64, 0)
+
+    def put(self, parameter):
+        """
+        Put the parameter to the queue.
+        :param parameter: Parameter in the format (parameter_name, parameter_value).
+        """
+        with self._write_lock:
+            self._queue.put(parameter)
+            self._generation.value += 1
+
+    def has_updates(self):
+        """
+        Check if there are new parameters in the queue. Cheap enough to be called for every message.
+        :return: True if there are parameters to read.
+        """
+        return self._generation.value != self._read_generation.value
+
+    def get_updates(self):
+        """
+        Read all the parameters that were put to the queue since the last call.
+        :return: List of parameters, in the order they were put to the queue.
+        """
+        parameters = []
+        generation = self._generation.value
+
+        # The parameters might still be in transit: the generation is incremented when the put returns.
+        while self._read_generation.value != generation:
+            parameters.append(self._queue.get(timeout=config.DEFAULT_IPC_TIMEOUT))
+            self._read_generation.value += 1
+
+        return parameters
+
+
 class NodeManager(RestInterfacedProcess):
     """
     Wrap the processing function to allow for inter process communication.
     """
 
     def __init__(self, processor_function, receiver_function, initial_parameters=None, processor_instance=None,
-                 data_queue_size=None, n_receiving_threads=None):
+                 data_queue_size=None, n_receiving_threads=None, handoff=None, ring_buffer_slot_bytes=None,
+                 receive_raw=False, overload_policy=None, receiver_instance=None, passthrough=False):
         """
         Constructor.
         :param processor_function: Function to run the processor in a thread.
@@ -29,12 +81,46 @@ class NodeManager(RestInterfacedProcess):
         :param initial_parameters: Parameters to pass to the function at instantiation.
         :param processor_instance: Instance of the processor (for help and parameters)
         :param data_queue_size: Size of the data queue between the processor and receiver thread.
-        :param n_receiving_threads: Number of receiving threads.
+        :param n_receiving_threads: Number of receiving threads. If 0, the processor receives the messages itself.
+        :param handoff: Hand-off between the receiving threads and the processor. "queue" to run the receiving threads
+        in the processor process, "ring_buffer" to run them in a separate process and pass the frames through
+        shared memory.
+        :param ring_buffer_slot_bytes: Maximum frame size, in bytes, when using the ring buffer hand-off.
+        :param receive_raw: The messages are passed to the processor with the raw handler (ring buffer hand-off).
+        :param overload_policy: OverloadPolicy to apply when the data queue is full. Default: block.
+        :param receiver_instance: Instance of the receiver, if it reports statistics (for example MFlowMerger).
+        :param passthrough: The receiving threads keep the received frames (ring buffer hand-off).
         """
         self.processor_instance = processor_instance
         self.data_queue_size = data_queue_size or config.DEFAULT_DATA_QUEUE_LENGTH
         self.initial_parameters = initial_parameters or {}
-        self.n_receiving_threads = n_receiving_threads or config.DEFAULT_N_RECEIVING_THREADS
+        self.n_receiving_threads = n_receiving_threads if n_receiving_threads is not None \
+            else config.DEFAULT_N_RECEIVING_THREADS
+        self.handoff = handoff or config.DEFAULT_HANDOFF
+        self.ring_buffer_slot_bytes = ring_buffer_slot_bytes or config.DEFAULT_RING_BUFFER_SLOT_BYTES
+        self.receive_raw = receive_raw
+        self.passthrough = passthrough
+        self.overload_policy = overload_policy or OverloadPolicy()
+        self.receiver_instance = receiver_instance
+
+        if self.handoff not in (config.HANDOFF_QUEUE, config.HANDOFF_RING_BUFFER):
+            raise ValueError("Unknown hand-off '%s'. Use '%s' or '%s'." %
+                             (self.handoff, config.HANDOFF_QUEUE, config.HANDOFF_RING_BUFFER))
+
+        if self.handoff == config.HANDOFF_RING_BUFFER and not self.n_receiving_threads:
+            raise ValueError("The ring buffer hand-off needs at least 1 receiving thread.")
+
+        # Only the frames as received can be written to the ring buffer: the messages decoded by mflow (dimage-1.0,
+        # dheader-1.0) cannot.
+        if self.handoff == config.HANDOFF_RING_BUFFER and not (self.receive_raw or self.passthrough):
+            raise ValueError("The ring buffer hand-off needs the stream received in raw or passthrough mode.")
+
+        if self.handoff == config.HANDOFF_RING_BUFFER and self.overload_policy.policy == POLICY_DROP_OLDEST:
+            raise ValueError("The ring buffer hand-off does not support the '%s' overload policy." %
+                             POLICY_DROP_OLDEST)
+
+        if not self.n_receiving_threads and self.overload_policy.policy != POLICY_BLOCK:
+            _logger.warning("Overload policy '%s' not applied: no receiving threads.", self.overload_policy.policy)
 
         self.current_parameters = copy.deepcopy(self.initial_parameters)
 
@@ -42,15 +128,16 @@ class NodeManager(RestInterfacedProcess):
 
         self.processor_function = processor_function
         self.processor_process = None
+        self.receiver_process = None
+        self.ring_buffer = None
         self.processor_running = Event()
 
-        self.parameter_queue = Queue()
+        self.parameter_queue = ParameterQueue()
 
         self.receiver_function = receiver_function
 
-        self.statistics_buffer = deque(maxlen=config.DEFAULT_STATISTICS_BUFFER_LENGTH)
-        self.statistics_namespace = Namespace()
-        self.statistics = ThroughputStatistics(self.statistics_buffer, self.statistics_namespace)
+        # Written by the processor process, read by the REST interface.
+        self.statistics = SharedStatisticsBuffer(config.DEFAULT_STATISTICS_BUFFER_LENGTH)
 
         # Pre-process static attributes.
         self._process_name = getattr(self.processor_instance, "__name__",
@@ -74,12 +161,26 @@ class NodeManager(RestInterfacedProcess):
 
         _logger.debug("Starting node.")
 
-        data_queue = deque(maxlen=self.data_queue_size)
+        self.statistics.reset()
+        self.overload_policy.reset()
+
+        # The receiving threads run in the processor process, or in their own process with the ring buffer.
+        receiver_function = self.receiver_function
+        data_queue = None
+        self.ring_buffer = None
+
+        if self.handoff == config.HANDOFF_RING_BUFFER:
+            self.ring_buffer = RingBuffer(self.data_queue_size, self.ring_buffer_slot_bytes)
+            data_queue = OverloadPolicyQueue(RingBufferQueue(self.ring_buffer, receive_raw=self.receive_raw),
+                                             self.overload_policy)
+            receiver_function = None
+        elif self.n_receiving_threads:
+            data_queue = OverloadPolicyQueue(DataQueue(maxsize=self.data_queue_size), self.overload_policy)
 
         self.processor_process = Process(target=self.processor_function,
                                          args=(
-                                             self.processor_running, self.statistics_buffer, self.statistics_namespace,
-                                             self.parameter_queue, data_queue))
+                                             self.processor_running, self.statistics, self.parameter_queue, data_queue,
+                                             receiver_function, self.n_receiving_threads))
 
         self._set_current_parameters()
         self.processor_process.start()
@@ -90,6 +191,13 @@ class NodeManager(RestInterfacedProcess):
             _logger.error(error)
             raise ValueError(error)
 
+        # The receivers can be started only once the processor is ready.
+        if self.handoff == config.HANDOFF_RING_BUFFER:
+            self.receiver_process = Process(target=receiver_process_function,
+                                            args=(self.receiver_function, self.processor_running, data_queue,
+                                                  self.n_receiving_threads))
+            self.receiver_process.start()
+
     def stop(self):
         """
         Stop the processing function process.
@@ -98,6 +206,14 @@ class NodeManager(RestInterfacedProcess):
 
         self.processor_running.clear()
 
+        if self.receiver_process is not None:
+            self.receiver_process.join(config.DEFAULT_SHUTDOWN_TIMEOUT)
+
+            if self.receiver_process.is_alive():
+                self.receiver_process.terminate()
+
+            self.receiver_process = None
+
         if self.processor_process is not None:
             self.processor_process.join()
             self.processor_process = None
@@ -126,8 +242,11 @@ class NodeManager(RestInterfacedProcess):
 
     def get_parameters(self):
         # Collect default mflow_processor parameters and update them with the user set.
-        all_parameters = RestInterfacedProcess.get_parameters(self.processor_instance) \
-            if self.processor_instance else {}
+        if hasattr(self.processor_instance, "get_parameters"):
+            all_parameters = self.processor_instance.get_parameters()
+        else:
+            all_parameters = RestInterfacedProcess.get_parameters(self.processor_instance) \
+                if self.processor_instance else {}
         all_parameters.update(self.current_parameters)
 
         return all_parameters
@@ -136,13 +255,51 @@ class NodeManager(RestInterfacedProcess):
         return self.statistics.get_statistics()
 
     def get_statistics_raw(self):
-        return list(self.statistics.get_statistics_raw())
+        return self.statistics.get_statistics_raw()
+
+    def get_processor_statistics(self):
+        if hasattr(self.processor_instance, "get_statistics"):
+            return self.processor_instance.get_statistics()
+
+    def get_handoff_statistics(self):
+        handoff_statistics = {"handoff": self.handoff,
+                              "overload": self.overload_policy.get_statistics()}
+
+        if self.ring_buffer is not None:
+            handoff_statistics["ring_buffer"] = self.ring_buffer.get_statistics()
+
+        if hasattr(self.receiver_instance, "get_statistics"):
+            handoff_statistics["receiver"] = self.receiver_instance.get_statistics()
+
+        return handoff_statistics
 
     def reset(self):
         self.stop()
         self.current_parameters = copy.deepcopy(self.initial_parameters)
 
 
+def receiver_process_function(receiver_function, running_event, data_queue, n_receiving_threads):
+    """
+    Run the receiving threads in a separate process.
+    :param receiver_function: Function to run in each receiving thread.
+    :param running_event: Event signaling that the node is running.
+    :param data_queue: Queue to put the received messages to.
+    :param n_receiving_threads: Number of receiving threads.
+    """
+    _logger.debug("Receiver process started with %d receiving threads.", n_receiving_threads)
+
+    receiving_threads = [Thread(target=receiver_function, args=(running_event, data_queue), daemon=True)
+                         for _ in range(n_receiving_threads)]
+
+    for receiving_thread in receiving_threads:
+        receiving_thread.start()
+
+    for receiving_thread in receiving_threads:
+        receiving_thread.join()
+
+    _logger.debug("Receiver process stopped.")
+
+
 def external_process_wrapper(node_manager, communication_pipe, stop_event):
     _logger.debug("External process wrapper started.")
 
@@ -22,6 +22,16 @@ class BaseProcessor(object):
         """
         self._logger.debug("Received message.")
 
+    def process_messages(self, messages):
+        """
+        Process a batch of messages received over ZMQ. Called instead of process_message when the node
+        batch_size parameter is larger than 1. Override it to process the whole batch at once.
+        :param messages: List of messages received from the ZMQ stream, in the receiving order.
+        :return: None
+        """
+        for message in messages:
+            self.process_message(message)
+
     def set_parameter(self, parameter):
         """
         Set the parameter received from the REST API.
@@ -50,6 +60,15 @@ class BaseProcessor(object):
         """
         self._logger.debug("Stopping mflow_processor.")
 
+    def get_statistics(self):
+        """
+        Return the processor statistics, exposed on the REST api next to the node statistics.
+        This method is called from the REST process: the values need to be in shared memory
+        (see mflow_nodes.stream_tools.shared_statistics.SharedCounters).
+        :return: Dictionary with the statistics, or None if the processor does not provide any.
+        """
+        return None
+
     def is_running(self):
         """
         Check if the processor is still running.
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from logging import getLogger
+from time import time
+
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.rest_api.rest_server import RestInterfacedProcess
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+
+class ChainProcessor(BaseProcessor):
+    """
+    MFlow processor chain
+
+    Runs the provided processors (stages) one after the other, in the node process, passing the same message
+    object from one stage to the next. If a stage returns False, the message is dropped and not passed to
+    the following stages. Stages running concurrently (a proxy with proxy workers) can only be the last stage.
+
+    Chain parameters:
+        Stage parameters are namespaced as "<stage_name>.<parameter_name>". Parameters without a namespace are
+        set on all the stages that have them.
+    """
+    _logger = getLogger(__name__)
+
+    SEPARATOR = "."
+
+    def __init__(self, processors, stage_names=None, name="Processor chain"):
+        """
+        Initialize the processor chain.
+        :param processors: List of processors, in processing order.
+        :param stage_names: Names of the stages, used to namespace the parameters and statistics.
+        Default: the processor names.
+        :param name: Name of the chain.
+        """
+        stage_names = stage_names or _get_stage_names(processors)
+
+        if len(stage_names) != len(processors):
+            raise ValueError("%d stage names provided for %d processors." % (len(stage_names), len(processors)))
+
+        if len(set(stage_names)) != len(stage_names):
+            raise ValueError("Stage names must be unique, but %s were provided." % stage_names)
+
+        self._stages = OrderedDict(zip(stage_names, processors))
+        self._statistics = SharedCounters(["messages", "dropped", "processing_time", "errors"], len(processors))
+        self.__name__ = name
+
+    def _validate_stages(self):
+        # The following stages would receive also the messages the concurrent stage drops.
+        concurrent_stages = [stage_name for stage_name, stage in list(self._stages.items())[:-1]
+                             if hasattr(stage, "is_concurrent") and stage.is_concurrent()]
+
+        if concurrent_stages:
+            error_message = "Stages %s run concurrently: they can only be the last stage of the chain." % \
+                            concurrent_stages
+            self._logger.error(error_message)
+            raise ValueError(error_message)
+
+    def start(self):
+        self._validate_stages()
+
+        self._statistics.reset()
+        started_stages = []
+
+        try:
+            for stage in self._stages.values():
+                stage.start()
+                started_stages.append(stage)
+        except Exception:
+            # Do not leave the already started stages running.
+            self._stop_stages(reversed(started_stages))
+            raise
+
+        self._logger.debug("Started processor chain with stages %s." % list(self._stages.keys()))
+
+    def process_message(self, message):
+        for stage_index, stage in enumerate(self._stages.values()):
+            start_time = time()
+
+            try:
+                result = stage.process_message(message)
+            except Exception:
+                self._statistics.add("errors", row=stage_index)
+                raise
+            finally:
+                self._statistics.add("processing_time", time() - start_time, row=stage_index)
+                self._statistics.add("messages", row=stage_index)
+
+            if result is False:
+                self._statistics.add("dropped", row=stage_index)
+                return False
+
+        return True
+
+    def set_parameter(self, parameter):
+        name, value = parameter
+
+        stage_name, separator, parameter_name = name.partition(self.SEPARATOR)
+        if separator and stage_name in self._stages:
+            self._stages[stage_name].set_parameter((parameter_name, value))
+            return
+
+        # Parameters without a stage namespace go to the stages that have them.
+        stages = [stage for stage in self._stages.values() if hasattr(stage, name)]
+        if not stages:
+            raise ValueError("Parameter '%s' is not a parameter of any stage. Stages: %s." %
+                             (name, list(self._stages.keys())))
+
+        for stage in stages:
+            stage.set_parameter((name, value))
+
+    def get_parameters(self):
+        parameters = OrderedDict()
+
+        for stage_name, stage in self._stages.items():
+            if hasattr(stage, "get_parameters"):
+                stage_parameters = stage.get_parameters()
+            else:
+                stage_parameters = RestInterfacedProcess.get_parameters(stage)
+
+            parameters.update((stage_name + self.SEPARATOR + parameter_name, value)
+                              for parameter_name, value in stage_parameters.items())
+
+        return parameters
+
+    def get_statistics(self):
+        statistics = OrderedDict()
+
+        for (stage_name, stage), stage_statistics in zip(self._stages.items(), self._statistics.get_rows()):
+            stage_statistics["average_processing_time"] = \
+                stage_statistics["processing_time"] / stage_statistics["messages"] \
+                if stage_statistics["messages"] else 0
+            stage_statistics["processor_statistics"] = stage.get_statistics() \
+                if hasattr(stage, "get_statistics") else None
+
+            statistics[stage_name] = stage_statistics
+
+        return statistics
+
+    def is_running(self):
+        return all(stage.is_running() for stage in self._stages.values())
+
+    def stop(self):
+        self._stop_stages(reversed(list(self._stages.values())))
+
+    def _stop_stages(self, stages):
+        # Stop all the stages, even if one of them fails.
+        for stage in stages:
+            try:
+                stage.stop()
+            except Exception as e:
+                self._logger.error("Error while stopping stage %s. %s", stage, e)
+
+
+def _get_stage_names(processors):
+    """
+    Name the stages after the processors, appending the stage index to repeated names.
+    """
+    names = [getattr(processor, "__name__", processor.__class__.__name__) for processor in processors]
+
+    return [name if names.count(name) == 1 else "%s_%d" % (name, index) for index, name in enumerate(names)]
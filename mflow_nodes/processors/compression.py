@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from time import time
+
+from mflow_nodes import config
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_tools.compression import codecs_mapping, compress_array
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import RawMessage, copy_borrowed_message
+from mflow_nodes.stream_tools.ordered_results import OrderedResultSender
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+# Htype of the compressed messages.
+COMPRESSED_HTYPE = "array-compressed-1.0"
+
+
+def _compress_message(message, codec, level, shuffle):
+    """
+    Compress the message array, in a compression thread.
+    :return: Tuple (compressed message, uncompressed size, compressed size, compression time).
+    """
+    start_time = time()
+
+    array = message.get_array()
+    compressed_data = compress_array(array, codec, level, shuffle)
+
+    header = dict(message.get_header())
+    header.update({"htype": COMPRESSED_HTYPE, "codec": codec, "shuffle": shuffle})
+
+    return RawMessage(header, [compressed_data]), array.nbytes, len(compressed_data), time() - start_time
+
+
+class CompressionProcessor(BaseProcessor):
+    """
+    MFlow compression
+
+    Compresses the array-1.0 frames in a thread pool, and forwards them as array-compressed-1.0 to the next node.
+    The frames are forwarded in the receiving order, from a background thread, as soon as they are compressed.
+    The other messages are forwarded unchanged.
+    Nodes receiving the compressed stream with --passthrough get the decompressed array from message.get_data().
+
+    Compression parameters:
+        binding_address                Address to forward the compressed stream to.
+        codec                          Compression codec: "zlib", "bz2" or "lzma".
+        level                          Compression level of the codec.
+        shuffle                        Byte shuffle the values before compressing them.
+        n_threads                      Number of compression threads.
+        max_in_flight                  Maximum number of frames being compressed at once.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, name="Compression node"):
+        """
+        Initialize the compression node.
+        :param name: Name of the compression node.
+        """
+        self.__name__ = name
+
+        self._zmq_forwarder = None
+        self._executor = None
+        # Forwards the compressed frames and the other messages, in receiving order.
+        self._result_sender = None
+        self._statistics = SharedCounters(["messages", "compressed", "uncompressed_bytes", "compressed_bytes",
+                                           "compression_time"])
+
+        # Parameters to set.
+        self.binding_address = None
+        self.codec = config.DEFAULT_COMPRESSION_CODEC
+        self.level = config.DEFAULT_COMPRESSION_LEVEL
+        self.shuffle = True
+        self.n_threads = config.DEFAULT_COMPRESSION_THREADS
+        self.max_in_flight = config.DEFAULT_PROXY_MAX_IN_FLIGHT
+
+    def _validate_parameters(self):
+        error_message = ""
+
+        if not self.binding_address:
+            error_message += "Parameter 'binding_address' not set.\n"
+
+        if self.codec not in codecs_mapping:
+            error_message += "Parameter 'codec' must be one of %s.\n" % sorted(codecs_mapping)
+
+        if not self.n_threads or self.n_threads < 1:
+            error_message += "Parameter 'n_threads' must be at least 1.\n"
+
+        if not self.max_in_flight or self.max_in_flight < 1:
+            error_message += "Parameter 'max_in_flight' must be at least 1.\n"
+
+        if error_message:
+            self._logger.error(error_message)
+            raise ValueError(error_message)
+
+    def start(self):
+        self._logger.debug("Compression started.")
+        # Check if all the needed input parameters are available.
+        self._validate_parameters()
+
+        self._logger.debug("Compressing with '%s' level %s (shuffle=%s) in %d threads, forwarding to '%s'." %
+                           (self.codec, self.level, self.shuffle, self.n_threads, self.binding_address))
+
+        self._zmq_forwarder = MFlowForwarder()
+        self._zmq_forwarder.start(self.binding_address)
+
+        self._statistics.reset()
+        self._executor = ThreadPoolExecutor(max_workers=self.n_threads)
+        self._result_sender = OrderedResultSender(self._forward_result, self.max_in_flight,
+                                                  name="compression_sender")
+        self._result_sender.start()
+
+    def process_message(self, message):
+        self._statistics.add("messages")
+
+        # The message is used after process_message returns, when its ring buffer slot is released.
+        message = copy_borrowed_message(message)
+
+        # The result sender waits for the oldest message, if too many are in flight.
+        if message.htype == "array-1.0":
+            future = self._executor.submit(_compress_message, message, self.codec, self.level, self.shuffle)
+            self._result_sender.submit(None, future)
+        else:
+            self._result_sender.submit(message.raw_message)
+
+    def _forward_result(self, raw_message, future):
+        """
+        Forward the compressed frame, or the message to forward unchanged, from the result sender thread.
+        """
+        if future is None:
+            self._zmq_forwarder.forward(raw_message)
+            return
+
+        try:
+            compressed_message, uncompressed_size, compressed_size, compression_time = future.result()
+        except Exception as e:
+            self._logger.error("Failed to compress frame. %s", e)
+            return
+
+        self._statistics.add("compressed")
+        self._statistics.add("uncompressed_bytes", uncompressed_size)
+        self._statistics.add("compressed_bytes", compressed_size)
+        self._statistics.add("compression_time", compression_time)
+
+        self._zmq_forwarder.forward(compressed_message)
+
+    def get_statistics(self):
+        statistics = self._statistics.get_row()
+        n_compressed = statistics["compressed"]
+
+        statistics["compression_ratio"] = statistics["uncompressed_bytes"] / statistics["compressed_bytes"] \
+            if statistics["compressed_bytes"] else 0
+        statistics["average_compression_time"] = statistics["compression_time"] / n_compressed \
+            if n_compressed else 0
+
+        return statistics
+
+    def stop(self):
+        if self._executor is not None:
+            # Forward the messages still being compressed.
+            self._result_sender.stop()
+            self._result_sender = None
+
+            self._executor.shutdown()
+            self._executor = None
+
+        if self._zmq_forwarder is not None:
+            self._zmq_forwarder.stop()
+            self._zmq_forwarder = None
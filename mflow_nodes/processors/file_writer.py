@@ -0,0 +1,406 @@
+import json
+import os
+from logging import getLogger
+from threading import Thread, Event, Lock
+from time import time
+
+import numpy
+
+from mflow_nodes import config
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+# Record of the frame index sidecar, one for each frame slot. A size of 0 marks a frame that was not written.
+INDEX_DTYPE = numpy.dtype([("offset", "<u8"), ("size", "<u8"), ("timestamp", "<f8")])
+INDEX_FILE_EXTENSION = ".index"
+METADATA_FILE_EXTENSION = ".json"
+
+
+def get_series_filename(output_file, series_index):
+    """
+    Return the data file of the series: the output file for the first series, and the output file name with the
+    series index appended for the following ones ("frames.raw", "frames_1.raw", "frames_2.raw", ...).
+    :param output_file: Path of the data file of the first series.
+    :param series_index: Index of the series, from 0.
+    :return: Path of the data file.
+    """
+    if not series_index:
+        return output_file
+
+    root, extension = os.path.splitext(output_file)
+    return "%s_%d%s" % (root, series_index, extension)
+
+
+class FileWriterProcessor(BaseProcessor):
+    """
+    MFlow file writer
+
+    Writes the frames of each series into a raw data file, each frame at the offset of its frame index, relative to
+    the first frame of the series. The file is preallocated once the series length is known: from the dheader-1.0
+    message (nimages * ntrigger), the n_frames parameter or the node n_messages parameter. Without it, the file grows
+    as needed.
+
+    The frames are written with positional writes, so the processing never waits for the disk: a background thread
+    flushes the written data to disk every flush_interval seconds, and when the writer stops.
+
+    Next to the data file, the writer saves:
+        <output_file>.index            Frame index sidecar: one INDEX_DTYPE record (offset, size, timestamp) for
+                                       each frame slot.
+        <output_file>.json             Metadata: frame shape, type, size, number of frame slots and index of the
+                                       first frame.
+    Use IndexedFileReader to read any frame back.
+
+    Each series is written to its own data file, with its own sidecar files (see get_series_filename). A new series
+    starts with a dheader-1.0 message following written frames, with the first message after a dseries_end-1.0, or
+    with a frame index that goes back (already written, or before the first frame), as when the stream restarts
+    without a series header.
+
+    Writer parameters:
+        output_file                    Path of the data file.
+        n_frames                       Number of frames in the series, to preallocate the file.
+        flush_interval                 Time, in seconds, between the flushes to disk.
+        max_frames                     Maximum number of frames in a series file. Frames with an index max_frames
+                                       or more after the first frame of the series are not written.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, name="File writer"):
+        """
+        Initialize the file writer.
+        :param name: Name of the writer.
+        """
+        self.__name__ = name
+
+        self._data_file = None
+        self._index_file = None
+        self._series_file = None
+        self._series_index = 0
+        self._flush_thread = None
+        self._stop_flushing = Event()
+        # The flushing thread must not flush the files of a series while they are closed.
+        self._files_lock = Lock()
+
+        self._frame_shape = None
+        self._frame_dtype = None
+        self._frame_size = None
+        self._n_slots = 0
+        # Frame index written to the first slot of the series file.
+        self._first_frame_index = None
+        self._last_slot = -1
+        # One byte for each slot, set once the slot is written.
+        self._written_slots = bytearray()
+        # Series length announced by the dheader-1.0 message.
+        self._announced_frames = None
+        self._index_record = numpy.zeros(1, dtype=INDEX_DTYPE)
+
+        self._statistics = SharedCounters(["frames", "bytes", "write_time", "flushes", "flush_time",
+                                           "preallocated_frames", "series", "rejected"])
+
+        # Parameters to set.
+        self.output_file = None
+        self.n_frames = None
+        self.n_messages = None
+        self.flush_interval = config.DEFAULT_WRITER_FLUSH_INTERVAL
+        self.max_frames = config.DEFAULT_WRITER_MAX_FRAMES
+
+    def _validate_parameters(self):
+        error_message = ""
+
+        if not self.output_file:
+            error_message += "Parameter 'output_file' not set.\n"
+
+        if not self.flush_interval or self.flush_interval <= 0:
+            error_message += "Parameter 'flush_interval' must be a positive number of seconds.\n"
+
+        if not self.max_frames or self.max_frames < 1:
+            error_message += "Parameter 'max_frames' must be at least 1.\n"
+
+        if error_message:
+            self._logger.error(error_message)
+            raise ValueError(error_message)
+
+    def start(self):
+        self._logger.debug("Writer started.")
+        # Check if all the needed input parameters are available.
+        self._validate_parameters()
+
+        self._statistics.reset()
+        self._series_index = 0
+        self._open_series()
+
+        self._stop_flushing.clear()
+        self._flush_thread = Thread(target=self._flush_periodically, name="flush", daemon=True)
+        self._flush_thread.start()
+
+    def _open_series(self):
+        """
+        Open the data and index files of the current series.
+        """
+        self._series_file = get_series_filename(self.output_file, self._series_index)
+        self._logger.debug("Writing frames to '%s'." % self._series_file)
+
+        flags = os.O_RDWR | os.O_CREAT | os.O_TRUNC
+        data_file = os.open(self._series_file, flags, 0o644)
+        index_file = os.open(self._series_file + INDEX_FILE_EXTENSION, flags, 0o644)
+
+        self._frame_shape = None
+        self._frame_dtype = None
+        self._frame_size = None
+        self._n_slots = 0
+        self._first_frame_index = None
+        self._last_slot = -1
+        self._written_slots = bytearray()
+        self._announced_frames = None
+
+        with self._files_lock:
+            self._data_file = data_file
+            self._index_file = index_file
+
+        self._statistics.add("series")
+
+    def _close_series(self):
+        """
+        Flush and close the files of the current series.
+        """
+        if self._data_file is None:
+            return
+
+        # Without the series length, remove the preallocated frames that were not used.
+        if not self._get_series_length() and self._frame_size is not None:
+            self._n_slots = self._last_slot + 1
+            os.ftruncate(self._data_file, self._n_slots * self._frame_size)
+            os.ftruncate(self._index_file, self._n_slots * INDEX_DTYPE.itemsize)
+            self._write_metadata()
+
+        with self._files_lock:
+            self._flush()
+            os.close(self._data_file)
+            os.close(self._index_file)
+            self._data_file = None
+            self._index_file = None
+
+        self._logger.info("Closed series file '%s'." % self._series_file)
+
+    def _next_series(self):
+        self._close_series()
+        self._series_index += 1
+        self._open_series()
+
+    def _get_series_length(self):
+        return self.n_frames or self.n_messages or self._announced_frames
+
+    def _preallocate(self, n_slots):
+        """
+        Extend the data and index files to hold n_slots frames.
+        """
+        n_slots = min(n_slots, self.max_frames)
+
+        if n_slots <= self._n_slots:
+            return
+
+        self._logger.debug("Preallocating %d frames of %d bytes." % (n_slots, self._frame_size))
+
+        try:
+            os.posix_fallocate(self._data_file, 0, n_slots * self._frame_size)
+        except (AttributeError, OSError):
+            # Not every platform and file system supports fallocate: reserve the size at least.
+            os.ftruncate(self._data_file, n_slots * self._frame_size)
+
+        os.ftruncate(self._index_file, n_slots * INDEX_DTYPE.itemsize)
+        self._written_slots.extend(bytes(n_slots - len(self._written_slots)))
+
+        self._n_slots = n_slots
+        self._statistics.set("preallocated_frames", n_slots)
+
+    def _allocate_series(self, frame, first_frame_index):
+        self._first_frame_index = first_frame_index
+        self._frame_shape = list(frame.shape)
+        self._frame_dtype = frame.dtype
+        self._frame_size = frame.nbytes
+
+        self._preallocate(self._get_series_length() or config.DEFAULT_WRITER_INITIAL_FRAMES)
+        self._write_metadata()
+
+    def _write_metadata(self):
+        metadata = {"shape": self._frame_shape,
+                    "type": self._frame_dtype.str,
+                    "frame_size": self._frame_size,
+                    "n_frames": self._n_slots,
+                    "first_frame": self._first_frame_index}
+
+        with open(self._series_file + METADATA_FILE_EXTENSION, "w") as metadata_file:
+            json.dump(metadata, metadata_file, indent=4)
+
+    def process_message(self, message):
+        if message.htype == "dheader-1.0":
+            # The frames written so far belong to the previous series.
+            if self._data_file is None or self._last_slot >= 0:
+                self._next_series()
+
+            self._process_series_header(message)
+            return
+
+        if message.htype == "dseries_end-1.0":
+            self._close_series()
+            return
+
+        try:
+            frame = message.get_array()
+        except ValueError:
+            self._logger.debug("Message with htype '%s' has no frame. Skipping." % message.htype)
+            return
+
+        frame_index = message.get_frame_index()
+
+        # Frames after the end of a series, without a new series header.
+        if self._data_file is None:
+            self._next_series()
+
+        elif self._frame_size is not None and self._is_restarted(frame_index):
+            self._logger.info("Frame index %d went back: starting a new series." % frame_index)
+            self._next_series()
+
+        if self._frame_size is None:
+            self._allocate_series(frame, frame_index)
+
+        elif frame.nbytes != self._frame_size or frame.dtype != self._frame_dtype:
+            self._logger.error("Frame %d with shape %s and type %s does not match the series. Skipping.",
+                               frame_index, list(frame.shape), frame.dtype)
+            return
+
+        slot = frame_index - self._first_frame_index
+
+        if slot >= self.max_frames:
+            self._logger.error("Frame %d is %d frames after the first frame %d of the series, max_frames is %d. "
+                               "Skipping.", frame_index, slot, self._first_frame_index, self.max_frames)
+            self._statistics.add("rejected")
+            return
+
+        self._write_frame(slot, frame)
+
+    def _is_restarted(self, frame_index):
+        """
+        Return True if the frame index went back: the frame is before the first frame or was already written.
+        """
+        slot = frame_index - self._first_frame_index
+
+        return slot < 0 or (slot < self._n_slots and self._written_slots[slot])
+
+    def _process_series_header(self, message):
+        series_header = message.get_data()
+        n_images = series_header.get("nimages")
+
+        if n_images:
+            self._announced_frames = n_images * max(1, series_header.get("ntrigger") or 1)
+            self._logger.info("Series of %d frames announced." % self._announced_frames)
+
+            if self._frame_size is not None:
+                self._preallocate(self._get_series_length())
+                self._write_metadata()
+
+    def _write_frame(self, slot, frame):
+        start_time = time()
+
+        if slot >= self._n_slots:
+            # Unknown series length: double the file size, to keep the number of extensions low.
+            self._preallocate(max(slot + 1, 2 * self._n_slots))
+            self._write_metadata()
+
+        offset = slot * self._frame_size
+        os.pwrite(self._data_file, memoryview(numpy.ascontiguousarray(frame)).cast("B"), offset)
+
+        self._index_record["offset"] = offset
+        self._index_record["size"] = self._frame_size
+        self._index_record["timestamp"] = start_time
+        os.pwrite(self._index_file, self._index_record.tobytes(), slot * INDEX_DTYPE.itemsize)
+
+        self._written_slots[slot] = 1
+        self._last_slot = max(self._last_slot, slot)
+        self._statistics.add("frames")
+        self._statistics.add("bytes", self._frame_size)
+        self._statistics.add("write_time", time() - start_time)
+
+    def _flush(self):
+        start_time = time()
+
+        os.fdatasync(self._data_file)
+        os.fdatasync(self._index_file)
+
+        self._statistics.add("flushes")
+        self._statistics.add("flush_time", time() - start_time)
+
+    def _flush_periodically(self):
+        while not self._stop_flushing.wait(self.flush_interval):
+            try:
+                with self._files_lock:
+                    if self._data_file is not None:
+                        self._flush()
+            except OSError as e:
+                self._logger.error("Failed to flush '%s'. %s", self._series_file, e)
+
+    def get_statistics(self):
+        statistics = self._statistics.get_row()
+        statistics["average_write_time"] = statistics["write_time"] / statistics["frames"] \
+            if statistics["frames"] else 0
+
+        return statistics
+
+    def stop(self):
+        if self._flush_thread is not None:
+            self._stop_flushing.set()
+            self._flush_thread.join()
+            self._flush_thread = None
+
+        self._close_series()
+
+        self._logger.info("Written %d frames in %d series." % (self._statistics.get("frames"),
+                                                               self._statistics.get("series")))
+
+
+class IndexedFileReader(object):
+    """
+    Random access to the frames saved by the FileWriterProcessor.
+    """
+
+    def __init__(self, filename):
+        """
+        Open the data file and load its index.
+        :param filename: Path of the data file.
+        """
+        with open(filename + METADATA_FILE_EXTENSION) as metadata_file:
+            metadata = json.load(metadata_file)
+
+        self.frame_shape = metadata["shape"]
+        self.frame_dtype = numpy.dtype(metadata["type"])
+        # Frame index of the first slot.
+        self.first_frame = metadata.get("first_frame") or 0
+        self.index = numpy.fromfile(filename + INDEX_FILE_EXTENSION, dtype=INDEX_DTYPE)
+
+        self._data_file = open(filename, "rb")
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_written_frames(self):
+        """
+        Return the indexes of the written frames.
+        :return: Numpy array of frame indexes.
+        """
+        return numpy.flatnonzero(self.index["size"]) + self.first_frame
+
+    def read_frame(self, frame_index):
+        """
+        Read the frame.
+        :param frame_index: Index of the frame.
+        :return: Numpy array, or None if the frame was not written.
+        """
+        record = self.index[frame_index - self.first_frame]
+
+        if not record["size"]:
+            return None
+
+        data = os.pread(self._data_file.fileno(), int(record["size"]), int(record["offset"]))
+        return numpy.frombuffer(data, dtype=self.frame_dtype).reshape(self.frame_shape)
+
+    def close(self):
+        self._data_file.close()
@@ -0,0 +1,288 @@
+from logging import getLogger
+from time import time
+
+import numpy
+
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import RawMessage
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+# Names of the forwarded maps, in forwarding order.
+MAP_NAMES = ["mean", "variance", "min", "max"]
+
+
+class PixelStatisticsProcessor(BaseProcessor):
+    """
+    MFlow pixel statistics
+
+    Keeps the running per pixel mean, variance, min and max of the frames (for example for dark and pedestal
+    maps). The mean and variance are updated with Welford's algorithm for each frame, or with the parallel
+    combination of the batch statistics when the node processes batches. The maps are float64 arrays allocated
+    with the first frame, and updated in place.
+
+    The maps are forwarded as array-1.0 messages (one per map, with the "map" header field) every forward_interval
+    frames, or on demand by setting the forward_maps parameter. The variance is the sample variance.
+
+    Pixel statistics parameters:
+        binding_address                Address to forward the maps to.
+        forward_interval               Forward the maps every n frames. 0 forwards them only on demand.
+        forward_maps                   Set to True to forward the current maps.
+        reset_maps                     Set to True to restart the statistics from the next frame.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, name="Pixel statistics node"):
+        """
+        Initialize the pixel statistics node.
+        :param name: Name of the node.
+        """
+        self.__name__ = name
+
+        self._zmq_forwarder = None
+        self._n_frames = 0
+        self._frame_shape = None
+        self._n_forwarded = 0
+
+        # Running maps. The sum of the squared differences (M2) is divided into the variance when needed.
+        self._mean = None
+        self._m2 = None
+        self._min = None
+        self._max = None
+        # Scratch buffers, to avoid allocating memory for each frame.
+        self._delta = None
+        self._delta_2 = None
+        self._batch_stack = None
+        self._batch_mean = None
+        self._batch_m2 = None
+
+        # The map values are the pixel averages (min and max: extremes) of the last forwarded maps.
+        self._statistics = SharedCounters(["frames", "forwarded_maps", "update_time", "mean", "variance",
+                                           "min", "max"])
+
+        # Parameters to set.
+        self.binding_address = None
+        self.forward_interval = 0
+        self.forward_maps = False
+        self.reset_maps = False
+
+    def _validate_parameters(self):
+        error_message = ""
+
+        if (self.forward_interval or self.forward_maps) and not self.binding_address:
+            error_message += "Parameter 'binding_address' is needed to forward the maps.\n"
+
+        if self.forward_interval is None or self.forward_interval < 0:
+            error_message += "Parameter 'forward_interval' must be 0 or a positive number of frames.\n"
+
+        if error_message:
+            self._logger.error(error_message)
+            raise ValueError(error_message)
+
+    def start(self):
+        self._logger.debug("Pixel statistics started.")
+        # Check if all the needed input parameters are available.
+        self._validate_parameters()
+
+        if self.binding_address:
+            self._logger.debug("Forwarding the maps to '%s'." % self.binding_address)
+            self._zmq_forwarder = MFlowForwarder()
+            self._zmq_forwarder.start(self.binding_address)
+
+        self._statistics.reset()
+        self._reset_maps()
+        self._n_forwarded = 0
+
+    def set_parameter(self, parameter):
+        super(PixelStatisticsProcessor, self).set_parameter(parameter)
+
+        # The triggers are applied right away, and cleared.
+        if self.reset_maps:
+            self._reset_maps()
+            self.reset_maps = False
+
+        if self.forward_maps:
+            self._validate_parameters()
+            self._forward_maps()
+            self.forward_maps = False
+
+    def _reset_maps(self):
+        # The maps are initialized again by the next frame.
+        self._n_frames = 0
+        self._statistics.set("frames", 0)
+
+    def _initialize_maps(self, frame):
+        shape = frame.shape
+
+        if shape != self._frame_shape:
+            self._mean, self._m2, self._min, self._max, self._delta, self._delta_2, self._batch_mean, \
+                self._batch_m2 = (numpy.empty(shape, dtype=numpy.float64) for _ in range(8))
+            self._batch_stack = None
+            self._frame_shape = shape
+
+        self._n_frames = 0
+        self._mean.fill(0)
+        self._m2.fill(0)
+        numpy.copyto(self._min, frame)
+        numpy.copyto(self._max, frame)
+
+    def process_message(self, message):
+        try:
+            frame = message.get_array()
+        except ValueError:
+            # Messages without a frame (for example the detector headers).
+            return
+
+        start_time = time()
+        self._update(frame)
+        self._statistics.add("update_time", time() - start_time)
+
+        self._frames_processed(1)
+
+    def process_messages(self, messages):
+        frames = []
+        for message in messages:
+            try:
+                frames.append(message.get_array())
+            except ValueError:
+                continue
+
+        n_frames = len(frames)
+        start_time = time()
+
+        # The first frame initializes the maps.
+        if frames and (self._n_frames == 0 or frames[0].shape != self._frame_shape):
+            self._update(frames.pop(0))
+
+        if all(frame.shape == self._frame_shape for frame in frames):
+            if frames:
+                self._update_batch(frames)
+        else:
+            # Frames with another shape restart the maps.
+            for frame in frames:
+                self._update(frame)
+
+        self._statistics.add("update_time", time() - start_time)
+
+        self._frames_processed(n_frames)
+
+    def _update(self, frame):
+        """
+        Welford update of the maps with one frame.
+        """
+        if self._n_frames == 0 or frame.shape != self._frame_shape:
+            self._initialize_maps(frame)
+
+        self._n_frames += 1
+
+        # delta = x - mean; mean += delta / n; M2 += delta * (x - mean)
+        numpy.subtract(frame, self._mean, out=self._delta)
+        numpy.multiply(self._delta, 1 / self._n_frames, out=self._delta_2)
+        self._mean += self._delta_2
+        numpy.subtract(frame, self._mean, out=self._delta_2)
+        self._delta *= self._delta_2
+        self._m2 += self._delta
+
+        numpy.minimum(self._min, frame, out=self._min)
+        numpy.maximum(self._max, frame, out=self._max)
+
+    def _update_batch(self, frames):
+        """
+        Combine the statistics of the batch with the maps (parallel variance algorithm).
+        """
+        n_batch = len(frames)
+
+        # The stack is allocated again only for a larger batch.
+        if self._batch_stack is None or len(self._batch_stack) < n_batch:
+            self._batch_stack = numpy.empty((n_batch,) + self._frame_shape, dtype=numpy.float64)
+
+        stack = self._batch_stack[:n_batch]
+        for frame_index, frame in enumerate(frames):
+            numpy.copyto(stack[frame_index], frame)
+
+        numpy.min(stack, axis=0, out=self._delta)
+        numpy.minimum(self._min, self._delta, out=self._min)
+        numpy.max(stack, axis=0, out=self._delta)
+        numpy.maximum(self._max, self._delta, out=self._max)
+
+        numpy.mean(stack, axis=0, out=self._batch_mean)
+        stack -= self._batch_mean
+        numpy.square(stack, out=stack)
+        numpy.sum(stack, axis=0, out=self._batch_m2)
+
+        n_previous = self._n_frames
+        self._n_frames += n_batch
+
+        # delta = batch_mean - mean; mean += delta * n_b / n; M2 += M2_b + delta^2 * n_a * n_b / n
+        numpy.subtract(self._batch_mean, self._mean, out=self._delta)
+        numpy.multiply(self._delta, n_batch / self._n_frames, out=self._delta_2)
+        self._mean += self._delta_2
+        numpy.square(self._delta, out=self._delta)
+        self._delta *= n_previous * n_batch / self._n_frames
+        self._m2 += self._batch_m2
+        self._m2 += self._delta
+
+    def _frames_processed(self, n_frames):
+        self._statistics.set("frames", self._n_frames)
+
+        if self.forward_interval and self._n_frames and self._n_frames % self.forward_interval < n_frames:
+            self._forward_maps()
+
+    def _get_variance(self, out):
+        # Sample variance.
+        return numpy.divide(self._m2, max(1, self._n_frames - 1), out=out)
+
+    def _forward_maps(self):
+        if not self._n_frames:
+            self._logger.info("No frames received yet, no maps to forward.")
+            return
+
+        if self._zmq_forwarder is None:
+            self._logger.error("Cannot forward the maps: the processor is not running.")
+            return
+
+        maps = {"mean": self._mean, "variance": self._get_variance(out=self._delta), "min": self._min,
+                "max": self._max}
+
+        for map_name in MAP_NAMES:
+            header = {"htype": "array-1.0",
+                      "type": "float64",
+                      "shape": list(self._frame_shape),
+                      "frame": self._n_forwarded,
+                      "map": map_name,
+                      "n_frames": self._n_frames}
+            self._zmq_forwarder.forward(RawMessage(header, [maps[map_name]]))
+
+        self._n_forwarded += 1
+        self._statistics.set("forwarded_maps", self._n_forwarded)
+
+        # Summary of the forwarded maps, for the REST api.
+        self._statistics.set("mean", maps["mean"].mean())
+        self._statistics.set("variance", maps["variance"].mean())
+        self._statistics.set("min", maps["min"].min())
+        self._statistics.set("max", maps["max"].max())
+
+    def get_maps(self):
+        """
+        Return a copy of the current maps. Only available in the processor process.
+        :return: Dictionary with the mean, variance, min and max maps, or None if no frame was received.
+        """
+        if not self._n_frames:
+            return None
+
+        return {"mean": self._mean.copy(),
+                "variance": self._get_variance(out=None),
+                "min": self._min.copy(),
+                "max": self._max.copy()}
+
+    def get_statistics(self):
+        statistics = self._statistics.get_row()
+        statistics["average_update_time"] = statistics["update_time"] / statistics["frames"] \
+            if statistics["frames"] else 0
+
+        return statistics
+
+    def stop(self):
+        if self._zmq_forwarder is not None:
+            self._zmq_forwarder.stop()
+            self._zmq_forwarder = None
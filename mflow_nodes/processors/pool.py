@@ -0,0 +1,356 @@
+from collections import OrderedDict
+from logging import getLogger
+from multiprocessing import Process, Queue
+from queue import Empty
+from threading import Condition, Event, Thread
+from time import time
+
+from mflow_nodes import config
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_tools.mflow_message import copy_borrowed_message
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+# Type of the items passed to the worker processes.
+_ITEM_MESSAGE = 0
+_ITEM_PARAMETER = 1
+_ITEM_STOP = 2
+
+
+def _worker_function(worker_id, processor, input_queue, result_queue, counters):
+    """
+    Run the processor on the messages received from the input queue.
+    The processor return value is reported back to the pool, together with the message sequence number.
+    """
+    logger = getLogger(__name__)
+    messages_index = counters.get_index("messages")
+    processing_time_index = counters.get_index("processing_time")
+    errors_index = counters.get_index("errors")
+
+    processor.start()
+
+    while True:
+        item_type, sequence, payload = input_queue.get()
+
+        if item_type == _ITEM_STOP:
+            break
+
+        elif item_type == _ITEM_PARAMETER:
+            processor.set_parameter(payload)
+
+        elif item_type == _ITEM_MESSAGE:
+            result = None
+            start_time = time()
+
+            try:
+                result = processor.process_message(payload)
+            except Exception as e:
+                logger.error("Worker %d failed to process message %d. %s", worker_id, sequence, e)
+                counters.values[worker_id, errors_index] += 1
+
+            counters.values[worker_id, processing_time_index] += time() - start_time
+            counters.values[worker_id, messages_index] += 1
+
+            result_queue.put((worker_id, sequence, result))
+
+    processor.stop()
+
+
+def get_pool_processors(processor):
+    """
+    Split the processor into the part run by the pool workers and the output processor, run in the pool process.
+    Processors that forward the stream (the proxy) provide get_pool_processors, so that only the pool process
+    binds the forwarding addresses.
+    :param processor: Processor to run in the pool.
+    :return: (Processor to run in each worker, output processor or None).
+    """
+    if hasattr(processor, "get_pool_processors"):
+        return processor.get_pool_processors()
+
+    return processor, None
+
+
+class ProcessPoolProcessor(BaseProcessor):
+    """
+    MFlow process pool
+
+    Runs the provided processor in multiple worker processes. The messages are dispatched to the workers
+    either round robin or to the least loaded worker. Unless the processor returns False, the messages are
+    passed to the output processor (for example a proxy forwarding the stream) once the workers are done with them.
+    The results are collected by a background thread, so the last messages of a series are passed on even if no
+    new message arrives.
+
+    Pool parameters:
+        dispatch_mode                  "round_robin" or "least_loaded".
+        reorder                        Pass the messages to the output processor in the receiving order. Series
+                                       headers and ends stay between the frames of their series.
+        max_in_flight                  Maximum number of messages dispatched to each worker at once.
+    """
+    _logger = getLogger(__name__)
+
+    ROUND_ROBIN = "round_robin"
+    LEAST_LOADED = "least_loaded"
+
+    def __init__(self, processor, n_workers, dispatch_mode=None, reorder=False, max_in_flight=None,
+                 output_processor=None, name=None):
+        """
+        Initialize the process pool.
+        :param processor: Processor to run in each worker.
+        :param n_workers: Number of worker processes.
+        :param dispatch_mode: Dispatching of messages to workers, "round_robin" or "least_loaded".
+        :param reorder: If True, pass the messages to the output processor in the receiving order.
+        :param max_in_flight: Maximum number of messages dispatched to each worker at once.
+        :param output_processor: Processor to pass the processed messages to, in the pool process.
+        :param name: Name of the pool.
+        """
+        self._processor = processor
+        self._output_processor = output_processor
+        self.__name__ = name or "%s (x%d)" % (getattr(processor, "__name__", processor.__class__.__name__),
+                                               n_workers)
+
+        self._input_queues = None
+        self._result_queue = None
+        self._workers = None
+        self._worker_load = None
+        self._next_worker = 0
+        self._next_sequence = 0
+
+        # Messages waiting for the workers, by dispatching sequence: (message, worker_id).
+        self._in_flight = OrderedDict()
+        # Processed messages waiting for the reordering: sequence -> result.
+        self._completed = {}
+        # Guards the messages in flight, shared by the dispatching and the result collecting thread.
+        self._results_condition = Condition()
+        self._collector_thread = None
+        self._stop_collecting = Event()
+
+        self._statistics = SharedCounters(["messages", "processing_time", "errors", "in_flight"], n_workers)
+        self._in_flight_index = self._statistics.get_index("in_flight")
+
+        # Parameters to set.
+        self.n_workers = n_workers
+        self.dispatch_mode = dispatch_mode or config.DEFAULT_POOL_DISPATCH_MODE
+        self.reorder = reorder
+        self.max_in_flight = max_in_flight or config.DEFAULT_POOL_MAX_IN_FLIGHT
+
+    def _validate_parameters(self):
+        error_message = ""
+
+        if not self.n_workers or self.n_workers < 1:
+            error_message += "Parameter 'n_workers' must be at least 1.\n"
+
+        if self.n_workers != self._statistics.n_rows:
+            error_message += "Parameter 'n_workers' cannot be changed after the pool is created.\n"
+
+        if self.dispatch_mode not in (self.ROUND_ROBIN, self.LEAST_LOADED):
+            error_message += "Parameter 'dispatch_mode' must be '%s' or '%s'.\n" % (self.ROUND_ROBIN,
+                                                                                 self.LEAST_LOADED)
+
+        if error_message:
+            self._logger.error(error_message)
+            raise ValueError(error_message)
+
+    def start(self):
+        self._validate_parameters()
+
+        self._statistics.reset()
+        self._in_flight.clear()
+        self._completed.clear()
+        self._worker_load = [0] * self.n_workers
+        self._next_worker = 0
+        self._next_sequence = 0
+
+        if self._output_processor is not None:
+            self._output_processor.start()
+
+        self._input_queues = [Queue() for _ in range(self.n_workers)]
+        self._result_queue = Queue()
+        self._workers = []
+
+        for worker_id in range(self.n_workers):
+            worker = Process(target=_worker_function,
+                             args=(worker_id, self._processor, self._input_queues[worker_id],
+                                   self._result_queue, self._statistics),
+                             daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        self._stop_collecting.clear()
+        self._collector_thread = Thread(target=self._collect_continuously, name="pool_results", daemon=True)
+        self._collector_thread.start()
+
+        self._logger.debug("Started %d workers with dispatch mode '%s'.", self.n_workers, self.dispatch_mode)
+
+    def _select_worker(self):
+        if self.dispatch_mode == self.LEAST_LOADED:
+            return min(range(self.n_workers), key=self._worker_load.__getitem__)
+
+        worker_id = self._next_worker
+        self._next_worker = (self._next_worker + 1) % self.n_workers
+        return worker_id
+
+    def _pass_to_output(self, sequence, result):
+        message = self._in_flight.pop(sequence)[0]
+
+        if self._output_processor is not None and result is not False:
+            self._output_processor.process_message(message)
+
+    def _release_completed(self):
+        """
+        Pass the completed messages to the output, in dispatching order.
+        The dispatching sequence follows the receiving order, also when the frame indexes restart with a new series,
+        and for the series headers and ends, which have no frame index.
+        """
+        while self._in_flight:
+            sequence = next(iter(self._in_flight))
+
+            if sequence not in self._completed:
+                break
+
+            self._pass_to_output(sequence, self._completed.pop(sequence))
+
+    def _collect_continuously(self):
+        while not self._stop_collecting.is_set():
+            try:
+                self._collect_results(timeout=config.DEFAULT_DATA_QUEUE_TIMEOUT)
+            except Exception as e:
+                self._logger.error("Failed to pass the processed messages to the output. %s", e)
+
+    def _collect_results(self, timeout):
+        """
+        Collect the results from the workers, and pass the completed messages to the output.
+        :param timeout: Time to wait for the first result.
+        """
+        try:
+            result = self._result_queue.get(timeout=timeout)
+        except Empty:
+            return
+
+        with self._results_condition:
+            while result is not None:
+                worker_id, sequence, processor_result = result
+
+                self._worker_load[worker_id] -= 1
+                self._statistics.values[worker_id, self._in_flight_index] = self._worker_load[worker_id]
+
+                if self.reorder:
+                    self._completed[sequence] = processor_result
+                else:
+                    self._pass_to_output(sequence, processor_result)
+
+                try:
+                    result = self._result_queue.get_nowait()
+                except Empty:
+                    result = None
+
+            if self.reorder:
+                self._release_completed()
+
+            self._results_condition.notify_all()
+
+    def process_message(self, message):
+        # The message is queued to the worker and kept for the output after its ring buffer slot is released.
+        message = copy_borrowed_message(message)
+
+        with self._results_condition:
+            # Wait for the workers, if all of them are busy.
+            while len(self._in_flight) >= self.max_in_flight * self.n_workers:
+                self._results_condition.wait(config.DEFAULT_DATA_QUEUE_TIMEOUT)
+
+                if not self.is_running():
+                    raise ValueError("Pool workers are not running anymore.")
+
+            worker_id = self._select_worker()
+            sequence = self._next_sequence
+            self._next_sequence += 1
+
+            self._in_flight[sequence] = (message, worker_id)
+            self._worker_load[worker_id] += 1
+            self._statistics.values[worker_id, self._in_flight_index] = self._worker_load[worker_id]
+
+        self._input_queues[worker_id].put((_ITEM_MESSAGE, sequence, message))
+
+    def set_parameter(self, parameter):
+        name = parameter[0]
+
+        # Pool parameters are set on the pool itself.
+        if name in ("n_workers", "dispatch_mode", "reorder", "max_in_flight"):
+            super(ProcessPoolProcessor, self).set_parameter(parameter)
+            return
+
+        # Forwarding parameters (the binding address, for example) are set on the output processor only.
+        if self._output_processor is not None and hasattr(self._output_processor, name):
+            self._output_processor.set_parameter(parameter)
+
+            if not hasattr(self._processor, name):
+                return
+
+        self._processor.set_parameter(parameter)
+
+        # The running workers receive the parameter before the next dispatched message.
+        if self._workers:
+            for input_queue in self._input_queues:
+                input_queue.put((_ITEM_PARAMETER, None, parameter))
+
+    def get_parameters(self):
+        parameters = OrderedDict()
+
+        for processor in (self._output_processor, self._processor):
+            if processor is not None:
+                parameters.update((key, value) for key, value in sorted(vars(processor).items())
+                                  if not key.startswith('_'))
+
+        parameters.update((key, value) for key, value in sorted(vars(self).items()) if not key.startswith('_'))
+
+        return parameters
+
+    def get_statistics(self):
+        totals = self._statistics.get_totals()
+        workers = self._statistics.get_rows()
+
+        for worker_statistics in [totals] + workers:
+            worker_statistics["average_processing_time"] = \
+                worker_statistics["processing_time"] / worker_statistics["messages"] \
+                if worker_statistics["messages"] else 0
+
+        statistics = OrderedDict([("total", totals),
+                                  ("workers", workers)])
+
+        if hasattr(self._output_processor, "get_statistics"):
+            statistics["output"] = self._output_processor.get_statistics()
+
+        return statistics
+
+    def is_running(self):
+        return bool(self._workers) and all(worker.is_alive() for worker in self._workers)
+
+    def stop(self):
+        if self._workers:
+            for input_queue in self._input_queues:
+                input_queue.put((_ITEM_STOP, None, None))
+
+            # Wait for the messages still being processed.
+            stop_time = time() + config.DEFAULT_SHUTDOWN_TIMEOUT
+            with self._results_condition:
+                while self._in_flight and time() < stop_time and \
+                        any(worker.is_alive() for worker in self._workers):
+                    self._results_condition.wait(config.DEFAULT_DATA_QUEUE_TIMEOUT)
+
+            self._stop_collecting.set()
+            self._collector_thread.join()
+            self._collector_thread = None
+
+            if self._in_flight:
+                self._logger.warning("Pool stopped with %d messages still in flight.", len(self._in_flight))
+                self._in_flight.clear()
+                self._completed.clear()
+
+            for worker in self._workers:
+                worker.join(config.DEFAULT_SHUTDOWN_TIMEOUT)
+
+                if worker.is_alive():
+                    worker.terminate()
+
+            self._workers = None
+
+        if self._output_processor is not None:
+            self._output_processor.stop()
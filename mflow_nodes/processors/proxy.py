@@ -1,7 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from logging import getLogger
+from time import time
 
+from mflow_nodes import config
 from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_tools.async_forwarder import AsyncMFlowForwarder, OVERFLOW_POLICIES, SEND_STATISTICS, \
+    get_send_statistics
 from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import copy_borrowed_message
+from mflow_nodes.stream_tools.ordered_results import OrderedResultSender
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+
+def _timed_proxy_function(proxy_function, message):
+    """
+    Run the proxy function and measure its duration (in the worker, when running concurrently).
+    """
+    start_time = time()
+    result = proxy_function(message)
+
+    return result, time() - start_time
+
+
+def _forward_all(message):
+    return True
+
+
+class ProxyFunctionProcessor(BaseProcessor):
+    """
+    Runs only the proxy function, without forwarding the messages. Returns False for the messages the proxy
+    function filtered out. Used by the process pool workers, while the proxy forwards from the pool process.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, proxy_function, name="Proxy function"):
+        self._proxy_function = proxy_function
+        self.__name__ = name
+
+    def process_message(self, message):
+        return bool(self._proxy_function(message))
 
 
 class ProxyProcessor(BaseProcessor):
@@ -16,7 +53,19 @@ class ProxyProcessor(BaseProcessor):
         stop                           Stop the proxy.
 
     Proxy parameters:
-        forwarding_address             Address to forward the stream to.
+        binding_address                Address to forward the stream to, or list of addresses.
+        distribution                   With multiple addresses, "broadcast" or "load_balance" the messages.
+        non_blocking_addresses         Addresses that drop the messages when full, instead of stalling the proxy.
+        proxy_workers                  Number of workers running the proxy function concurrently. 0 runs it
+                                       synchronously, before each forward. The forwarding order is kept.
+                                       A concurrent proxy can only be the last stage of a processor chain.
+        proxy_executor                 "thread" or "process". Process workers need a picklable proxy function.
+        max_in_flight                  Maximum number of messages waiting for the proxy function workers.
+        send_queue_size                Size of the outbound queue of the background sender. 0 sends the messages
+                                       from the processing thread.
+        send_overflow_policy           "block", "drop" or "spill" the messages when the outbound queue is full.
+        send_hwm                       ZMQ high water mark of the forwarding sockets.
+        spill_directory                Directory for the spilled messages.
     """
     _logger = getLogger(__name__)
 
@@ -30,8 +79,25 @@ class ProxyProcessor(BaseProcessor):
         self._proxy_function = proxy_function
         self.__name__ = name
 
+        self._executor = None
+        # Forwards the messages processed by the workers, in receiving order, as soon as they are done.
+        self._result_sender = None
+        self._statistics = SharedCounters(["messages", "forwarded", "in_flight", "max_in_flight",
+                                           "proxy_function_time", "latency", "start_time", "send_queue_size",
+                                           "proxy_workers"])
+        self._send_statistics = SharedCounters(SEND_STATISTICS)
+
         # Parameters to set.
         self.binding_address = None
+        self.distribution = config.DEFAULT_FORWARDER_DISTRIBUTION
+        self.non_blocking_addresses = []
+        self.proxy_workers = 0
+        self.proxy_executor = config.DEFAULT_PROXY_EXECUTOR
+        self.max_in_flight = config.DEFAULT_PROXY_MAX_IN_FLIGHT
+        self.send_queue_size = 0
+        self.send_overflow_policy = config.DEFAULT_SEND_OVERFLOW_POLICY
+        self.send_hwm = config.DEFAULT_ZMQ_QUEUE_LENGTH
+        self.spill_directory = None
 
     def _validate_parameters(self):
         error_message = ""
@@ -39,6 +105,19 @@ class ProxyProcessor(BaseProcessor):
         if not self.binding_address:
             error_message += "Parameter 'binding_address' not set.\n"
 
+        unknown_addresses = set(self.non_blocking_addresses or []) - set(self._get_binding_addresses())
+        if unknown_addresses:
+            error_message += "Non blocking addresses %s are not binding addresses.\n" % sorted(unknown_addresses)
+
+        if self.proxy_executor not in ("thread", "process"):
+            error_message += "Parameter 'proxy_executor' must be 'thread' or 'process'.\n"
+
+        if self.proxy_workers and (not self.max_in_flight or self.max_in_flight < 1):
+            error_message += "Parameter 'max_in_flight' must be at least 1.\n"
+
+        if self.send_queue_size and self.send_overflow_policy not in OVERFLOW_POLICIES:
+            error_message += "Parameter 'send_overflow_policy' must be one of %s.\n" % OVERFLOW_POLICIES
+
         if not callable(self._proxy_function):
             error_message += "Parameter 'proxy_function' is not a valid function\n"
 
@@ -46,21 +125,154 @@ class ProxyProcessor(BaseProcessor):
             self._logger.error(error_message)
             raise ValueError(error_message)
 
+    def get_pool_processors(self):
+        """
+        Split the proxy for the process pool: the workers run the proxy function, and a forwarding only proxy,
+        with the same parameters, binds the forwarding addresses in the pool process.
+        :return: (Processor to run in each worker, processor forwarding the processed messages).
+        """
+        forwarding_proxy = ProxyProcessor(_forward_all, name=self.__name__)
+        forwarding_proxy.__dict__.update((key, value) for key, value in vars(self).items()
+                                         if not key.startswith("_"))
+
+        return ProxyFunctionProcessor(self._proxy_function, name=self.__name__), forwarding_proxy
+
+    def _get_binding_addresses(self):
+        if isinstance(self.binding_address, (list, tuple)):
+            return list(self.binding_address)
+
+        return [self.binding_address]
+
     def start(self):
         self._logger.debug("Proxy started.")
         # Check if all the needed input parameters are available.
         self._validate_parameters()
 
         self._logger.debug("Stream forwarding address='%s'." % self.binding_address)
-        self._zmq_forwarder = MFlowForwarder()
-        self._zmq_forwarder.start(self.binding_address)
+        binding_addresses = self._get_binding_addresses()
+        non_blocking_addresses = self.non_blocking_addresses or []
+
+        self._zmq_forwarder = MFlowForwarder(distribution=self.distribution, queue_size=self.send_hwm)
+
+        if self.send_queue_size:
+            self._logger.debug("Sending from a background thread, with a queue of %d messages." %
+                               self.send_queue_size)
+            self._zmq_forwarder = AsyncMFlowForwarder(self._zmq_forwarder,
+                                                      queue_size=self.send_queue_size,
+                                                      overflow_policy=self.send_overflow_policy,
+                                                      spill_directory=self.spill_directory,
+                                                      statistics=self._send_statistics)
+
+        self._zmq_forwarder.start(binding_addresses,
+                                  block=[address not in non_blocking_addresses for address in binding_addresses])
+
+        self._statistics.reset()
+        self._statistics.set("start_time", time())
+        # The statistics are read from the REST process, where the parameters are not set.
+        self._statistics.set("send_queue_size", self.send_queue_size)
+        self._statistics.set("proxy_workers", self.proxy_workers)
+
+        if self.proxy_workers:
+            self._logger.debug("Running the proxy function in %d %s workers." % (self.proxy_workers,
+                                                                                  self.proxy_executor))
+            executor_class = ThreadPoolExecutor if self.proxy_executor == "thread" else ProcessPoolExecutor
+            self._executor = executor_class(max_workers=self.proxy_workers)
+
+            self._result_sender = OrderedResultSender(self._forward_result, self.max_in_flight, name="proxy_sender")
+            self._result_sender.start()
 
     def process_message(self, message):
         self._logger.debug("Received frame '%d'. Passing to proxy function." % message.get_frame_index())
-        forward_message = self._proxy_function(message)
+        self._statistics.add("messages")
+
+        # The proxy function result is not known yet: the proxy has to be the last stage of a processor chain.
+        if self._executor is not None:
+            self._submit(message)
+            return None
+
+        forward_message, proxy_function_time = _timed_proxy_function(self._proxy_function, message)
+        self._statistics.add("proxy_function_time", proxy_function_time)
+        self._statistics.add("latency", proxy_function_time)
+
+        self._forward(message, forward_message)
 
+        # Not forwarded messages are dropped also when the proxy is a stage of a processor chain.
+        return bool(forward_message)
+
+    def _forward(self, message, forward_message):
         if forward_message:
+            # The background sender sends the message after its ring buffer slot is released.
+            if self.send_queue_size:
+                message = copy_borrowed_message(message)
+
             self._zmq_forwarder.forward(message.raw_message)
+            self._statistics.add("forwarded")
+
+    def is_concurrent(self):
+        """
+        Return True if process_message returns before the proxy function ran on the message.
+        """
+        return bool(self.proxy_workers)
+
+    def _submit(self, message):
+        # The message is kept after process_message returns, when a ring buffer slot is released.
+        message = copy_borrowed_message(message)
+
+        future = self._executor.submit(_timed_proxy_function, self._proxy_function, message)
+        # Waits for the oldest message, if too many are in flight.
+        n_in_flight = self._result_sender.submit((message, time()), future)
+
+        self._statistics.set("in_flight", n_in_flight)
+        if n_in_flight > self._statistics.get("max_in_flight"):
+            self._statistics.set("max_in_flight", n_in_flight)
+
+    def _forward_result(self, item, future):
+        """
+        Forward the message once its proxy function is done, from the result sender thread.
+        """
+        message, submit_time = item
+
+        try:
+            forward_message, proxy_function_time = future.result()
+        except Exception as e:
+            self._logger.error("Proxy function failed on frame %d. %s", message.get_frame_index(), e)
+            forward_message, proxy_function_time = False, 0
+
+        self._statistics.add("proxy_function_time", proxy_function_time)
+        self._statistics.add("latency", time() - submit_time)
+
+        self._forward(message, forward_message)
+
+        # This message is still counted by the sender.
+        self._statistics.set("in_flight", len(self._result_sender) - 1)
+
+    def get_statistics(self):
+        statistics = self._statistics.get_row()
+        n_messages = statistics["messages"] - statistics["in_flight"]
+        elapsed_time = time() - statistics.pop("start_time")
+        send_queue_size = statistics.pop("send_queue_size")
+        proxy_workers = statistics.pop("proxy_workers")
+
+        statistics["average_proxy_function_time"] = statistics["proxy_function_time"] / n_messages \
+            if n_messages else 0
+        statistics["average_latency"] = statistics["latency"] / n_messages if n_messages else 0
+        # Fraction of the time the proxy function workers were busy.
+        statistics["utilization"] = statistics["proxy_function_time"] / (elapsed_time * max(1, proxy_workers)) \
+            if elapsed_time > 0 else 0
+
+        if send_queue_size:
+            statistics["send"] = get_send_statistics(self._send_statistics)
+
+        return statistics
 
     def stop(self):
+        if self._executor is not None:
+            # Forward the messages still in flight.
+            self._result_sender.stop()
+            self._result_sender = None
+            self._statistics.set("in_flight", 0)
+
+            self._executor.shutdown()
+            self._executor = None
+
         self._zmq_forwarder.stop()
@@ -0,0 +1,97 @@
+import json
+from logging import getLogger
+from time import time
+
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+from mflow_nodes.stream_tools.stream_recording import StreamRecordingWriter
+
+
+class RecorderProcessor(BaseProcessor):
+    """
+    MFlow stream recorder
+
+    Appends the raw multipart messages (header and data frames, as received) to a segment file, with an offset
+    index of the messages next to it. Use StreamRecordingReader to read the messages back, or the m_replay.py
+    script to send the recorded stream again.
+
+    The messages should be received in passthrough mode, to record the ZMQ frames exactly as they were sent.
+    Otherwise, the header is encoded again, and the data frames are recorded as received.
+
+    Recorder parameters:
+        output_file                    Path of the segment file.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, name="Stream recorder"):
+        """
+        Initialize the stream recorder.
+        :param name: Name of the recorder.
+        """
+        self.__name__ = name
+
+        self._writer = None
+        self._statistics = SharedCounters(["messages", "bytes", "write_time"])
+
+        # Parameters to set.
+        self.output_file = None
+
+    def _validate_parameters(self):
+        error_message = ""
+
+        if not self.output_file:
+            error_message += "Parameter 'output_file' not set.\n"
+
+        if error_message:
+            self._logger.error(error_message)
+            raise ValueError(error_message)
+
+    def start(self):
+        self._logger.debug("Recorder started.")
+        # Check if all the needed input parameters are available.
+        self._validate_parameters()
+
+        self._logger.debug("Recording the stream to '%s'." % self.output_file)
+
+        self._writer = StreamRecordingWriter(self.output_file)
+        self._statistics.reset()
+
+    @staticmethod
+    def _get_parts(raw_message):
+        # Frames received in passthrough mode, as they were sent.
+        if raw_message.zmq_frames is not None:
+            return [frame.buffer for frame in raw_message.zmq_frames]
+
+        return [json.dumps(raw_message.data["header"]).encode()] + list(raw_message.data["data"])
+
+    def process_message(self, message):
+        start_time = time()
+
+        raw_message = message.raw_message
+        try:
+            parts = self._get_parts(raw_message)
+        except (KeyError, TypeError):
+            self._logger.error("Message with htype '%s' has no raw data frames. Receive the stream in passthrough "
+                               "or raw mode to record it. Skipping." % message.htype)
+            return
+
+        frame_index = raw_message.data["header"].get("frame", -1)
+        size = self._writer.write(parts, frame_index, start_time)
+
+        self._statistics.add("messages")
+        self._statistics.add("bytes", size)
+        self._statistics.add("write_time", time() - start_time)
+
+    def get_statistics(self):
+        statistics = self._statistics.get_row()
+        statistics["average_write_time"] = statistics["write_time"] / statistics["messages"] \
+            if statistics["messages"] else 0
+
+        return statistics
+
+    def stop(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+            self._logger.info("Recorded %d messages to '%s'." % (self._statistics.get("messages"), self.output_file))
@@ -0,0 +1,368 @@
+from logging import getLogger
+from time import time
+
+import numpy
+
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import RawMessage
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+MODE_SUM = "sum"
+MODE_MEAN = "mean"
+
+
+def get_sum_dtype(dtype):
+    """
+    Return the data type to sum the values of the provided type without overflowing.
+    :param dtype: Data type of the values.
+    :return: numpy.dtype of the sum.
+    """
+    dtype = numpy.dtype(dtype)
+
+    if dtype.kind == "u":
+        return numpy.dtype(numpy.uint64)
+    elif dtype.kind in "ib":
+        return numpy.dtype(numpy.int64)
+
+    return numpy.dtype(numpy.float64)
+
+
+class ReductionProcessor(BaseProcessor):
+    """
+    Base for the processors forwarding a reduced array-1.0 stream. By itself, it forwards each frame unchanged, as
+    an array-1.0 message (converting, for example, a decoded dimage-1.0 stream into an array-1.0 stream).
+    The messages without a frame (the series headers and ends) are forwarded unchanged.
+
+    The output buffers are allocated once for each frame shape and type, and again only when the reduction
+    parameters change. The forwarder copies the buffers when sending them, so they are reused for the next frame.
+
+    Reduction parameters:
+        binding_address                Address to forward the reduced stream to.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, name="Reduction node"):
+        """
+        Initialize the reduction processor.
+        :param name: Name of the processor.
+        """
+        self.__name__ = name
+
+        self._zmq_forwarder = None
+        # Shape and type of the frames the buffers are allocated for.
+        self._buffers_key = None
+        self._statistics = SharedCounters(["messages", "forwarded", "passed", "reduction_time"])
+
+        # Parameters to set.
+        self.binding_address = None
+
+    def _validate_parameters(self):
+        error_message = ""
+
+        if not self.binding_address:
+            error_message += "Parameter 'binding_address' not set.\n"
+
+        error_message += self._validate_reduction_parameters()
+
+        if error_message:
+            self._logger.error(error_message)
+            raise ValueError(error_message)
+
+    def _validate_reduction_parameters(self):
+        """
+        Validate the parameters of the reduction.
+        :return: Error message, empty if the parameters are valid.
+        """
+        return ""
+
+    def start(self):
+        self._logger.debug("%s started." % self.__name__)
+        # Check if all the needed input parameters are available.
+        self._validate_parameters()
+
+        self._logger.debug("Forwarding the reduced stream to '%s'." % self.binding_address)
+
+        self._zmq_forwarder = MFlowForwarder()
+        self._zmq_forwarder.start(self.binding_address)
+
+        self._statistics.reset()
+        self._buffers_key = None
+
+    def set_parameter(self, parameter):
+        super(ReductionProcessor, self).set_parameter(parameter)
+
+        # Allocate the buffers for the new parameters with the next frame.
+        if self._zmq_forwarder is not None:
+            self._validate_parameters()
+            self._buffers_key = None
+
+    def process_message(self, message):
+        self._statistics.add("messages")
+
+        try:
+            frame = message.get_array()
+        except ValueError:
+            # Messages without a frame (the series headers and ends) delimit the series: forward them unchanged,
+            # after what is left of the previous series.
+            self._end_series()
+
+            self._zmq_forwarder.forward(message.raw_message)
+            self._statistics.add("passed")
+            return
+
+        start_time = time()
+
+        buffers_key = (frame.shape, frame.dtype)
+        if buffers_key != self._buffers_key:
+            self._allocate_buffers(frame.shape, frame.dtype)
+            self._buffers_key = buffers_key
+
+        reduced_frames = self._reduce(frame, message.get_frame_index())
+
+        self._statistics.add("reduction_time", time() - start_time)
+
+        for frame_index, reduced_frame, header_fields in reduced_frames:
+            self._forward(frame_index, reduced_frame, header_fields)
+
+    def _allocate_buffers(self, shape, dtype):
+        """
+        Allocate the output buffers for the frames of the provided shape and type.
+        """
+        pass
+
+    def _reduce(self, frame, frame_index):
+        """
+        Reduce the frame into the output buffers. The frame is forwarded unchanged, if not overridden.
+        :param frame: Read only frame array.
+        :param frame_index: Index of the frame.
+        :return: List of (frame index, reduced array, additional header fields) to forward.
+        """
+        return [(frame_index, frame, None)]
+
+    def _end_series(self):
+        """
+        Forward what is left of the reduction of the series, before the series end or the next series header.
+        """
+        pass
+
+    def _forward(self, frame_index, reduced_frame, header_fields=None):
+        header = {"htype": "array-1.0",
+                  "type": reduced_frame.dtype.name,
+                  "shape": list(reduced_frame.shape),
+                  "frame": frame_index}
+
+        if header_fields:
+            header.update(header_fields)
+
+        self._zmq_forwarder.forward(RawMessage(header, [reduced_frame]))
+        self._statistics.add("forwarded")
+
+    def get_statistics(self):
+        statistics = self._statistics.get_row()
+
+        n_reduced = statistics["messages"] - statistics["passed"]
+        statistics["average_reduction_time"] = statistics["reduction_time"] / n_reduced if n_reduced else 0
+
+        return statistics
+
+    def stop(self):
+        if self._zmq_forwarder is not None:
+            self._zmq_forwarder.stop()
+            self._zmq_forwarder = None
+
+
+class BinningProcessor(ReductionProcessor):
+    """
+    MFlow binning
+
+    Sums or averages blocks of binning_factor x binning_factor pixels. The pixels that do not fill a whole block
+    (at the bottom and right edges) are left out.
+
+    Binning parameters:
+        binding_address                Address to forward the binned stream to.
+        binning_factor                 Size of the pixel blocks.
+        binning_mode                   "sum" or "mean" of the pixel blocks.
+    """
+
+    def __init__(self, name="Binning node"):
+        super(BinningProcessor, self).__init__(name)
+
+        self._binned_frame = None
+
+        # Parameters to set.
+        self.binning_factor = 2
+        self.binning_mode = MODE_SUM
+
+    def _validate_reduction_parameters(self):
+        error_message = ""
+
+        if not isinstance(self.binning_factor, int) or self.binning_factor < 1:
+            error_message += "Parameter 'binning_factor' must be a positive integer.\n"
+
+        if self.binning_mode not in (MODE_SUM, MODE_MEAN):
+            error_message += "Parameter 'binning_mode' must be '%s' or '%s'.\n" % (MODE_SUM, MODE_MEAN)
+
+        return error_message
+
+    def _allocate_buffers(self, shape, dtype):
+        binned_shape = (shape[0] // self.binning_factor, shape[1] // self.binning_factor)
+        binned_dtype = numpy.float64 if self.binning_mode == MODE_MEAN else get_sum_dtype(dtype)
+
+        self._binned_frame = numpy.empty(binned_shape, dtype=binned_dtype)
+
+    def _reduce(self, frame, frame_index):
+        factor = self.binning_factor
+        n_rows, n_columns = self._binned_frame.shape
+        frame = frame[:n_rows * factor, :n_columns * factor]
+
+        # Adding the strided pixels of each block offset is much faster than reducing the blocks over 2 axes.
+        self._binned_frame.fill(0)
+        for row_offset in range(factor):
+            for column_offset in range(factor):
+                numpy.add(self._binned_frame, frame[row_offset::factor, column_offset::factor],
+                          out=self._binned_frame, casting="unsafe")
+
+        if self.binning_mode == MODE_MEAN:
+            self._binned_frame /= factor * factor
+
+        return [(frame_index, self._binned_frame, {"binning_factor": factor})]
+
+
+class ROIProcessor(ReductionProcessor):
+    """
+    MFlow ROI
+
+    Crops the regions of interest of each frame, and forwards each of them as a separate message. The "roi" header
+    field holds the index of the region.
+
+    ROI parameters:
+        binding_address                Address to forward the regions to.
+        rois                           List of regions [y_start, y_stop, x_start, x_stop], in pixels.
+    """
+
+    def __init__(self, name="ROI node"):
+        super(ROIProcessor, self).__init__(name)
+
+        self._roi_frames = []
+
+        # Parameters to set.
+        self.rois = []
+
+    def _validate_reduction_parameters(self):
+        error_message = ""
+
+        if not self.rois:
+            error_message += "Parameter 'rois' not set.\n"
+
+        for roi in self.rois or []:
+            if len(roi) != 4 or roi[0] >= roi[1] or roi[2] >= roi[3] or min(roi) < 0:
+                error_message += "ROI %s is not a valid [y_start, y_stop, x_start, x_stop] region.\n" % (roi,)
+
+        return error_message
+
+    def _allocate_buffers(self, shape, dtype):
+        for y_start, y_stop, x_start, x_stop in self.rois:
+            if y_stop > shape[0] or x_stop > shape[1]:
+                raise ValueError("ROI %s is outside of the frame with shape %s." %
+                                 ([y_start, y_stop, x_start, x_stop], list(shape)))
+
+        self._roi_frames = [numpy.empty((y_stop - y_start, x_stop - x_start), dtype=dtype)
+                            for y_start, y_stop, x_start, x_stop in self.rois]
+
+    def _reduce(self, frame, frame_index):
+        reduced_frames = []
+
+        for roi_index, (roi, roi_frame) in enumerate(zip(self.rois, self._roi_frames)):
+            y_start, y_stop, x_start, x_stop = roi
+            numpy.copyto(roi_frame, frame[y_start:y_stop, x_start:x_stop])
+
+            reduced_frames.append((frame_index, roi_frame, {"roi": roi_index}))
+
+        return reduced_frames
+
+
+class SummationProcessor(ReductionProcessor):
+    """
+    MFlow summation
+
+    Sums or averages every n_frames frames, and forwards the result. The "frame" header field is the index of the
+    summed frame in the series, and "first_frame" the index of the first frame in the sum. Frames of different series
+    are not summed together: the partial sum is forwarded at the end of the series.
+
+    Summation parameters:
+        binding_address                Address to forward the summed stream to.
+        n_frames                       Number of frames to sum.
+        summation_mode                 "sum" or "mean" of the frames.
+    """
+
+    def __init__(self, name="Summation node"):
+        super(SummationProcessor, self).__init__(name)
+
+        self._sum_frame = None
+        self._mean_frame = None
+        self._n_summed = 0
+        self._n_forwarded = 0
+        self._first_frame = None
+
+        # Parameters to set.
+        self.n_frames = 10
+        self.summation_mode = MODE_SUM
+
+    def _validate_reduction_parameters(self):
+        error_message = ""
+
+        if not isinstance(self.n_frames, int) or self.n_frames < 1:
+            error_message += "Parameter 'n_frames' must be a positive integer.\n"
+
+        if self.summation_mode not in (MODE_SUM, MODE_MEAN):
+            error_message += "Parameter 'summation_mode' must be '%s' or '%s'.\n" % (MODE_SUM, MODE_MEAN)
+
+        return error_message
+
+    def _allocate_buffers(self, shape, dtype):
+        self._sum_frame = numpy.zeros(shape, dtype=get_sum_dtype(dtype))
+        self._mean_frame = numpy.empty(shape, dtype=numpy.float64) if self.summation_mode == MODE_MEAN else None
+
+        # A partial sum of the previous parameters is discarded.
+        self._n_summed = 0
+        self._n_forwarded = 0
+
+    def _reduce(self, frame, frame_index):
+        if self._n_summed == 0:
+            self._first_frame = frame_index
+
+        numpy.add(self._sum_frame, frame, out=self._sum_frame, casting="unsafe")
+        self._n_summed += 1
+
+        if self._n_summed < self.n_frames:
+            return []
+
+        return [self._get_summed_frame()]
+
+    def _get_summed_frame(self):
+        """
+        :return: (frame index, summed array, additional header fields) of the current sum.
+        """
+        if self._mean_frame is not None:
+            numpy.divide(self._sum_frame, self._n_summed, out=self._mean_frame)
+            summed_frame = self._mean_frame
+        else:
+            summed_frame = self._sum_frame
+
+        return self._n_forwarded, summed_frame, {"first_frame": self._first_frame, "n_frames": self._n_summed}
+
+    def _end_series(self):
+        if self._n_summed:
+            self._forward(*self._get_summed_frame())
+
+        # The summed frames of the next series are numbered from 0.
+        self._n_forwarded = 0
+
+    def _forward(self, frame_index, reduced_frame, header_fields=None):
+        super(SummationProcessor, self)._forward(frame_index, reduced_frame, header_fields)
+
+        # The sum buffer is sent: start the next sum.
+        self._sum_frame.fill(0)
+        self._n_summed = 0
+        self._n_forwarded += 1
@@ -0,0 +1,99 @@
+import asyncio
+from logging import getLogger
+from threading import Thread
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+from mflow_nodes.rest_api.rest_server import get_web_application
+
+_logger = getLogger(__name__)
+
+
+async def serve_web_interface(process, instance_name, host, port):
+    """
+    Serve the web interface for the supplied process, next to the running event loop.
+    Same routes and handlers as the Bottle web interface of the process nodes (get_web_application): the requests
+    are served in a thread, and the process methods are called in the event loop, between messages.
+    Process methods can be either plain functions or coroutines.
+    :param process: Process to control (for example AsyncNodeManager).
+    :param instance_name: Name if this processor instance. Used to set url paths.
+    :param host: Host to start the web interface on.
+    :param port: Port to start the web interface on.
+    :return: AsyncWebInterface, to close the web interface.
+    """
+    app = get_web_application(EventLoopProcess(process, asyncio.get_running_loop()), instance_name)
+
+    host = host.replace("http://", "").replace("https://", "")
+    _logger.info("Starting web interface on %s:%s.", host, port)
+
+    return AsyncWebInterface(make_server(host, port, app, handler_class=_RequestHandler))
+
+
+class EventLoopProcess(object):
+    """
+    Wrap the process, to call its methods in the event loop from the web interface thread.
+    The call waits for the result, and for the coroutine to complete if the method returns one.
+    """
+
+    def __init__(self, process, loop):
+        """
+        Constructor.
+        :param process: Process to wrap.
+        :param loop: Event loop the process runs in.
+        """
+        self._process = process
+        self._loop = loop
+
+    def __getattr__(self, name):
+        method = getattr(self._process, name)
+
+        def call_in_loop(*args):
+            return asyncio.run_coroutine_threadsafe(_call(method, *args), self._loop).result()
+
+        return call_in_loop
+
+
+async def _call(method, *args):
+    result = method(*args)
+
+    if asyncio.iscoroutine(result):
+        result = await result
+
+    return result
+
+
+class AsyncWebInterface(object):
+    """
+    WSGI server of the web interface, serving the requests one at the time in its own thread (like Bottle).
+    """
+
+    def __init__(self, server):
+        """
+        Start serving.
+        :param server: Bound WSGI server.
+        """
+        self._server = server
+        self._thread = Thread(target=self._serve, name="web_interface", daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def close(self):
+        """
+        Stop serving. A request in progress might be waiting for the event loop, so this does not wait for it.
+        """
+        Thread(target=self._server.shutdown, daemon=True).start()
+
+    async def wait_closed(self):
+        """
+        Wait until the server stopped and closed its socket.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+
+
+class _RequestHandler(WSGIRequestHandler):
+    def log_request(self, code="-", size="-"):
+        _logger.debug("%s %s", self.requestline, code)
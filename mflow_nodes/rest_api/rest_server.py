@@ -21,6 +21,27 @@ def start_web_interface(process, instance_name, host, port):
     :param port: Port to start the web interface on.
     :return: None
     """
+    app = get_web_application(process, instance_name)
+
+    try:
+        host = host.replace("http://", "").replace("https://", "")
+        run(app=app, host=host, port=port)
+    finally:
+        # Close the external processor when terminating the web server.
+
+        # Wait for the external process poll timeout.
+        time.sleep(config.DEFAULT_IPC_POLL_TIMEOUT * 2)
+
+        process.stop()
+
+
+def get_web_application(process, instance_name):
+    """
+    Return the Bottle application of the web interface: the REST api of the supplied process and the web page.
+    :param process: External process to communicate with.
+    :param instance_name: Name if this processor instance. Used to set url paths.
+    :return: Bottle application (WSGI).
+    """
     app = Bottle()
     static_root_path = os.path.join(os.path.dirname(__file__), "static")
     _logger.debug("Static files root folder: %s", static_root_path)
@@ -56,7 +77,9 @@ def start_web_interface(process, instance_name, host, port):
     @app.get(api_path.format(url="statistics"))
     def get_statistics():
         return {"status": "ok",
-                "data": {"statistics": process.get_statistics()}}
+                "data": {"statistics": process.get_statistics(),
+                         "processor_statistics": process.get_processor_statistics(),
+                         "handoff_statistics": process.get_handoff_statistics()}}
 
     @app.get(api_path.format(url="statistics_raw"))
     def get_statistics_raw():
@@ -146,16 +169,7 @@ def start_web_interface(process, instance_name, host, port):
         return json.dumps({"status": "error",
                            "message": str(error.exception)})
 
-    try:
-        host = host.replace("http://", "").replace("https://", "")
-        run(app=app, host=host, port=port)
-    finally:
-        # Close the external processor when terminating the web server.
-
-        # Wait for the external process poll timeout.
-        time.sleep(config.DEFAULT_IPC_POLL_TIMEOUT * 2)
-
-        process.stop()
+    return app
 
 
 class RestInterfacedProcess(object):
@@ -227,6 +241,20 @@ class RestInterfacedProcess(object):
         """
         pass
 
+    def get_processor_statistics(self):
+        """
+        Get the statistics reported by the processor itself.
+        :return: Dictionary of processor statistics, or None if not available.
+        """
+        pass
+
+    def get_handoff_statistics(self):
+        """
+        Get the statistics of the hand-off between the receivers and the processor (queue occupancy, dropped frames).
+        :return: Dictionary of hand-off statistics, or None if not available.
+        """
+        pass
+
     def reset(self):
         """
         Reset the status of the integration.
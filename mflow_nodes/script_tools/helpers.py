@@ -5,6 +5,7 @@ import sys
 from collections import OrderedDict
 
 from mflow_nodes import config
+from mflow_nodes.async_stream_node import start_async_stream_node
 from mflow_nodes.stream_node import start_stream_node
 
 _logger = logging.getLogger(__name__)
@@ -23,20 +24,52 @@ def add_default_arguments(parser, binding_argument=False, default_rest_host=None
 
     parser.add_argument("instance_name", type=str, help="Name of the node instance. Should be unique.")
     parser.add_argument("connect_address", type=str, help="Connect address for mflow receiver.\n"
-                                                          "Example: tcp://127.0.0.1:40000")
+                                                          "Example: tcp://127.0.0.1:40000\n"
+                                                          "Multiple comma separated addresses are merged.")
     if binding_argument:
         parser.add_argument("binding_address", type=str, help="Binding address for mflow stream forwarding.\n"
-                                                              "Example: tcp://127.0.0.1:40001")
+                                                              "Example: tcp://127.0.0.1:40001\n"
+                                                              "Multiple comma separated addresses are "
+                                                              "supported.")
     parser.add_argument("--config_file", type=str, default=None, help="Config file with the detector properties.")
     parser.add_argument("--log_level", default=config.DEFAULT_LOGGING_LEVEL,
                         choices=['CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG'],
                         help="Log level to use.")
     parser.add_argument("--raw", action='store_true', help="Receive and send mflow messages with raw handler.")
+    parser.add_argument("--passthrough", action='store_true',
+                        help="Keep the received ZMQ frames and forward them without copying or encoding.")
     parser.add_argument("--rest_host", type=str, default=default_rest_host, help="Host for web interface.\n"
                                                                                  "Default: %s" % default_rest_host)
     parser.add_argument("--rest_port", type=int, default=default_rest_port, help="Port for web interface.\n"
                                                                                  "Default: %s" % default_rest_port)
     parser.add_argument("--auto_start", action='store_true', default=False, help="Start the processor automatically.")
+    parser.add_argument("--runtime", default=config.DEFAULT_RUNTIME,
+                        choices=[config.RUNTIME_PROCESS, config.RUNTIME_ASYNCIO],
+                        help="Node runtime. asyncio receives, processes and serves the REST api in one event loop.\n"
+                             "The receiving and processing options below apply only to the process runtime.")
+    parser.add_argument("--n_receiving_threads", type=int, default=None,
+                        help="Number of receiving threads. If 0, the messages are received in the processor loop.\n"
+                             "Default: %s" % config.DEFAULT_N_RECEIVING_THREADS)
+    parser.add_argument("--handoff", default=config.DEFAULT_HANDOFF,
+                        choices=[config.HANDOFF_QUEUE, config.HANDOFF_RING_BUFFER],
+                        help="Hand-off between the receiving threads and the processor.\n"
+                             "ring_buffer receives in a separate process and passes the frames in shared memory.\n"
+                             "It needs the stream received in raw or passthrough mode.")
+    parser.add_argument("--overload_policy", default=config.DEFAULT_OVERLOAD_POLICY,
+                        choices=["block", "drop_oldest", "drop_newest", "keep_every_nth", "rate_cap"],
+                        help="What to do with the received messages when the processor cannot keep up.")
+    parser.add_argument("--keep_every_nth", type=int, default=None,
+                        help="Process only every n-th message, for the keep_every_nth overload policy.")
+    parser.add_argument("--max_rate", type=float, default=None,
+                        help="Maximum messages per second to process, for the rate_cap overload policy.")
+    parser.add_argument("--decode_workers", type=int, default=None,
+                        help="Number of threads decoding the dimage frames in the receiving threads, ahead of the "
+                             "processing.")
+    parser.add_argument("--n_processes", type=int, default=None, help="Number of worker processes for the processor.")
+    parser.add_argument("--dispatch_mode", default=config.DEFAULT_POOL_DISPATCH_MODE,
+                        choices=["round_robin", "least_loaded"], help="Dispatching of messages to worker processes.")
+    parser.add_argument("--reorder", action='store_true', default=False,
+                        help="Keep the receiving order of the messages processed by the worker processes.")
 
 
 def load_logging_config_files(additional_config_file=None):
@@ -87,6 +120,11 @@ def construct_processor_parameters(input_args, parameters):
     if "binding_address" in input_args and input_args.binding_address:
         processor_parameters["binding_address"] = input_args.binding_address
 
+        # Multiple comma separated addresses to forward the stream to.
+        if "," in input_args.binding_address:
+            processor_parameters["binding_address"] = [address.strip() for address
+                                                       in input_args.binding_address.split(",")]
+
     # Parameters in the config file override all other parameters parameters.
     if "config_file" in input_args and input_args.config_file:
         with open(input_args.config_file) as config_file:
@@ -126,14 +164,59 @@ def start_stream_node_helper(processor_instance, input_args, parameters):
 
     start_node_immediately = "auto_start" in input_args and input_args.auto_start
 
+    if "n_receiving_threads" in input_args and input_args.n_receiving_threads is not None:
+        n_receiving_threads = input_args.n_receiving_threads
+    else:
+        n_receiving_threads = config.DEFAULT_N_RECEIVING_THREADS
+
+    if "runtime" in input_args and input_args.runtime == config.RUNTIME_ASYNCIO:
+        start_async_stream_node(instance_name=input_args.instance_name,
+                                processor=processor_instance,
+                                processor_parameters=processor_parameters,
+                                connection_address=input_args.connect_address,
+                                control_host=control_host,
+                                control_port=control_port,
+                                receive_raw=receive_raw,
+                                start_node_immediately=start_node_immediately)
+        return
+
+    n_processes = input_args.n_processes if "n_processes" in input_args else None
+    dispatch_mode = input_args.dispatch_mode if "dispatch_mode" in input_args else None
+    reorder = "reorder" in input_args and input_args.reorder
+    handoff = input_args.handoff if "handoff" in input_args else None
+    overload_policy = input_args.overload_policy if "overload_policy" in input_args else None
+    keep_every_nth = input_args.keep_every_nth if "keep_every_nth" in input_args else None
+    max_rate = input_args.max_rate if "max_rate" in input_args else None
+    passthrough = "passthrough" in input_args and input_args.passthrough
+    decode_workers = input_args.decode_workers if "decode_workers" in input_args else None
+    reorder_window = input_args.reorder_window if "reorder_window" in input_args else None
+    missing_frame_timeout = input_args.missing_frame_timeout if "missing_frame_timeout" in input_args else None
+
+    # Multiple addresses are merged into one stream.
+    connection_address = input_args.connect_address
+    if "," in connection_address:
+        connection_address = [address.strip() for address in connection_address.split(",")]
+
     start_stream_node(instance_name=input_args.instance_name,
                       processor=processor_instance,
                       processor_parameters=processor_parameters,
-                      connection_address=input_args.connect_address,
+                      connection_address=connection_address,
                       control_host=control_host,
                       control_port=control_port,
                       receive_raw=receive_raw,
-                      start_node_immediately=start_node_immediately)
+                      start_node_immediately=start_node_immediately,
+                      n_receiving_threads=n_receiving_threads,
+                      n_processes=n_processes,
+                      dispatch_mode=dispatch_mode,
+                      reorder=reorder,
+                      handoff=handoff,
+                      overload_policy=overload_policy,
+                      keep_every_nth=keep_every_nth,
+                      max_rate=max_rate,
+                      reorder_window=reorder_window,
+                      missing_frame_timeout=missing_frame_timeout,
+                      passthrough=passthrough,
+                      decode_workers=decode_workers)
 
 
 def load_config_file(filename):
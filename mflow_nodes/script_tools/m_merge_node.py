@@ -0,0 +1,30 @@
+from argparse import ArgumentParser
+
+from mflow_nodes import config
+from mflow_nodes.processors.proxy import ProxyProcessor
+from mflow_nodes.script_tools.helpers import setup_logging, add_default_arguments, start_stream_node_helper
+
+
+def run(input_args, parameters=None):
+    if "," not in input_args.connect_address:
+        raise ValueError("Provide at least 2 comma separated addresses to merge.")
+
+    # Forward all the merged messages.
+    processor = ProxyProcessor(proxy_function=lambda message: True, name="Merge node")
+
+    start_stream_node_helper(processor, input_args, parameters)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Merge multiple mflow streams into one, ordered by frame index.")
+    add_default_arguments(parser, binding_argument=True)
+    parser.add_argument("--reorder_window", type=int, default=config.DEFAULT_MERGE_REORDER_WINDOW,
+                        help="Maximum number of messages held back to restore the frame order.\n"
+                             "Default: %s" % config.DEFAULT_MERGE_REORDER_WINDOW)
+    parser.add_argument("--missing_frame_timeout", type=float, default=config.DEFAULT_MERGE_MISSING_FRAME_TIMEOUT,
+                        help="Time, in seconds, to wait for a missing frame before skipping it.\n"
+                             "Default: %s" % config.DEFAULT_MERGE_MISSING_FRAME_TIMEOUT)
+    arguments = parser.parse_args()
+
+    setup_logging(arguments.log_level)
+
+    run(arguments)
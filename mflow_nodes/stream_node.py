@@ -1,32 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
+from queue import Empty, Full
+from threading import Thread
+from time import time
 
 import os
-from time import sleep
 
 from mflow import mflow, Stream, zmq
-from mflow.tools import ThroughputStatistics
 from mflow_nodes.node_manager import NodeManager, NodeManagerProxy
 from mflow_nodes.rest_api.rest_server import start_web_interface
 from mflow_nodes import config
-from mflow_nodes.stream_tools.mflow_message import get_mflow_message, get_raw_mflow_message
+from mflow_nodes.processors.pool import ProcessPoolProcessor, get_pool_processors
+from mflow_nodes.stream_tools.mflow_merger import MFlowMerger
+from mflow_nodes.stream_tools.overload_policy import OverloadPolicy
+from mflow_nodes.stream_tools.mflow_message import get_passthrough_mflow_message, MessageDispatcher, \
+    ReceiveStatistics
 
 _logger = getLogger(__name__)
 
 
 def start_stream_node(instance_name, processor, processor_parameters=None,
                       connection_address=None, control_host=None, control_port=None,
-                      start_node_immediately=False, receive_raw=False):
+                      start_node_immediately=False, receive_raw=False, data_queue_size=None,
+                      n_receiving_threads=None, n_processes=None, dispatch_mode=None, reorder=False, handoff=None,
+                      ring_buffer_slot_bytes=None, overload_policy=None, keep_every_nth=None, max_rate=None,
+                      reorder_window=None, missing_frame_timeout=None, passthrough=False, decode_workers=None):
     """
     Start the ZMQ processing node.
     :param instance_name: Name of the processor instance. Used for the REST api path.
     :param processor: Stream mflow_processor that does the actual work on the stream data.
     :type processor: StreamProcessor
     :param connection_address: Fully qualified ZMQ stream connection address. Default: "tcp://127.0.0.1:40000"
+    A list of addresses merges the streams from all of them, ordered by frame index.
     :param control_host: Binding host for the control REST API.
     :param control_port: Binding port for the control REST API.
     :param start_node_immediately: If true, the external mflow_processor will be started at node startup.
     :param processor_parameters: List of arguments to pass to the string mflow_processor start command.
     :param receive_raw: Pass the raw ZMQ messages to the mflow_processor.
+    :param data_queue_size: Size of the data queue between the receiving threads and the processor.
+    :param n_receiving_threads: Number of receiving threads. If 0, the messages are received in the processor loop.
+    :param n_processes: Number of worker processes to run the processor in. Default: the processor runs in the node.
+    :param dispatch_mode: Dispatching of messages to the worker processes, "round_robin" or "least_loaded".
+    :param reorder: Keep the receiving order of the messages processed by the worker processes.
+    :param handoff: Hand-off between the receiving threads and the processor, "queue" or "ring_buffer".
+    :param ring_buffer_slot_bytes: Maximum frame size, in bytes, when using the ring buffer hand-off.
+    :param overload_policy: What to do when the processor cannot keep up: "block", "drop_oldest", "drop_newest",
+    "keep_every_nth" or "rate_cap".
+    :param keep_every_nth: Interval of messages to process, for the "keep_every_nth" overload policy.
+    :param max_rate: Maximum messages per second to process, for the "rate_cap" overload policy.
+    :param reorder_window: Maximum number of messages held back to order the merged streams.
+    :param missing_frame_timeout: Time, in seconds, to wait for a missing frame of the merged streams.
+    :param passthrough: Keep the received ZMQ frames, so that proxies forward them without copying or encoding.
+    :param decode_workers: Number of threads decoding the frames in the receiving threads, ahead of the processing.
     :return: None
     """
     connection_address = connection_address or config.DEFAULT_CONNECT_ADDRESS
@@ -42,14 +67,51 @@ def start_stream_node(instance_name, processor, processor_parameters=None,
                                                           address="%s:%s" % (control_host, control_port),
                                                           instance_name=instance_name))
 
+    if decode_workers and handoff == config.HANDOFF_RING_BUFFER:
+        raise ValueError("Decoding ahead needs the '%s' hand-off." % config.HANDOFF_QUEUE)
+
+    if decode_workers and n_receiving_threads == 0:
+        _logger.warning("Frames not decoded ahead: no receiving threads.")
+
+    if n_processes and n_processes > 1:
+        _logger.debug("Running the processor in %d worker processes." % n_processes)
+        worker_processor, output_processor = get_pool_processors(processor)
+
+        if reorder and output_processor is None:
+            _logger.warning("The processor does not forward the messages: reordering them has no effect.")
+
+        processor = ProcessPoolProcessor(worker_processor, n_workers=n_processes, dispatch_mode=dispatch_mode,
+                                         reorder=reorder, output_processor=output_processor)
+
+    receiver_instance = None
+    receiver_function = get_receiver_function(connection_address=connection_address, receive_raw=receive_raw,
+                                              passthrough=passthrough, decode_workers=decode_workers)
+
+    if isinstance(connection_address, (list, tuple)):
+        # The merger orders the messages of all the inputs: it must be the only receiver.
+        if n_receiving_threads != 1:
+            _logger.info("Merging %d streams with 1 receiving thread." % len(connection_address))
+            n_receiving_threads = 1
+
+        receiver_instance = MFlowMerger(connection_address, reorder_window=reorder_window,
+                                        missing_frame_timeout=missing_frame_timeout, receive_raw=receive_raw)
+        receiver_function = get_merger_receiver_function(receiver_instance, decode_workers=decode_workers)
+
     node_manager = NodeManager(processor_function=get_processor_function(processor=processor,
                                                                          connection_address=connection_address,
-                                                                         receive_raw=receive_raw),
-                               receiver_function=get_receiver_function(
-                                   connection_address=connection_address,
-                                   receive_raw=receive_raw),
+                                                                         receive_raw=receive_raw,
+                                                                         passthrough=passthrough),
+                               receiver_function=receiver_function,
                                initial_parameters=processor_parameters,
-                               processor_instance=processor)
+                               processor_instance=processor,
+                               data_queue_size=data_queue_size,
+                               n_receiving_threads=n_receiving_threads,
+                               handoff=handoff,
+                               ring_buffer_slot_bytes=ring_buffer_slot_bytes,
+                               receive_raw=receive_raw,
+                               overload_policy=OverloadPolicy(overload_policy, keep_every_nth, max_rate),
+                               receiver_instance=receiver_instance,
+                               passthrough=passthrough)
 
     # node_manager_proxy = NodeManagerProxy(node_manager)
 
@@ -63,13 +125,41 @@ def start_stream_node(instance_name, processor, processor_parameters=None,
                         host=control_host, port=control_port)
 
 
-def get_receiver_function(connection_address, receive_timeout=None, queue_size=None, receive_raw=False):
+def connect_stream(connection_address, receive_timeout, queue_size):
+    """
+    Connect a PULL mflow stream to the provided address.
+    :param connection_address: Fully qualified ZMQ stream connection address.
+    :param receive_timeout: ZMQ read timeout in milliseconds.
+    :param queue_size: ZMQ queue size.
+    :return: Connected stream.
+    """
+    # Inproc addresses are reachable only from the same ZMQ context: use the process wide one.
+    if connection_address.startswith("inproc://"):
+        context = zmq.Context.instance()
+    else:
+        context = zmq.Context(io_threads=config.ZMQ_IO_THREADS)
+
+    stream = Stream()
+    stream.connect(address=connection_address,
+                   conn_type=mflow.CONNECT,
+                   mode=mflow.PULL,
+                   receive_timeout=receive_timeout,
+                   queue_size=queue_size,
+                   context=context)
+
+    return stream
+
+
+def get_receiver_function(connection_address, receive_timeout=None, queue_size=None, receive_raw=False,
+                          passthrough=False, decode_workers=None):
     """
     Generate and return the function for running the mflow receiver.
     :param connection_address: Fully qualified ZMQ stream connection address.
     :param receive_timeout: ZMQ read timeout in milliseconds.
     :param queue_size: ZMQ queue size.
     :param receive_raw: Read the mflow socket in raw mode. Default: False.
+    :param passthrough: Receive the ZMQ frames without copying them, and keep them for forwarding. Default: False.
+    :param decode_workers: Number of threads decoding the frames ahead of the processing. Default: no decoding.
     :return: Function to be executed in an external thread.
     """
     receive_timeout = receive_timeout or config.DEFAULT_RECEIVE_TIMEOUT
@@ -77,32 +167,92 @@ def get_receiver_function(connection_address, receive_timeout=None, queue_size=N
 
     def receiver_function(running_event, data_queue):
         try:
-
             # Setup the ZMQ listener and the stream mflow_processor.
-            context = zmq.Context(io_threads=config.ZMQ_IO_THREADS)
-
-            stream = Stream()
-            stream.connect(address=connection_address,
-                           conn_type=mflow.CONNECT,
-                           mode=mflow.PULL,
-                           receive_timeout=receive_timeout,
-                           queue_size=queue_size,
-                           context=context)
-
-            # Setup the receive and converter function according to the raw parameter.
-            receive_function = stream.receive_raw if receive_raw else stream.receive
-            mflow_message_function = get_raw_mflow_message if receive_raw else get_mflow_message
-
-            # The running event is used to signal that mflow has successfully started.
-            running_event.set()
+            stream = connect_stream(connection_address, receive_timeout, queue_size)
+
+            get_message = get_stream_message_function(stream, receive_raw, passthrough)
+            decode_executor = ThreadPoolExecutor(max_workers=decode_workers) if decode_workers else None
+
+            # The running event is set by the processor, once it is ready to accept messages.
             while running_event.is_set():
-                message = mflow_message_function(receive_function())
+                message = get_message()
 
-                # Process only valid messages.
+                # Pass only valid messages to the processor.
                 if message is not None:
-                    data_queue.append(message)
+                    if decode_executor is not None:
+                        decode_ahead(message, decode_executor)
+
+                    put_message(running_event, data_queue, message)
 
             stream.disconnect()
+
+            if decode_executor is not None:
+                decode_executor.shutdown(wait=False)
+        except Exception as e:
+            _logger.error(e)
+            running_event.clear()
+
+    return receiver_function
+
+
+def get_stream_message_function(stream, receive_raw=False, passthrough=False):
+    """
+    Return the function to receive the next message from the stream.
+    :param stream: Connected mflow stream.
+    :param receive_raw: Wrap the messages with the raw handler.
+    :param passthrough: Receive the ZMQ frames without copying them, and keep them for forwarding.
+    :return: Function returning the next MFlowMessage, or None if no message was received before the timeout.
+    """
+    # Each stream resolves the handlers of its messages with its own dispatch cache.
+    dispatcher = MessageDispatcher(receive_raw)
+
+    if passthrough:
+        receive_statistics = ReceiveStatistics()
+
+        def receive_passthrough_message():
+            try:
+                zmq_frames = stream.socket.recv_multipart(copy=False)
+            except zmq.Again:
+                return None
+
+            receive_statistics.update(sum(len(frame) for frame in zmq_frames))
+            return get_passthrough_mflow_message(zmq_frames, receive_statistics, dispatcher=dispatcher)
+
+        return receive_passthrough_message
+
+    # Setup the receive function according to the raw parameter.
+    receive_function = stream.receive_raw if receive_raw else stream.receive
+    mflow_message_function = dispatcher.wrap
+
+    def receive_message():
+        return mflow_message_function(receive_function())
+
+    return receive_message
+
+
+def get_merger_receiver_function(merger, decode_workers=None):
+    """
+    Generate and return the function for receiving the merged streams.
+    :param merger: MFlowMerger to receive the messages with.
+    :param decode_workers: Number of threads decoding the frames ahead of the processing. Default: no decoding.
+    :return: Function to be executed in an external thread.
+    """
+    def receiver_function(running_event, data_queue):
+        try:
+            merger.start()
+            decode_executor = ThreadPoolExecutor(max_workers=decode_workers) if decode_workers else None
+
+            while running_event.is_set():
+                for message in merger.receive():
+                    if decode_executor is not None:
+                        decode_ahead(message, decode_executor)
+
+                    put_message(running_event, data_queue, message)
+
+            merger.stop()
+
+            if decode_executor is not None:
+                decode_executor.shutdown(wait=False)
         except Exception as e:
             _logger.error(e)
             running_event.clear()
@@ -110,19 +260,49 @@ def get_receiver_function(connection_address, receive_timeout=None, queue_size=N
     return receiver_function
 
 
-def get_processor_function(processor, connection_address, receive_timeout=None, queue_size=None, receive_raw=False):
+def decode_ahead(message, executor):
+    """
+    Start decoding the message frame in the executor, if the message handler supports it.
+    The processor gets the decoded frame from message.get_data(), waiting for the decoding if needed.
+    :param message: Received message.
+    :param executor: Executor to decode the frame with.
+    """
+    message.decode_ahead(executor)
+
+
+def put_message(running_event, data_queue, message):
+    """
+    Put the message on the data queue. Block while the queue is full, but stop if the node is not running anymore.
+    :param running_event: Event signaling that the node is running.
+    :param data_queue: Queue between the receiving threads and the processor.
+    :param message: Message to put on the queue.
+    """
+    while running_event.is_set():
+        try:
+            data_queue.put(message, timeout=config.DEFAULT_DATA_QUEUE_TIMEOUT)
+            return
+        except Full:
+            continue
+
+
+def get_processor_function(processor, connection_address, receive_timeout=None, queue_size=None, receive_raw=False,
+                           passthrough=False):
     receive_timeout = receive_timeout or config.DEFAULT_RECEIVE_TIMEOUT
     queue_size = queue_size or config.DEFAULT_ZMQ_QUEUE_LENGTH
     n_messages = None
     disable_processing = False
+    batch_size = config.DEFAULT_BATCH_SIZE
+    batch_window = config.DEFAULT_BATCH_WINDOW
 
     def process_parameters_queue(parameter_queue):
+        # Called for every message: only a generation counter compare, if no parameter was changed.
+        if not parameter_queue.has_updates():
+            return
+
         process_parameters_to_set = {}
 
         # Set each parameter individually (either to the process or to the processor).
-        while not parameter_queue.empty():
-            parameter_to_set = parameter_queue.get()
-
+        for parameter_to_set in parameter_queue.get_updates():
             if not isinstance(parameter_to_set, tuple) or len(parameter_to_set) != 2:
                 raise ValueError("Invalid parameter to set. Expected tuple of length 2, but received %s."
                                  % parameter_to_set)
@@ -133,6 +313,10 @@ def get_processor_function(processor, connection_address, receive_timeout=None,
             # The parameter is for this process.
             if parameter_name in config.PROCESS_PARAMETERS:
                 process_parameters_to_set[parameter_name] = parameter_value
+
+                # Processors can use the number of messages as well (for example to preallocate the output).
+                if parameter_name == config.PARAMETER_N_MESSAGES and hasattr(processor, parameter_name):
+                    processor.set_parameter(parameter_to_set)
             # The parameter is for the processor.
             else:
                 processor.set_parameter(parameter_to_set)
@@ -177,49 +361,147 @@ def get_processor_function(processor, connection_address, receive_timeout=None,
 
             _logger.debug("Update process parameter '%s'='%s'", config.PARAMETER_DISABLE_PROCESSING, disable_processing)
 
+        if config.PARAMETER_BATCH_SIZE in parameters_to_set:
+            nonlocal batch_size
+            batch_size_to_set = parameters_to_set.pop(config.PARAMETER_BATCH_SIZE) or config.DEFAULT_BATCH_SIZE
+
+            if batch_size_to_set < 1:
+                raise ValueError("Batch size must be at least 1, but %s was provided." % batch_size_to_set)
+
+            batch_size = batch_size_to_set
+            _logger.debug("Update process parameter '%s'='%s'", config.PARAMETER_BATCH_SIZE, batch_size)
+
+        if config.PARAMETER_BATCH_WINDOW in parameters_to_set:
+            nonlocal batch_window
+            batch_window = parameters_to_set.pop(config.PARAMETER_BATCH_WINDOW) or 0
+
+            _logger.debug("Update process parameter '%s'='%s'", config.PARAMETER_BATCH_WINDOW, batch_window)
+
         if parameters_to_set:
             raise ValueError("Unknown process parameters. %s." % parameters_to_set)
 
-    def processor_function(running_event, statistics_buffer, statistics_namespace, parameter_queue, data_queue):
+    def start_receiving_threads(running_event, data_queue, receiver_function, n_receiving_threads):
+        receiving_threads = []
+
+        for thread_index in range(n_receiving_threads):
+            receiving_thread = Thread(target=receiver_function, args=(running_event, data_queue),
+                                      name="receiver_%d" % thread_index, daemon=True)
+            receiving_thread.start()
+            receiving_threads.append(receiving_thread)
+
+        return receiving_threads
+
+    def get_queue_message_function(data_queue):
+        def get_queue_message(timeout=config.DEFAULT_DATA_QUEUE_TIMEOUT):
+            try:
+                return data_queue.get(timeout=timeout)
+            except Empty:
+                return None
+
+        return get_queue_message
+
+    def get_inline_message_function(stream):
+        receive_message = get_stream_message_function(stream, receive_raw, passthrough)
+
+        # The stream receive timeout is fixed at connection time.
+        def get_stream_message(timeout=None):
+            return receive_message()
+
+        return get_stream_message
+
+    def get_message_batch(get_message, max_batch_size):
+        """
+        Collect up to max_batch_size messages, waiting at most batch_window milliseconds after the first one.
+        """
+        message = get_message()
+
+        # Nothing received, no need to wait for the rest of the batch.
+        if message is None:
+            return []
+
+        messages = [message]
+        batch_end_time = time() + batch_window / 1000
+
+        while len(messages) < max_batch_size:
+            remaining_time = batch_end_time - time()
+            if remaining_time <= 0:
+                break
+
+            message = get_message(remaining_time)
+            if message is not None:
+                messages.append(message)
+
+        return messages
+
+    def release_messages(data_queue, n_messages_to_release):
+        # Signal the queue that the messages are not used anymore (the ring buffer reuses their memory).
+        for _ in range(n_messages_to_release):
+            data_queue.task_done()
+
+    def processor_function(running_event, statistics, parameter_queue, data_queue=None,
+                           receiver_function=None, n_receiving_threads=0):
         try:
             # Pass all the queued parameters before starting the mflow_processor.
             process_parameters_queue(parameter_queue)
 
-            statistics = ThroughputStatistics(statistics_buffer, statistics_namespace)
             total_messages = 0
             processor.start()
 
-            try:
-                # Setup the ZMQ listener and the stream mflow_processor.
-                context = zmq.Context(io_threads=config.ZMQ_IO_THREADS)
-
-                stream = Stream()
-                stream.connect(address=connection_address,
-                               conn_type=mflow.CONNECT,
-                               mode=mflow.PULL,
-                               receive_timeout=receive_timeout,
-                               queue_size=queue_size,
-                               context=context)
-
-                # Setup the receive and converter function according to the raw parameter.
-                receive_function = stream.receive_raw if receive_raw else stream.receive
-                mflow_message_function = get_raw_mflow_message if receive_raw else get_mflow_message
+            stream = None
+            receiving_threads = []
 
+            try:
                 # The running event is used to signal that mflow has successfully started.
                 running_event.set()
-                while running_event.is_set():
-                    message = mflow_message_function(receive_function())
 
-                    # Process only valid messages.
-                    if message is not None and not disable_processing:
-                        processor.process_message(message)
+                # Decouple the receiving from the processing, if the data queue is available.
+                if data_queue is not None:
+                    # The receiving threads might also be running in another process.
+                    if receiver_function and n_receiving_threads:
+                        receiving_threads = start_receiving_threads(running_event, data_queue,
+                                                                    receiver_function, n_receiving_threads)
+                    get_message = get_queue_message_function(data_queue)
+                # Receive the messages in the processor loop.
+                else:
+                    stream = connect_stream(connection_address, receive_timeout, queue_size)
+                    get_message = get_inline_message_function(stream)
 
-                        total_messages += 1
+                while running_event.is_set():
+                    n_received_messages = 0
+                    n_processed_messages = 0
+
+                    if batch_size > 1:
+                        # Do not collect more messages than needed to reach n_messages.
+                        max_batch_size = min(batch_size, n_messages - total_messages) if n_messages else batch_size
+                        messages = get_message_batch(get_message, max_batch_size)
+                        n_received_messages = len(messages)
+
+                        # Process only non empty batches.
+                        if messages and not disable_processing:
+                            processor.process_messages(messages)
+                            n_processed_messages = len(messages)
+                            message = messages[-1]
+
+                    else:
+                        message = get_message()
+                        n_received_messages = 1 if message is not None else 0
+
+                        # Process only valid messages.
+                        if message is not None and not disable_processing:
+                            processor.process_message(message)
+                            n_processed_messages = 1
+
+                    if data_queue is not None and n_received_messages:
+                        release_messages(data_queue, n_received_messages)
+
+                    if n_processed_messages:
+                        total_messages += n_processed_messages
                         if n_messages and total_messages >= n_messages:
                             _logger.info("Received %d frames. Stopping.", total_messages)
                             running_event.clear()
 
-                        statistics.save_statistics(message.get_statistics())
+                        # The statistics are cumulative, the last message of the batch holds the current state.
+                        statistics.save_statistics(message.get_statistics(), n_processed_messages)
 
                     if not processor.is_running():
                         running_event.clear()
@@ -227,11 +509,17 @@ def get_processor_function(processor, connection_address, receive_timeout=None,
                     # If available, pass parameters to the mflow_processor.
                     process_parameters_queue(parameter_queue)
 
-                stream.disconnect()
             except Exception as e:
                 _logger.error(e)
                 running_event.clear()
 
+            finally:
+                if stream is not None:
+                    stream.disconnect()
+
+                for receiving_thread in receiving_threads:
+                    receiving_thread.join(config.DEFAULT_SHUTDOWN_TIMEOUT)
+
             # Save the last statistics events even if the sampling interval was not reached.
             statistics.flush()
             processor.stop()
@@ -0,0 +1,239 @@
+import json
+import os
+import pickle
+import tempfile
+from collections import deque, OrderedDict
+from logging import getLogger
+from queue import Queue, Full, Empty
+from threading import Thread, Lock
+from time import time
+from types import SimpleNamespace
+
+from mflow_nodes import config
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP = "drop"
+OVERFLOW_SPILL = "spill"
+OVERFLOW_POLICIES = [OVERFLOW_BLOCK, OVERFLOW_DROP, OVERFLOW_SPILL]
+
+# Names of the send statistics counters.
+SEND_STATISTICS = ["queued", "sent", "dropped", "spilled", "queue_depth", "max_queue_depth", "spill_depth",
+                   "send_latency", "max_send_latency"]
+
+# Signals the sending thread to stop, once all the previous messages are sent.
+_STOP = object()
+
+
+class AsyncMFlowForwarder(object):
+    """
+    Forward the messages from a background thread, through a bounded outbound queue.
+
+    A slow downstream fills the outbound queue instead of blocking the caller. When the queue is full:
+        block              Wait for space in the queue.
+        drop               Drop the message.
+        spill              Write the message to a file in the spill directory. The spilled messages are sent
+                           once the queue is empty again, and the messages are still sent in order.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, forwarder, queue_size=None, overflow_policy=None, spill_directory=None, statistics=None):
+        """
+        Constructor.
+        :param forwarder: MFlowForwarder to send the messages with.
+        :param queue_size: Maximum number of messages in the outbound queue.
+        :param overflow_policy: What to do with the messages when the queue is full: "block", "drop" or "spill".
+        :param spill_directory: Directory for the spilled messages. Default: the system temporary directory.
+        :param statistics: SharedCounters with the SEND_STATISTICS names. Pass them, to read the statistics from
+        another process.
+        """
+        self.forwarder = forwarder
+        self.queue_size = queue_size or config.DEFAULT_SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or config.DEFAULT_SEND_OVERFLOW_POLICY
+        self.spill_directory = spill_directory
+
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy '%s'. Available policies: %s." % (self.overflow_policy,
+                                                                                       OVERFLOW_POLICIES))
+
+        self._statistics = statistics if statistics is not None else SharedCounters(SEND_STATISTICS)
+        self._queue = None
+        self._sending_thread = None
+
+        # Spilled file names, oldest first. The lock keeps the order between the spilled and the queued messages.
+        self._spilled_files = deque()
+        self._spill_lock = Lock()
+        self._spill_directory = None
+        self._n_spilled = 0
+
+    def start(self, address, block=True):
+        """
+        Start the forwarder and the sending thread.
+        :param address: Address, or list of addresses, to forward to.
+        :param block: Blocking of each destination, see MFlowForwarder.start.
+        """
+        self.forwarder.start(address, block)
+
+        self._statistics.reset()
+        self._queue = Queue(maxsize=self.queue_size)
+        self._spilled_files.clear()
+        self._n_spilled = 0
+
+        if self.overflow_policy == OVERFLOW_SPILL:
+            self._spill_directory = tempfile.mkdtemp(prefix="mflow_spill_", dir=self.spill_directory)
+            self._logger.debug("Spilling messages to '%s'." % self._spill_directory)
+
+        self._sending_thread = Thread(target=self._send_messages, name="sender", daemon=True)
+        self._sending_thread.start()
+
+    def forward(self, message):
+        """
+        Queue the message for sending.
+        :param message: Message to be forwarded.
+        :return: True if the message was queued (or spilled), False if it was dropped.
+        """
+        item = (message, time())
+
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            self._queue.put(item)
+
+        elif self.overflow_policy == OVERFLOW_DROP:
+            try:
+                self._queue.put_nowait(item)
+            except Full:
+                self._statistics.add("dropped")
+                return False
+
+        else:
+            with self._spill_lock:
+                # Once spilling, keep spilling: the spilled messages have to be sent first.
+                try:
+                    if self._spilled_files:
+                        raise Full
+                    self._queue.put_nowait(item)
+                except Full:
+                    self._spill(item)
+
+        self._statistics.add("queued")
+        self._update_depth()
+
+        return True
+
+    def _update_depth(self):
+        depth = self._queue.qsize()
+        self._statistics.set("queue_depth", depth)
+        if depth > self._statistics.get("max_queue_depth"):
+            self._statistics.set("max_queue_depth", depth)
+
+    def _spill(self, item):
+        message, queue_time = item
+
+        zmq_frames = getattr(message, "zmq_frames", None)
+        frames = getattr(message, "frames", None)
+
+        # The message data can hold views of the received frames, and whatever the handlers decoded from them:
+        # spill only the header and the frames as they are sent.
+        if zmq_frames is not None:
+            spilled_message = ({"header": message.data["header"]}, [bytes(frame) for frame in zmq_frames])
+        elif frames is not None:
+            header = message.data["header"]
+            spilled_message = ({"header": header},
+                               [json.dumps(header).encode()] + [bytes(frame) for frame in frames])
+        else:
+            # Messages received by the mflow stream hold the data as received.
+            spilled_message = (message.data, None)
+
+        filename = os.path.join(self._spill_directory, "%012d.pickle" % self._n_spilled)
+        with open(filename, "wb") as spill_file:
+            pickle.dump((spilled_message, queue_time), spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self._n_spilled += 1
+        self._spilled_files.append(filename)
+        self._statistics.add("spilled")
+        self._statistics.set("spill_depth", len(self._spilled_files))
+
+    def _read_spilled(self):
+        with self._spill_lock:
+            if not self._spilled_files:
+                return None
+            filename = self._spilled_files.popleft()
+            self._statistics.set("spill_depth", len(self._spilled_files))
+
+        with open(filename, "rb") as spill_file:
+            spilled_message, queue_time = pickle.load(spill_file)
+        os.remove(filename)
+
+        data, zmq_frames = spilled_message
+        return SimpleNamespace(data=data, zmq_frames=zmq_frames), queue_time
+
+    def _send(self, item):
+        message, queue_time = item
+
+        try:
+            self.forwarder.forward(message)
+        except Exception as e:
+            self._logger.error("Failed to forward message. %s", e)
+            return
+
+        send_latency = time() - queue_time
+        self._statistics.add("sent")
+        self._statistics.add("send_latency", send_latency)
+        if send_latency > self._statistics.get("max_send_latency"):
+            self._statistics.set("max_send_latency", send_latency)
+
+    def _send_messages(self):
+        while True:
+            try:
+                # Do not wait on the queue while there are spilled messages to send.
+                item = self._queue.get(block=not self._spilled_files, timeout=config.DEFAULT_DATA_QUEUE_TIMEOUT)
+            except Empty:
+                # The spilled messages are newer than the queued ones.
+                item = self._read_spilled()
+                if item is None:
+                    continue
+
+            if item is _STOP:
+                break
+
+            self._send(item)
+            self._update_depth()
+
+        # The stop signal is queued after all the messages, but it can overtake the spilled ones.
+        item = self._read_spilled()
+        while item is not None:
+            self._send(item)
+            item = self._read_spilled()
+
+    def get_statistics(self):
+        return get_send_statistics(self._statistics)
+
+    def stop(self):
+        """
+        Send the remaining messages, and stop the sending thread and the forwarder.
+        """
+        if self._sending_thread is not None:
+            self._queue.put(_STOP)
+            self._sending_thread.join()
+            self._sending_thread = None
+
+        if self._spill_directory is not None:
+            os.rmdir(self._spill_directory)
+            self._spill_directory = None
+
+        self.forwarder.stop()
+
+
+def get_send_statistics(statistics):
+    """
+    Return the send statistics as a dictionary.
+    :param statistics: SharedCounters with the SEND_STATISTICS names.
+    :return: Dictionary with the statistics.
+    """
+    send_statistics = OrderedDict((name, int(value)) for name, value in statistics.get_row().items()
+                                  if not name.endswith("latency"))
+
+    send_statistics["average_send_latency"] = statistics.get("send_latency") / send_statistics["sent"] \
+        if send_statistics["sent"] else 0
+    send_statistics["max_send_latency"] = statistics.get("max_send_latency")
+
+    return send_statistics
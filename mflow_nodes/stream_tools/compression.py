@@ -0,0 +1,71 @@
+import bz2
+import lzma
+import zlib
+
+import numpy
+
+# Compression functions, with the level: (compress(data, level), decompress(data)).
+codecs_mapping = {"zlib": (lambda data, level: zlib.compress(data, level), zlib.decompress),
+                  "bz2": (lambda data, level: bz2.compress(data, level), bz2.decompress),
+                  "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress)}
+
+
+def shuffle_bytes(buffer, itemsize):
+    """
+    Group the bytes by their position in the values: all the first bytes, then all the second bytes...
+    Neighbouring detector pixels have similar high bytes, so the shuffled data compresses better.
+    :param buffer: Bytes like object with the values.
+    :param itemsize: Size in bytes of each value.
+    :return: Shuffled bytes.
+    """
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    return data.reshape(-1, itemsize).T.tobytes()
+
+
+def unshuffle_bytes(buffer, itemsize):
+    """
+    Restore the byte order of the values shuffled with shuffle_bytes.
+    :param buffer: Bytes like object with the shuffled values.
+    :param itemsize: Size in bytes of each value.
+    :return: Numpy uint8 array with the original bytes.
+    """
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    return data.reshape(itemsize, -1).T.ravel()
+
+
+def compress_array(array, codec, level, shuffle=False):
+    """
+    Compress the array values.
+    :param array: Numpy array to compress.
+    :param codec: Name of the codec, one of codecs_mapping.
+    :param level: Compression level of the codec.
+    :param shuffle: Byte shuffle the values before compressing them.
+    :return: Compressed bytes.
+    """
+    compress_function = codecs_mapping[codec][0]
+    data = numpy.ascontiguousarray(array)
+
+    if shuffle and data.itemsize > 1:
+        data = shuffle_bytes(data, data.itemsize)
+
+    return compress_function(memoryview(data).cast("B"), level)
+
+
+def decompress_array(buffer, codec, dtype, shape, shuffle=False):
+    """
+    Decompress the array values.
+    :param buffer: Compressed bytes.
+    :param codec: Name of the codec, one of codecs_mapping.
+    :param dtype: Data type of the values.
+    :param shape: Shape of the array.
+    :param shuffle: The values were byte shuffled before compressing them.
+    :return: Numpy array.
+    """
+    decompress_function = codecs_mapping[codec][1]
+    data = decompress_function(buffer)
+
+    dtype = numpy.dtype(dtype)
+    if shuffle and dtype.itemsize > 1:
+        data = unshuffle_bytes(data, dtype.itemsize)
+
+    return numpy.frombuffer(data, dtype=dtype).reshape(shape)
@@ -0,0 +1,144 @@
+import numpy
+
+# Decode functions for the dimage-1.0 encodings, without the byte order: decode(buffer, dtype, shape).
+decoders_mapping = {}
+# Encode functions for the dimage-1.0 encodings, without the byte order: encode(array) -> bytes.
+encoders_mapping = {}
+# Block size, in bytes, of the bitshuffle lz4 encoding.
+BITSHUFFLE_BLOCK_BYTES = 8192
+
+
+def register_decoder(codec, decode_function):
+    """
+    Register the decode function of a dimage encoding.
+    :param codec: Encoding name, without the byte order character (for example "bs32-lz4").
+    :param decode_function: Function (buffer, dtype, shape) returning the decoded numpy array.
+    """
+    decoders_mapping[codec] = decode_function
+
+
+def register_encoder(codec, encode_function):
+    """
+    Register the encode function of a dimage encoding.
+    :param codec: Encoding name, without the byte order character (for example "bs32-lz4").
+    :param encode_function: Function (array) returning the encoded frame as bytes.
+    """
+    encoders_mapping[codec] = encode_function
+
+
+def parse_encoding(encoding):
+    """
+    Split the dimage encoding into the codec and the byte order. For example "bs32-lz4<" into ("bs32-lz4", "<").
+    :param encoding: Encoding from the dimage part_2.
+    :return: Tuple (codec, byte order).
+    """
+    encoding = encoding or ""
+
+    if encoding.endswith(("<", ">")):
+        return encoding[:-1], encoding[-1]
+
+    return encoding, "="
+
+
+def decode_frame(buffer, encoding, dtype, shape):
+    """
+    Decode the dimage frame.
+    :param buffer: Received frame (bytes like object).
+    :param encoding: Encoding from the dimage part_2.
+    :param dtype: Data type of the frame values.
+    :param shape: Shape of the frame.
+    :return: Numpy array.
+    """
+    codec, byte_order = parse_encoding(encoding)
+    decode_function = decoders_mapping.get(codec)
+
+    if decode_function is None:
+        raise ValueError("No decoder for encoding '%s'. Available codecs: %s." % (encoding, sorted(decoders_mapping)))
+
+    return decode_function(buffer, numpy.dtype(dtype).newbyteorder(byte_order), shape)
+
+
+def encode_frame(array, codec):
+    """
+    Encode the frame, for example to simulate a detector stream.
+    :param array: Numpy array, in the byte order of the machine.
+    :param codec: Encoding name, without the byte order character.
+    :return: Tuple (encoded frame as bytes, dimage encoding with the byte order).
+    """
+    encode_function = encoders_mapping.get(codec)
+
+    if encode_function is None:
+        raise ValueError("No encoder for codec '%s'. Available codecs: %s." % (codec, sorted(encoders_mapping)))
+
+    array = numpy.ascontiguousarray(array)
+    # Single byte types have no byte order ("|").
+    byte_order = ">" if array.dtype.str[0] == ">" else "<"
+
+    return encode_function(array), codec + byte_order
+
+
+def _decode_uncompressed(buffer, dtype, shape):
+    return numpy.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+
+def _decode_lz4(buffer, dtype, shape):
+    try:
+        import lz4.block
+    except ImportError:
+        raise ValueError("Decoding lz4 frames requires the 'lz4' package.")
+
+    uncompressed_size = int(numpy.prod(shape)) * dtype.itemsize
+    return numpy.frombuffer(lz4.block.decompress(buffer, uncompressed_size=uncompressed_size),
+                            dtype=dtype).reshape(shape)
+
+
+def _decode_bitshuffle_lz4(buffer, dtype, shape):
+    try:
+        import bitshuffle
+    except ImportError:
+        raise ValueError("Decoding bitshuffle lz4 frames requires the 'bitshuffle' package.")
+
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    # The frame starts with the uncompressed size (8 bytes) and the block size in bytes (4 bytes), big endian.
+    block_size = int.from_bytes(data[8:12].tobytes(), "big") // dtype.itemsize
+
+    return bitshuffle.decompress_lz4(data[12:], tuple(shape), dtype, block_size)
+
+
+def _encode_uncompressed(array):
+    return array.tobytes()
+
+
+def _encode_lz4(array):
+    try:
+        import lz4.block
+    except ImportError:
+        raise ValueError("Encoding lz4 frames requires the 'lz4' package.")
+
+    return lz4.block.compress(array.tobytes(), store_size=False)
+
+
+def _encode_bitshuffle_lz4(array):
+    try:
+        import bitshuffle
+    except ImportError:
+        raise ValueError("Encoding bitshuffle lz4 frames requires the 'bitshuffle' package.")
+
+    block_size = BITSHUFFLE_BLOCK_BYTES // array.dtype.itemsize
+    compressed = bitshuffle.compress_lz4(array, block_size)
+
+    # Same header as the decoder expects: the uncompressed size and the block size in bytes, big endian.
+    return array.nbytes.to_bytes(8, "big") + BITSHUFFLE_BLOCK_BYTES.to_bytes(4, "big") + compressed.tobytes()
+
+
+register_decoder("", _decode_uncompressed)
+register_decoder("lz4", _decode_lz4)
+register_decoder("bs8-lz4", _decode_bitshuffle_lz4)
+register_decoder("bs16-lz4", _decode_bitshuffle_lz4)
+register_decoder("bs32-lz4", _decode_bitshuffle_lz4)
+
+register_encoder("", _encode_uncompressed)
+register_encoder("lz4", _encode_lz4)
+register_encoder("bs8-lz4", _encode_bitshuffle_lz4)
+register_encoder("bs16-lz4", _encode_bitshuffle_lz4)
+register_encoder("bs32-lz4", _encode_bitshuffle_lz4)
@@ -0,0 +1,24 @@
+import numpy
+
+
+def get_array_view(buffer, dtype, shape):
+    """
+    Return a read only numpy array over the frame buffer, without copying it.
+    :param buffer: Received frame (bytes like object or numpy array).
+    :param dtype: Data type of the frame values.
+    :param shape: Shape of the frame.
+    :return: Read only numpy array.
+    """
+    if isinstance(buffer, numpy.ndarray):
+        # Ring buffer slots hold the frames as flat uint8 arrays.
+        if buffer.dtype != numpy.dtype(dtype):
+            buffer = buffer.reshape(-1).view(dtype)
+
+        array = buffer.view()
+    else:
+        array = numpy.frombuffer(buffer, dtype=dtype)
+
+    array = array.reshape(shape)
+    array.flags.writeable = False
+
+    return array
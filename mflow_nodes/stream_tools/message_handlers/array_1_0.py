@@ -1,3 +1,6 @@
+from mflow_nodes.stream_tools.message_handlers import get_array_view
+
+
 class MessageHandler(object):
     """
     Message handler for array-1.0
@@ -25,3 +28,9 @@ class MessageHandler(object):
     @staticmethod
     def get_frame_dtype(message):
         return message.data["header"]["type"]
+
+    @staticmethod
+    def get_array(message):
+        # The data is already decoded into an array.
+        return get_array_view(message.data["data"][0], MessageHandler.get_frame_dtype(message),
+                              MessageHandler.get_frame_size(message))
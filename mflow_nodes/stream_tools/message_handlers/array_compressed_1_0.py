@@ -0,0 +1,42 @@
+from mflow_nodes.stream_tools.compression import decompress_array
+from mflow_nodes.stream_tools.message_handlers import get_array_view
+
+
+class MessageHandler(object):
+    """
+    Message handler for array-compressed-1.0
+
+    Same header as array-1.0, plus the compression 'codec' and 'shuffle'. The data frame is decompressed on access.
+    """
+    @staticmethod
+    def get_header(message):
+        return message.data["header"]
+
+    @staticmethod
+    def get_frame_index(message):
+        return message.data["header"]["frame"]
+
+    @staticmethod
+    def get_data_length(message):
+        # Length of the compressed data, as received.
+        return len(message.data["data"][0])
+
+    @staticmethod
+    def get_data(message):
+        header = message.data["header"]
+        return decompress_array(message.data["data"][0], header["codec"], header["type"], header["shape"],
+                                header.get("shuffle", False))
+
+    @staticmethod
+    def get_frame_size(message):
+        return message.data["header"]["shape"]
+
+    @staticmethod
+    def get_frame_dtype(message):
+        return message.data["header"]["type"]
+
+    @staticmethod
+    def get_array(message):
+        # The decompressed array is new memory, but it is read only like the other handlers arrays.
+        return get_array_view(MessageHandler.get_data(message), MessageHandler.get_frame_dtype(message),
+                              MessageHandler.get_frame_size(message))
@@ -21,13 +21,12 @@ class MessageHandler(object):
         data.update(message.data.get("part_2"))
         data.update(message.data.get("appendix", {}))
 
+        # The raw parts (flatfield, pixel mask and countrate table) are not dictionaries: only the part headers
+        # are merged.
         if MessageHandler.get_header(message)["header_detail"] == "all":
             data.update(message.data["part_3"])
-            data.update(message.data["part_4_raw"])
             data.update(message.data["part_5"])
-            data.update(message.data["part_6_raw"])
             data.update(message.data["part_7"])
-            data.update(message.data["part_8_raw"])
 
         return data
 
@@ -38,3 +37,7 @@ class MessageHandler(object):
     @staticmethod
     def get_frame_dtype(message):
         raise ValueError("No dtype in message.")
+
+    @staticmethod
+    def get_array(message):
+        raise ValueError("No array in message.")
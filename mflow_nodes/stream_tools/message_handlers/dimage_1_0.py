@@ -1,6 +1,23 @@
+from mflow_nodes.stream_tools.dimage_codecs import decode_frame
+from mflow_nodes.stream_tools.message_handlers import get_array_view
+
+
+def _decode_frame(data):
+    # Reverse the shape, (X, Y) is received, but (Y, X) is needed by the writer.
+    shape = data["part_2"]["shape"][::-1]
+    array = decode_frame(data["part_3_raw"], data["part_2"].get("encoding", ""), data["part_2"]["type"], shape)
+
+    # Uncompressed frames are still a view of the received buffer.
+    return get_array_view(array, array.dtype, shape)
+
+
 class MessageHandler(object):
     """
     Message handler for dimage-1.0
+
+    The frame is decoded according to the part_2 encoding (see mflow_nodes.stream_tools.dimage_codecs), each time
+    get_data is called. The message data is not modified: MFlowMessage caches the decoded frame, and starts decoding
+    it ahead of the processing with decode_ahead.
     """
     @staticmethod
     def get_header(message):
@@ -12,7 +29,7 @@ class MessageHandler(object):
 
     @staticmethod
     def get_data(message):
-        return message.data["part_3_raw"]
+        return _decode_frame(message.data)
 
     @staticmethod
     def get_data_length(message):
@@ -26,3 +43,17 @@ class MessageHandler(object):
     @staticmethod
     def get_frame_dtype(message):
         return message.data["part_2"]["type"]
+
+    @staticmethod
+    def get_array(message):
+        return MessageHandler.get_data(message)
+
+    @staticmethod
+    def decode_ahead(message, executor):
+        """
+        Start decoding the frame in the executor.
+        :param message: Raw message.
+        :param executor: concurrent.futures executor to decode the frame with.
+        :return: Future of the decoded frame.
+        """
+        return executor.submit(_decode_frame, message.data)
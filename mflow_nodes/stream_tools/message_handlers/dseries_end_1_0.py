@@ -25,3 +25,7 @@ class MessageHandler(object):
     @staticmethod
     def get_frame_dtype(message):
         raise ValueError("No dtype in message.")
+
+    @staticmethod
+    def get_array(message):
+        raise ValueError("No array in message.")
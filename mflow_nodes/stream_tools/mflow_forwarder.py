@@ -1,53 +1,170 @@
 from logging import getLogger
-from mflow import mflow
+from mflow import mflow, Stream, zmq
 
 from mflow_nodes import config
 
 
 class MFlowForwarder(object):
     """
-    MFlow forwarder. Forwards the mflow stream to the next node.
+    MFlow forwarder. Forwards the mflow stream to the next node, or to multiple nodes.
+
+    With multiple destinations, the distribution is either:
+        broadcast          Each message is sent to every destination.
+        load_balance       Each message is sent to one destination, the first one with space in its queue.
+
+    Destinations that do not block drop the messages when their queue is full, so a slow consumer cannot stall
+    the other destinations.
+
+    Messages received in pass-through mode (with the original ZMQ frames) are sent again as received, without
+    encoding the header and without copying the data frames.
     """
     _logger = getLogger(__name__)
 
-    def __init__(self, conn_type=mflow.BIND, mode=mflow.PUSH, receive_timeout=None, queue_size=None):
+    BROADCAST = "broadcast"
+    LOAD_BALANCE = "load_balance"
+
+    def __init__(self, conn_type=mflow.BIND, mode=mflow.PUSH, receive_timeout=None, queue_size=None,
+                 distribution=None):
         """
         Constructor.
         :param conn_type: Type of mflow connection to use.
         :param mode: Socket type.
         :param receive_timeout: Receive timeout.
         :param queue_size: Queue size to use for mflow.
+        :param distribution: Distribution of the messages to multiple destinations, "broadcast" or "load_balance".
         """
         self.conn_type = conn_type
         self.mode = mode
         self.receive_timeout = receive_timeout or config.DEFAULT_RECEIVE_TIMEOUT
         self.queue_size = queue_size or config.DEFAULT_ZMQ_QUEUE_LENGTH
+        self.distribution = distribution or config.DEFAULT_FORWARDER_DISTRIBUTION
         self.stream = None
+        self.streams = []
 
-    def start(self, address):
+        self._blocking = []
+        self._n_sent = []
+        self._n_dropped = []
+        self._next_destination = 0
+
+    def start(self, address, block=True):
         """
         Start the mflow connection on the provided address.
-        :param address: Address to use for connection.
+        :param address: Address to use for connection, or list of addresses.
+        :param block: Wait for space in the destination queue. One value for all the addresses, or a list with
+        one value for each address. If False, the messages are dropped when the queue is full.
         :return: None.
         """
-        self.stream = mflow.connect(address,
-                                    conn_type=self.conn_type,
-                                    mode=self.mode,
-                                    receive_timeout=self.receive_timeout,
-                                    queue_size=self.queue_size)
+        addresses = list(address) if isinstance(address, (list, tuple)) else [address]
+        blocking = list(block) if isinstance(block, (list, tuple)) else [block] * len(addresses)
+
+        if len(blocking) != len(addresses):
+            raise ValueError("Blocking specified for %d destinations, but %d addresses were provided." %
+                             (len(blocking), len(addresses)))
+
+        if self.distribution not in (self.BROADCAST, self.LOAD_BALANCE):
+            raise ValueError("Unknown distribution '%s'. Use '%s' or '%s'." %
+                             (self.distribution, self.BROADCAST, self.LOAD_BALANCE))
+
+        self.streams = [self._connect(destination_address) for destination_address in addresses]
+        self.stream = self.streams[0]
+
+        self._blocking = blocking
+        self._n_sent = [0] * len(addresses)
+        self._n_dropped = [0] * len(addresses)
+        self._next_destination = 0
+
+    def _connect(self, address):
+        # Inproc addresses are reachable only from the same ZMQ context: use the process wide one.
+        if address.startswith("inproc://"):
+            stream = Stream()
+            stream.connect(address=address,
+                           conn_type=self.conn_type,
+                           mode=self.mode,
+                           receive_timeout=self.receive_timeout,
+                           queue_size=self.queue_size,
+                           context=zmq.Context.instance())
+            return stream
+
+        return mflow.connect(address,
+                             conn_type=self.conn_type,
+                             mode=self.mode,
+                             receive_timeout=self.receive_timeout,
+                             queue_size=self.queue_size)
 
     def forward(self, message):
         """
         Forward the provided data.
         :param message: Message to be forwarded.
-        :return: None.
+        :return: True if the message was sent to at least one destination.
         """
         self._logger.debug("Forwarding message with header:\n%s" % message.data["header"])
-        self.stream.forward(message.data, block=True)
+
+        zmq_frames = getattr(message, "zmq_frames", None)
+        data = zmq_frames if zmq_frames is not None else message.data
+
+        if len(self.streams) == 1:
+            return self._send(0, data, self._blocking[0])
+
+        if self.distribution == self.LOAD_BALANCE:
+            return self._send_load_balanced(data)
+
+        sent = False
+        for destination_index, block in enumerate(self._blocking):
+            sent = self._send(destination_index, data, block) or sent
+
+        return sent
+
+    def _send(self, destination_index, data, block, count_drop=True):
+        stream = self.streams[destination_index]
+
+        try:
+            # The original frames can be sent again, also to multiple destinations.
+            if isinstance(data, list):
+                stream.socket.send_multipart(data, flags=0 if block else zmq.NOBLOCK, copy=False)
+            else:
+                stream.forward(data, block=block)
+        except zmq.Again:
+            if count_drop:
+                self._n_dropped[destination_index] += 1
+            return False
+
+        self._n_sent[destination_index] += 1
+        return True
+
+    def _send_load_balanced(self, data):
+        n_destinations = len(self.streams)
+        destinations = [(self._next_destination + offset) % n_destinations for offset in range(n_destinations)]
+
+        # A full queue means the destination is busy: try the next one.
+        for destination_index in destinations:
+            if self._send(destination_index, data, block=False, count_drop=False):
+                self._next_destination = (destination_index + 1) % n_destinations
+                return True
+
+        # All the destinations are busy: wait for the first one that blocks.
+        for destination_index in destinations:
+            if self._blocking[destination_index]:
+                self._next_destination = (destination_index + 1) % n_destinations
+                return self._send(destination_index, data, block=True)
+
+        self._n_dropped[destinations[0]] += 1
+        return False
+
+    def get_statistics(self):
+        """
+        Return the number of sent and dropped messages for each destination.
+        :return: List of dictionaries, one for each destination.
+        """
+        return [{"sent": n_sent, "dropped": n_dropped, "block": block}
+                for n_sent, n_dropped, block in zip(self._n_sent, self._n_dropped, self._blocking)]
 
     def stop(self):
         """
         Disconnect the forwarder.
         :return: None.
         """
-        self.stream.disconnect()
+        if any(self._n_dropped):
+            self._logger.info("Forwarder statistics: %s" % self.get_statistics())
+
+        for stream in self.streams:
+            stream.disconnect()
@@ -0,0 +1,264 @@
+import heapq
+from collections import OrderedDict
+from logging import getLogger
+from time import time
+
+from mflow import mflow, Stream, zmq
+
+from mflow_nodes import config
+from mflow_nodes.stream_tools.mflow_message import MessageDispatcher
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+# Messages that start or end a series: the frame indexes restart after them.
+SERIES_BOUNDARY_HTYPES = ("dheader-1.0", "dseries_end-1.0")
+
+
+class MFlowMerger(object):
+    """
+    MFlow merger. Receives from multiple upstream addresses and merges the streams into one, ordered by frame index.
+
+    The received messages are held in a reorder buffer until the next expected frame index arrives.
+    If the buffer holds reorder_window messages, or the oldest message waited missing_frame_timeout seconds,
+    the missing frames are skipped. Frames arriving after they were skipped are dropped.
+    Messages without a frame index (series headers and ends) are passed on once all the buffered frames were
+    released, and the expected frame index is reset after a series header or end.
+
+    The statistics are kept in shared memory: the merger has to be created before the node processes are forked.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, addresses, reorder_window=None, missing_frame_timeout=None, receive_timeout=None,
+                 queue_size=None, receive_raw=False):
+        """
+        Constructor.
+        :param addresses: List of fully qualified ZMQ stream addresses to connect to.
+        :param reorder_window: Maximum number of messages in the reorder buffer.
+        :param missing_frame_timeout: Time, in seconds, to wait for a missing frame before skipping it.
+        :param receive_timeout: Poll timeout in milliseconds, when no messages are buffered.
+        :param queue_size: ZMQ queue size of each input.
+        :param receive_raw: Receive the messages with the raw handler.
+        """
+        self.addresses = list(addresses)
+        self.reorder_window = reorder_window or config.DEFAULT_MERGE_REORDER_WINDOW
+        self.missing_frame_timeout = missing_frame_timeout or config.DEFAULT_MERGE_MISSING_FRAME_TIMEOUT
+        self.receive_timeout = receive_timeout or config.DEFAULT_RECEIVE_TIMEOUT
+        self.queue_size = queue_size or config.DEFAULT_ZMQ_QUEUE_LENGTH
+        self.receive_raw = receive_raw
+
+        self._validate_parameters()
+
+        self._input_statistics = SharedCounters(["messages", "last_frame_index"], len(self.addresses))
+        self._reorder_statistics = SharedCounters(["occupancy", "max_occupancy", "released", "missing_frames",
+                                                   "late_frames", "start_time"])
+
+        self._streams = None
+        self._dispatchers = None
+        self._poller = None
+        # Reorder buffer entries: (frame_index, sequence, receive_time, message).
+        self._reorder_buffer = []
+        self._next_sequence = 0
+        self._next_frame_index = None
+        self._inputs_seen = set()
+
+    def _validate_parameters(self):
+        error_message = ""
+
+        if not self.addresses:
+            error_message += "At least one address to merge is needed.\n"
+
+        if self.reorder_window < 1:
+            error_message += "Parameter 'reorder_window' must be at least 1.\n"
+
+        if self.missing_frame_timeout <= 0:
+            error_message += "Parameter 'missing_frame_timeout' must be positive.\n"
+
+        if error_message:
+            self._logger.error(error_message)
+            raise ValueError(error_message)
+
+    def start(self):
+        """
+        Connect to all the input addresses.
+        """
+        self._input_statistics.reset()
+        self._reorder_statistics.reset()
+        self._reorder_statistics.set("start_time", time())
+
+        self._reorder_buffer = []
+        self._next_sequence = 0
+        self._next_frame_index = None
+        self._inputs_seen = set()
+
+        context = zmq.Context(io_threads=config.ZMQ_IO_THREADS)
+        self._poller = zmq.Poller()
+        self._streams = []
+        # Each input resolves the handlers of its messages with its own dispatch cache.
+        self._dispatchers = [MessageDispatcher(self.receive_raw) for _ in self.addresses]
+
+        for address in self.addresses:
+            stream = Stream()
+            stream.connect(address=address,
+                           conn_type=mflow.CONNECT,
+                           mode=mflow.PULL,
+                           receive_timeout=self.receive_timeout,
+                           queue_size=self.queue_size,
+                           context=context)
+            self._poller.register(stream.socket, zmq.POLLIN)
+            self._streams.append(stream)
+
+        self._logger.debug("Merging streams from %s." % self.addresses)
+
+    def receive(self):
+        """
+        Poll the inputs and return the messages that can be passed on, in frame index order.
+        :return: List of messages, empty if none is ready before the poll timeout.
+        """
+        ready_messages = []
+
+        for socket, _ in self._poller.poll(self._get_poll_timeout()):
+            input_index = next(index for index, stream in enumerate(self._streams) if stream.socket is socket)
+            message = self._receive_input(input_index)
+
+            if message is None:
+                continue
+
+            frame_index = _get_frame_index(message)
+
+            if frame_index < 0:
+                # Series headers and ends do not overtake the buffered frames.
+                ready_messages.extend(self._release_messages(flush=True))
+                ready_messages.append(message)
+
+                if message.htype in SERIES_BOUNDARY_HTYPES:
+                    self._start_series()
+
+                continue
+
+            self._input_statistics.add("messages", row=input_index)
+            self._input_statistics.set("last_frame_index", frame_index, row=input_index)
+            self._inputs_seen.add(input_index)
+
+            if self._next_frame_index is not None and frame_index < self._next_frame_index:
+                self._logger.debug("Frame %d arrived after it was skipped. Dropping it.", frame_index)
+                self._reorder_statistics.add("late_frames")
+                continue
+
+            heapq.heappush(self._reorder_buffer, (frame_index, self._next_sequence, time(), message))
+            self._next_sequence += 1
+
+        ready_messages.extend(self._release_messages())
+
+        occupancy = len(self._reorder_buffer)
+        self._reorder_statistics.set("occupancy", occupancy)
+        if occupancy > self._reorder_statistics.get("max_occupancy"):
+            self._reorder_statistics.set("max_occupancy", occupancy)
+
+        return ready_messages
+
+    def _receive_input(self, input_index):
+        stream = self._streams[input_index]
+
+        if self.receive_raw:
+            return self._dispatchers[input_index].wrap(stream.receive_raw())
+
+        return self._dispatchers[input_index].wrap(stream.receive())
+
+    def _get_poll_timeout(self):
+        if not self._reorder_buffer:
+            return self.receive_timeout
+
+        # Wake up in time to skip the missing frames.
+        oldest_receive_time = min(entry[2] for entry in self._reorder_buffer)
+        remaining_time = oldest_receive_time + self.missing_frame_timeout - time()
+
+        return max(0, min(self.receive_timeout, remaining_time * 1000))
+
+    def _start_series(self):
+        # The frame indexes of the next series start again from its lowest frame index.
+        self._next_frame_index = None
+        self._inputs_seen = set()
+
+    def _release_messages(self, flush=False):
+        """
+        Release the buffered messages that can be passed on, in frame index order.
+        :param flush: Release all the buffered messages.
+        :return: List of released messages.
+        """
+        released_messages = []
+
+        while self._reorder_buffer:
+            frame_index = self._reorder_buffer[0][0]
+
+            if not flush and not self._can_release(frame_index):
+                break
+
+            # The missing frames before this one are not coming anymore.
+            if self._next_frame_index is not None and frame_index > self._next_frame_index:
+                n_missing_frames = frame_index - self._next_frame_index
+                self._logger.debug("Skipping %d missing frames before frame %d.", n_missing_frames, frame_index)
+                self._reorder_statistics.add("missing_frames", n_missing_frames)
+
+            released_messages.append(heapq.heappop(self._reorder_buffer)[3])
+            self._next_frame_index = frame_index + 1
+
+        self._reorder_statistics.add("released", len(released_messages))
+
+        return released_messages
+
+    def _can_release(self, frame_index):
+        # The first frame is released once every input delivered a frame, so that the lowest index is known.
+        if self._next_frame_index is None:
+            in_order = len(self._inputs_seen) == len(self._streams)
+        else:
+            in_order = frame_index <= self._next_frame_index
+
+        if in_order or len(self._reorder_buffer) >= self.reorder_window:
+            return True
+
+        oldest_receive_time = min(entry[2] for entry in self._reorder_buffer)
+        return time() - oldest_receive_time >= self.missing_frame_timeout
+
+    def get_statistics(self):
+        """
+        Return the per input message rates and the reorder buffer statistics.
+        :return: Dictionary with the statistics.
+        """
+        elapsed_time = time() - self._reorder_statistics.get("start_time")
+
+        inputs = []
+        for address, input_statistics in zip(self.addresses, self._input_statistics.get_rows()):
+            inputs.append(OrderedDict([("address", address),
+                                       ("messages", int(input_statistics["messages"])),
+                                       ("last_frame_index", int(input_statistics["last_frame_index"])),
+                                       ("messages_per_second", input_statistics["messages"] / elapsed_time
+                                        if elapsed_time > 0 else 0)]))
+
+        reorder_statistics = OrderedDict((name, int(value)) for name, value
+                                         in self._reorder_statistics.get_row().items() if name != "start_time")
+        reorder_statistics["reorder_window"] = self.reorder_window
+
+        return OrderedDict([("inputs", inputs),
+                            ("reorder_buffer", reorder_statistics)])
+
+    def stop(self):
+        """
+        Disconnect from all the inputs. The messages still in the reorder buffer are discarded.
+        """
+        if self._reorder_buffer:
+            self._logger.warning("Merger stopped with %d messages in the reorder buffer.", len(self._reorder_buffer))
+            self._reorder_buffer = []
+
+        if self._streams:
+            for stream in self._streams:
+                self._poller.unregister(stream.socket)
+                stream.disconnect()
+
+            self._streams = None
+
+
+def _get_frame_index(message):
+    # Raw messages of series headers and ends have no frame index.
+    try:
+        return message.get_frame_index()
+    except (KeyError, ValueError):
+        return -1
@@ -1,11 +1,17 @@
+import json
+from concurrent.futures import Future
 from logging import getLogger
 
-from mflow_nodes.stream_tools.message_handlers import array_1_0, dheader_1_0, dimage_1_0, dseries_end_1_0, raw_1_0
+import numpy
+
+from mflow_nodes.stream_tools.message_handlers import array_1_0, array_compressed_1_0, dheader_1_0, dimage_1_0, \
+    dseries_end_1_0, raw_1_0
 
 _logger = getLogger(__name__)
 
 # Mapping of available handlers to the 'htype' header attribute.
 handlers_mapping = {"array-1.0": array_1_0.MessageHandler,
+                    "array-compressed-1.0": array_compressed_1_0.MessageHandler,
                     "dheader-1.0": dheader_1_0.MessageHandler,
                     "dimage-1.0": dimage_1_0.MessageHandler,
                     "dseries_end-1.0": dseries_end_1_0.MessageHandler,
@@ -22,9 +28,9 @@ def get_mflow_message(message):
         return None
 
     htype = message.data["header"]["htype"]
-    try:
-        handler = handlers_mapping[htype]
-    except KeyError:
+    handler = handlers_mapping.get(htype)
+
+    if handler is None:
         _logger.warning("No handler for htype='%s' available. Dropping message." % htype)
         return None
 
@@ -39,35 +45,292 @@ def get_raw_mflow_message(message):
     return MFlowMessage(message, handlers_mapping["raw-1.0"], message.data["header"]["htype"])
 
 
+def get_mflow_message_from_frames(header, frames, statistics=None, receive_raw=False, zmq_frames=None,
+                                  borrowed=False):
+    """
+    Wrap the header and data frames of a message, that was not received by an mflow stream, based on the message type.
+    The frames are decoded the same way the mflow stream would decode them.
+    :param header: Message header (dictionary).
+    :param frames: List of data frames (bytes like objects), following the header.
+    :param statistics: Message statistics.
+    :param receive_raw: Wrap the message with the raw handler.
+    :param zmq_frames: Received ZMQ frames (header included), to forward the message as received.
+    :param borrowed: The frames are valid only until the ring buffer slot holding them is released.
+    :return MflowMessage or None if no handler is available.
+    """
+    message = RawMessage(header, frames, statistics, zmq_frames, borrowed)
+
+    if receive_raw:
+        return get_raw_mflow_message(message)
+
+    frames_decoder = frames_decoders_mapping.get(header["htype"])
+    if frames_decoder is not None:
+        frames_decoder(message.data, frames)
+
+    return get_mflow_message(message)
+
+
+def get_passthrough_mflow_message(zmq_frames, statistics=None, receive_raw=False, dispatcher=None):
+    """
+    Wrap the ZMQ frames received without copying (recv_multipart(copy=False)).
+    Only the header frame is decoded. The data frames are not copied, and the original frames are kept on the
+    raw message, so the forwarder can send them again without encoding the message.
+    :param zmq_frames: List of zmq.Frame, starting with the header.
+    :param statistics: Message statistics.
+    :param receive_raw: Wrap the message with the raw handler.
+    :param dispatcher: MessageDispatcher of the stream, to resolve the handler with. It overrides receive_raw.
+    :return MflowMessage or None if no handler is available.
+    """
+    header = json.loads(zmq_frames[0].bytes.decode())
+    frames = [frame.buffer for frame in zmq_frames[1:]]
+
+    if dispatcher is not None:
+        return dispatcher.wrap_frames(header, frames, statistics, zmq_frames)
+
+    return get_mflow_message_from_frames(header, frames, statistics, receive_raw, zmq_frames)
+
+
+def copy_borrowed_message(message):
+    """
+    Return the message, or a copy of it if its frames are borrowed from a ring buffer slot.
+    Messages kept after process_message returns (queued to other threads or processes) have to be copied, because
+    the slot is released and written again.
+    :param message: MFlowMessage.
+    :return: MFlowMessage that can be kept.
+    """
+    raw_message = message.raw_message
+
+    if not getattr(raw_message, "borrowed", False):
+        return message
+
+    return get_mflow_message_from_frames(dict(raw_message.data["header"]),
+                                         [bytes(frame) for frame in raw_message.frames],
+                                         raw_message.statistics,
+                                         receive_raw=message.handler is handlers_mapping["raw-1.0"])
+
+
+def _decode_array_frames(data, frames):
+    header = data["header"]
+    data["data"] = [numpy.frombuffer(frames[0], dtype=header["type"]).reshape(header["shape"])]
+
+
+def _decode_dheader_frames(data, frames):
+    data["part_2"] = json.loads(bytes(frames[0]).decode())
+
+    if data["header"].get("header_detail") == "all":
+        data["part_3"] = json.loads(bytes(frames[1]).decode())
+        data["part_4_raw"] = frames[2]
+        data["part_5"] = json.loads(bytes(frames[3]).decode())
+        data["part_6_raw"] = frames[4]
+        data["part_7"] = json.loads(bytes(frames[5]).decode())
+        data["part_8_raw"] = frames[6]
+        appendix_frames = frames[7:]
+    else:
+        appendix_frames = frames[1:]
+
+    if appendix_frames:
+        data["appendix"] = json.loads(bytes(appendix_frames[0]).decode())
+
+
+def _decode_dimage_frames(data, frames):
+    data["part_2"] = json.loads(bytes(frames[0]).decode())
+    data["part_3_raw"] = frames[1]
+    data["part_4"] = json.loads(bytes(frames[2]).decode())
+
+    if len(frames) > 3:
+        data["appendix"] = json.loads(bytes(frames[3]).decode())
+
+
+# Mapping of frame decoders to the 'htype' header attribute.
+frames_decoders_mapping = {"array-1.0": _decode_array_frames,
+                           "dheader-1.0": _decode_dheader_frames,
+                           "dimage-1.0": _decode_dimage_frames}
+
+
+class MessageDispatcher(object):
+    """
+    Wraps the messages of one stream, like get_mflow_message and get_mflow_message_from_frames.
+    The handler and frames decoder resolved for the last htype are cached: a stream carries long runs of messages of
+    the same htype, which then skip the mapping lookups.
+    """
+    __slots__ = ["receive_raw", "_dispatch"]
+
+    def __init__(self, receive_raw=False):
+        """
+        :param receive_raw: Wrap the messages with the raw handler.
+        """
+        self.receive_raw = receive_raw
+        # (htype, handler, frames decoder) of the last message. Replaced as a whole, so threads can share it.
+        self._dispatch = (None, None, None)
+
+    def _resolve(self, htype):
+        dispatch = self._dispatch
+
+        if htype != dispatch[0]:
+            handler = handlers_mapping["raw-1.0"] if self.receive_raw else handlers_mapping.get(htype)
+
+            if handler is None:
+                _logger.warning("No handler for htype='%s' available. Dropping message." % htype)
+                return None
+
+            frames_decoder = None if self.receive_raw else frames_decoders_mapping.get(htype)
+            dispatch = self._dispatch = (htype, handler, frames_decoder)
+
+        return dispatch
+
+    def wrap(self, message):
+        """
+        Wrap the mflow return message.
+        :return MflowMessage or None if no handler is available or message is None.
+        """
+        if message is None:
+            return None
+
+        htype = message.data["header"]["htype"]
+        dispatch = self._resolve(htype)
+
+        if dispatch is None:
+            return None
+
+        return MFlowMessage(message, dispatch[1], htype)
+
+    def wrap_frames(self, header, frames, statistics=None, zmq_frames=None, borrowed=False):
+        """
+        Wrap the header and data frames of a message. See get_mflow_message_from_frames.
+        :return MflowMessage or None if no handler is available.
+        """
+        htype = header["htype"]
+        dispatch = self._resolve(htype)
+
+        if dispatch is None:
+            return None
+
+        message = RawMessage(header, frames, statistics, zmq_frames, borrowed)
+
+        if dispatch[2] is not None:
+            dispatch[2](message.data, frames)
+
+        return MFlowMessage(message, dispatch[1], htype)
+
+
+class RawMessage(object):
+    """
+    Stand-in for the mflow message, for messages assembled from already received frames.
+    """
+    def __init__(self, header, frames, statistics=None, zmq_frames=None, borrowed=False):
+        self.data = {"header": header, "data": frames}
+        self.statistics = statistics
+        self.zmq_frames = zmq_frames
+        # The received frames, before they are decoded.
+        self.frames = frames
+        self.borrowed = borrowed
+
+
+class ReceiveStatistics(object):
+    """
+    Receiving statistics, with the same attributes as the mflow stream statistics.
+    For messages received directly from the ZMQ socket.
+    """
+    __slots__ = ["messages_received", "bytes_received", "total_bytes_received"]
+
+    def __init__(self):
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.total_bytes_received = 0
+
+    def update(self, n_bytes):
+        self.messages_received += 1
+        self.bytes_received = n_bytes
+        self.total_bytes_received += n_bytes
+
+
+# Marks the message fields that were not read from the raw message yet.
+_NOT_SET = object()
+
+
 class MFlowMessage(object):
     """
     Wrap for the mflow message.
+    The header derived fields are read from the raw message on first access, and cached.
     """
+    __slots__ = ["raw_message", "handler", "htype", "_header", "_frame_index", "_frame_size", "_frame_dtype",
+                 "_array"]
+
     def __init__(self, message, handler, htype):
         self.raw_message = message
         self.handler = handler
         self.htype = htype
+        self._header = _NOT_SET
+        self._frame_index = _NOT_SET
+        self._frame_size = _NOT_SET
+        self._frame_dtype = _NOT_SET
+        self._array = None
 
     def get_header(self):
-        return self.handler.get_header(self.raw_message)
+        if self._header is _NOT_SET:
+            self._header = self.handler.get_header(self.raw_message)
+        return self._header
 
     def get_frame_index(self):
-        return self.handler.get_frame_index(self.raw_message)
+        if self._frame_index is _NOT_SET:
+            self._frame_index = self.handler.get_frame_index(self.raw_message)
+        return self._frame_index
 
     def get_data(self):
+        # The handlers that decode the frame return it also from get_array: decode it only once.
+        if hasattr(self.handler, "decode_ahead"):
+            return self.get_array()
+
         return self.handler.get_data(self.raw_message)
 
     def get_data_length(self):
         return self.handler.get_data_length(self.raw_message)
 
+    def get_array(self):
+        """
+        Return the frame as a read only numpy array, viewing the received buffer without copying it.
+        Processors that need to modify the frame have to copy the array.
+        """
+        if self._array is None:
+            self._array = self.handler.get_array(self.raw_message)
+
+        # The frame is being decoded ahead.
+        elif isinstance(self._array, Future):
+            self._array = self._array.result()
+
+        return self._array
+
+    def decode_ahead(self, executor):
+        """
+        Start decoding the frame in the executor, if the message handler supports it.
+        get_data and get_array wait for the decoded frame. The decoding is kept on this wrapper, not in the raw
+        message data, which is forwarded and spilled as received.
+        :param executor: concurrent.futures executor to decode the frame with.
+        """
+        handler_decode_ahead = getattr(self.handler, "decode_ahead", None)
+
+        if handler_decode_ahead is not None and self._array is None:
+            self._array = handler_decode_ahead(self.raw_message, executor)
+
     def get_frame_size(self):
-        return self.handler.get_frame_size(self.raw_message)
+        if self._frame_size is _NOT_SET:
+            self._frame_size = self.handler.get_frame_size(self.raw_message)
+        return self._frame_size
 
     def get_frame_dtype(self):
-        return self.handler.get_frame_dtype(self.raw_message)
+        if self._frame_dtype is _NOT_SET:
+            self._frame_dtype = self.handler.get_frame_dtype(self.raw_message)
+        return self._frame_dtype
 
     def get_statistics(self):
         return self.raw_message.statistics
 
+    def __getstate__(self):
+        # The cached fields are not pickled: the _NOT_SET marker would not be the same object once unpickled.
+        return self.raw_message, self.handler, self.htype
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
     def __str__(self):
         return str(self.get_header())
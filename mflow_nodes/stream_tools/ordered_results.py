@@ -0,0 +1,98 @@
+from collections import deque
+from logging import getLogger
+from threading import Condition, Thread
+
+
+class OrderedResultSender(object):
+    """
+    Pass the results of concurrent work on, in the submitting order, from a background thread.
+
+    Each result is passed on as soon as it and all the results submitted before it are done: the last messages of a
+    burst or of a series do not wait for the next message to arrive. Only the background thread calls the send
+    function, so it can use a socket that is not thread safe.
+    """
+    _logger = getLogger(__name__)
+
+    def __init__(self, send_function, max_in_flight, name="result_sender"):
+        """
+        Constructor.
+        :param send_function: Function called with (item, future) for each submitted item, in order, once the
+        future is done. The future is None for the items submitted without one.
+        :param max_in_flight: Maximum number of items waiting to be sent. Submitting more waits for the oldest one.
+        :param name: Name of the sending thread.
+        """
+        self.send_function = send_function
+        self.max_in_flight = max_in_flight
+        self.name = name
+
+        self._in_flight = deque()
+        self._condition = Condition()
+        self._stopping = False
+        self._sending_thread = None
+
+    def start(self):
+        self._in_flight.clear()
+        self._stopping = False
+
+        self._sending_thread = Thread(target=self._send_results, name=self.name, daemon=True)
+        self._sending_thread.start()
+
+    def submit(self, item, future=None):
+        """
+        Queue the item, to be sent once the future is done.
+        :param item: Item to pass to the send function.
+        :param future: Future of the concurrent work on the item, or None to send the item in order as it is.
+        :return: Number of items in flight, this one included.
+        """
+        with self._condition:
+            while len(self._in_flight) >= self.max_in_flight:
+                self._condition.wait()
+
+            self._in_flight.append((item, future))
+            self._condition.notify_all()
+
+            return len(self._in_flight)
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    def _send_results(self):
+        while True:
+            with self._condition:
+                while not self._in_flight and not self._stopping:
+                    self._condition.wait()
+
+                if not self._in_flight:
+                    return
+
+                item, future = self._in_flight[0]
+
+            # Wait outside of the lock, so that new items can be submitted meanwhile.
+            if future is not None:
+                try:
+                    future.exception()
+                except Exception:
+                    pass
+
+            try:
+                self.send_function(item, future)
+            except Exception as e:
+                self._logger.error("Failed to send a result. %s", e)
+
+            with self._condition:
+                self._in_flight.popleft()
+                self._condition.notify_all()
+
+    def stop(self):
+        """
+        Send all the items in flight, and stop the sending thread.
+        """
+        if self._sending_thread is None:
+            return
+
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+        self._sending_thread.join()
+        self._sending_thread = None
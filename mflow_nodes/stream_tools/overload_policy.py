@@ -0,0 +1,276 @@
+import ctypes
+from collections import OrderedDict
+from logging import getLogger
+from multiprocessing.sharedctypes import RawArray
+from queue import Full, Empty
+from threading import Lock, local
+from time import time
+
+import numpy
+
+from mflow_nodes import config
+from mflow_nodes.stream_tools.mflow_message import copy_borrowed_message
+from mflow_nodes.stream_tools.shared_statistics import SharedCounters
+
+_logger = getLogger(__name__)
+
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICY_KEEP_EVERY_NTH = "keep_every_nth"
+POLICY_RATE_CAP = "rate_cap"
+OVERLOAD_POLICIES = [POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_DROP_NEWEST, POLICY_KEEP_EVERY_NTH, POLICY_RATE_CAP]
+
+
+class OverloadPolicy(object):
+    """
+    Decide what happens to the received messages when the processor cannot keep up.
+
+    Policies:
+        block              Wait for the processor (backpressure on the ZMQ queue).
+        drop_oldest        Drop the oldest message in the data queue to make space for the new one.
+        drop_newest        Drop the new message if the data queue is full.
+        keep_every_nth     Pass only every n-th message to the processor.
+        rate_cap           Pass at most max_rate messages per second to the processor.
+
+    Received messages without a frame index (series headers and ends) are always queued, and never dropped from
+    the data queue. The messages are admitted once: retrying a message after a queue timeout does not count it again.
+    The drop counters and the ranges of dropped frame indexes are kept in shared memory.
+    """
+
+    def __init__(self, policy=None, keep_every_nth=None, max_rate=None, n_dropped_ranges=None):
+        """
+        Constructor.
+        :param policy: Name of the policy.
+        :param keep_every_nth: Interval of messages to keep, for the keep_every_nth policy.
+        :param max_rate: Maximum messages per second, for the rate_cap policy.
+        :param n_dropped_ranges: Number of most recent dropped frame index ranges to keep.
+        """
+        self.policy = policy or config.DEFAULT_OVERLOAD_POLICY
+        self.keep_every_nth = keep_every_nth
+        self.max_rate = max_rate
+        self.n_dropped_ranges = n_dropped_ranges or config.DEFAULT_OVERLOAD_DROPPED_RANGES
+
+        self._validate_parameters()
+
+        self._statistics = SharedCounters(["received", "accepted", "dropped", "dropped_ranges"])
+        self._dropped_ranges = numpy.frombuffer(RawArray(ctypes.c_int64, self.n_dropped_ranges * 2),
+                                                dtype=numpy.int64).reshape(self.n_dropped_ranges, 2)
+        self._received_index = self._statistics.get_index("received")
+        self._accepted_index = self._statistics.get_index("accepted")
+        self._dropped_index = self._statistics.get_index("dropped")
+        self._lock = Lock()
+
+        # Keep every n-th and rate cap state.
+        self._n_received = 0
+        self._tokens = 0
+        self._last_token_time = None
+        # Message of each receiving thread that was admitted, but not queued before the timeout.
+        self._retry = local()
+
+    def _validate_parameters(self):
+        error_message = ""
+
+        if self.policy not in OVERLOAD_POLICIES:
+            error_message += "Unknown overload policy '%s'. Available policies: %s.\n" % (self.policy,
+                                                                                         OVERLOAD_POLICIES)
+
+        if self.policy == POLICY_KEEP_EVERY_NTH and (not self.keep_every_nth or self.keep_every_nth < 1):
+            error_message += "Policy '%s' needs keep_every_nth to be at least 1.\n" % self.policy
+
+        if self.policy == POLICY_RATE_CAP and (not self.max_rate or self.max_rate <= 0):
+            error_message += "Policy '%s' needs a positive max_rate.\n" % self.policy
+
+        if error_message:
+            _logger.error(error_message)
+            raise ValueError(error_message)
+
+    def reset(self):
+        self._statistics.reset()
+        self._n_received = 0
+        self._tokens = 0
+        self._last_token_time = None
+
+    @staticmethod
+    def _get_frame_index(message):
+        """
+        Return the frame index of the message, or -1 if the message has none (for example raw series headers).
+        """
+        try:
+            return message.get_frame_index()
+        except (KeyError, ValueError):
+            return -1
+
+    def _record_drop(self, message):
+        """
+        Count the dropped message and extend or add its frame index range.
+        """
+        frame_index = self._get_frame_index(message)
+
+        with self._lock:
+            self._statistics.values[0, self._dropped_index] += 1
+            n_ranges = int(self._statistics.get("dropped_ranges"))
+
+            last_range = self._dropped_ranges[(n_ranges - 1) % self.n_dropped_ranges] if n_ranges else None
+            if last_range is not None and last_range[1] + 1 == frame_index:
+                last_range[1] = frame_index
+            else:
+                self._dropped_ranges[n_ranges % self.n_dropped_ranges] = (frame_index, frame_index)
+                self._statistics.add("dropped_ranges")
+
+        _logger.debug("Dropped frame %d.", frame_index)
+
+    def _count(self, counter_index, value=1):
+        # Multiple receiving threads share the policy.
+        with self._lock:
+            self._statistics.values[0, counter_index] += value
+
+    def _admit(self, message):
+        """
+        Decide, before queuing, if the message is passed to the processor (keep_every_nth and rate_cap).
+        """
+        # The message is retried after a queue timeout: it was already admitted.
+        if getattr(self._retry, "message", None) is message:
+            return True
+
+        with self._lock:
+            if self.policy == POLICY_KEEP_EVERY_NTH:
+                self._n_received += 1
+                return (self._n_received - 1) % self.keep_every_nth == 0
+
+            # Token bucket, allowing bursts of up to 1 second of messages.
+            current_time = time()
+            if self._last_token_time is None:
+                self._tokens = 1
+            else:
+                elapsed_time = current_time - self._last_token_time
+                self._tokens = min(self.max_rate, self._tokens + elapsed_time * self.max_rate)
+            self._last_token_time = current_time
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+
+            return False
+
+    def put(self, data_queue, message, timeout=None):
+        """
+        Put the message on the data queue according to the policy.
+        :param data_queue: Data queue between the receivers and the processor.
+        :param message: Received message.
+        :param timeout: Time to wait for the queue, for the blocking policies.
+        :raise Full: If the message could not be queued before the timeout, and should be retried.
+        """
+        self._count(self._received_index)
+
+        if self.policy == POLICY_BLOCK:
+            self._put_blocking(data_queue, message, timeout)
+
+        # Series headers and ends are never dropped.
+        elif self._get_frame_index(message) < 0:
+            self._put_blocking(data_queue, message, timeout)
+
+        elif self.policy == POLICY_DROP_NEWEST:
+            try:
+                data_queue.put(message, block=False)
+                self._count(self._accepted_index)
+            except Full:
+                self._record_drop(message)
+
+        elif self.policy == POLICY_DROP_OLDEST:
+            while True:
+                try:
+                    data_queue.put(message, block=False)
+                    self._count(self._accepted_index)
+                    return
+                except Full:
+                    pass
+
+                # Only series headers and ends are queued: drop the new frame instead.
+                if not self._drop_oldest_frame(data_queue):
+                    self._record_drop(message)
+                    return
+
+        elif self._admit(message):
+            self._put_blocking(data_queue, message, timeout)
+
+        else:
+            self._record_drop(message)
+
+    def _drop_oldest_frame(self, data_queue):
+        """
+        Drop the oldest frame in the data queue. If series headers or ends are queued before it, they are kept: the
+        queue is emptied, and all the messages but the dropped frame are queued again, in the same order.
+        :return: True if a frame was dropped, False if the queue holds no frames.
+        """
+        dropped = False
+        kept_messages = []
+
+        try:
+            while True:
+                queued_message = data_queue.get(block=False)
+
+                if not dropped and self._get_frame_index(queued_message) >= 0:
+                    data_queue.task_done()
+                    self._record_drop(queued_message)
+                    dropped = True
+
+                    if not kept_messages:
+                        break
+                else:
+                    # The ring buffer slot is released by task_done, the message is queued again later.
+                    kept_messages.append(copy_borrowed_message(queued_message))
+                    data_queue.task_done()
+        except Empty:
+            pass
+
+        for kept_message in kept_messages:
+            data_queue.put(kept_message)
+
+        return dropped
+
+    def _put_blocking(self, data_queue, message, timeout):
+        try:
+            data_queue.put(message, timeout=timeout)
+        except Full:
+            # The message will be retried, it was not received again.
+            self._count(self._received_index, -1)
+            self._retry.message = message
+            raise
+
+        self._retry.message = None
+        self._count(self._accepted_index)
+
+    def get_statistics(self):
+        """
+        Return the policy counters and the most recent dropped frame index ranges.
+        :return: Dictionary with the statistics.
+        """
+        statistics = OrderedDict([("policy", self.policy)])
+        statistics.update((name, int(value)) for name, value in self._statistics.get_row().items())
+
+        n_ranges = statistics["dropped_ranges"]
+        first_range = max(0, n_ranges - self.n_dropped_ranges)
+        statistics["dropped_ranges"] = [self._dropped_ranges[index % self.n_dropped_ranges].tolist()
+                                        for index in range(first_range, n_ranges)]
+
+        return statistics
+
+
+class OverloadPolicyQueue(object):
+    """
+    Apply the overload policy to the messages put on the data queue.
+    """
+
+    def __init__(self, data_queue, overload_policy):
+        self.data_queue = data_queue
+        self.overload_policy = overload_policy
+
+    def put(self, message, timeout=None):
+        self.overload_policy.put(self.data_queue, message, timeout)
+
+    def get(self, timeout=None):
+        return self.data_queue.get(timeout=timeout)
+
+    def task_done(self):
+        self.data_queue.task_done()
@@ -0,0 +1,257 @@
+import json
+import mmap
+import pickle
+from logging import getLogger
+from multiprocessing import Semaphore, Lock
+from queue import Empty, Full
+
+import numpy
+
+from mflow_nodes import config
+from mflow_nodes.stream_tools.mflow_message import MessageDispatcher
+
+_logger = getLogger(__name__)
+
+
+class RingBuffer(object):
+    """
+    Shared memory ring buffer with fixed size slots.
+
+    Each slot holds the message header and its data frames. The frames are exposed to the reader as read only
+    numpy views on the shared memory, so they are never copied or pickled on the way to the reader.
+    The ring buffer must be created before the writing and reading processes are forked.
+
+    There can be only one reading process. Slots are read and released in the same order they were written.
+    """
+
+    SLOT_EMPTY = 0
+    SLOT_FULL = 1
+
+    def __init__(self, n_slots, slot_bytes, header_bytes=None, max_frames=None, buffer_file=None):
+        """
+        Constructor.
+        :param n_slots: Number of slots in the buffer.
+        :param slot_bytes: Maximum number of data bytes in each slot.
+        :param header_bytes: Maximum number of header (and statistics) bytes in each slot.
+        :param max_frames: Maximum number of data frames in each slot.
+        :param buffer_file: File to map the data buffer to. Default: anonymous shared memory.
+        """
+        self.n_slots = n_slots
+        self.slot_bytes = slot_bytes
+        self.header_bytes = header_bytes or config.DEFAULT_RING_BUFFER_HEADER_BYTES
+        self.max_frames = max_frames or config.DEFAULT_RING_BUFFER_MAX_FRAMES
+        self.buffer_file = buffer_file
+
+        _logger.info("Setup ring buffer with n_slots=%s and slot_bytes=%s." % (self.n_slots, self.slot_bytes))
+
+        buffer_size = self.n_slots * self.slot_bytes
+
+        if self.buffer_file:
+            self._data = numpy.memmap(self.buffer_file, mode='w+', dtype=numpy.uint8, shape=buffer_size)
+        else:
+            self._data = numpy.frombuffer(mmap.mmap(-1, buffer_size), dtype=numpy.uint8)
+
+        self._data = self._data.reshape(self.n_slots, self.slot_bytes)
+        self._headers = numpy.frombuffer(mmap.mmap(-1, self.n_slots * self.header_bytes),
+                                         dtype=numpy.uint8).reshape(self.n_slots, self.header_bytes)
+
+        slot_dtype = numpy.dtype([("state", numpy.int64),
+                                  ("header_length", numpy.int64),
+                                  ("statistics_length", numpy.int64),
+                                  ("n_frames", numpy.int64),
+                                  ("frame_lengths", numpy.int64, (self.max_frames,))])
+        self._slots = numpy.frombuffer(mmap.mmap(-1, self.n_slots * slot_dtype.itemsize), dtype=slot_dtype)
+
+        # Number of written, read and released slots since the creation.
+        self._counters = numpy.frombuffer(mmap.mmap(-1, 3 * 8), dtype=numpy.int64)
+
+        self._free_slots = Semaphore(self.n_slots)
+        self._full_slots = Semaphore(0)
+        self._write_lock = Lock()
+
+    def write(self, header, frames, statistics=None, timeout=None):
+        """
+        Copy the header and the data frames into the next free slot.
+        :param header: Message header (dictionary).
+        :param frames: List of data frames (bytes like objects or numpy arrays).
+        :param statistics: Message statistics, passed to the reader.
+        :param timeout: Time to wait for a free slot. None to wait forever.
+        :return: True if the message was written, False if no slot was free before the timeout.
+        """
+        header_bytes = json.dumps(header).encode()
+        statistics_bytes = pickle.dumps(statistics) if statistics is not None else b""
+
+        if len(header_bytes) + len(statistics_bytes) > self.header_bytes:
+            raise ValueError("Trying to store %s header bytes in a %s slot." %
+                             (len(header_bytes) + len(statistics_bytes), self.header_bytes))
+
+        if len(frames) > self.max_frames:
+            raise ValueError("Trying to store %s frames in a slot of maximum %s frames." %
+                             (len(frames), self.max_frames))
+
+        frames = [_as_bytes_array(frame) for frame in frames]
+
+        data_n_bytes = sum(frame.nbytes for frame in frames)
+        if data_n_bytes > self.slot_bytes:
+            raise ValueError("Trying to store %s bytes in a %s slot." % (data_n_bytes, self.slot_bytes))
+
+        if not self._free_slots.acquire(timeout=timeout):
+            return False
+
+        with self._write_lock:
+            slot_index = self._counters[0] % self.n_slots
+            slot = self._slots[slot_index]
+
+            if slot["state"] == RingBuffer.SLOT_FULL:
+                raise ValueError("Buffer slot at index '%s' already full." % slot_index)
+
+            slot_data = self._data[slot_index]
+            offset = 0
+            for frame_index, frame in enumerate(frames):
+                slot_data[offset:offset + frame.nbytes] = frame
+                slot["frame_lengths"][frame_index] = frame.nbytes
+                offset += frame.nbytes
+
+            slot_header = self._headers[slot_index]
+            slot_header[:len(header_bytes)] = numpy.frombuffer(header_bytes, dtype=numpy.uint8)
+            slot_header[len(header_bytes):len(header_bytes) + len(statistics_bytes)] = \
+                numpy.frombuffer(statistics_bytes, dtype=numpy.uint8)
+
+            slot["header_length"] = len(header_bytes)
+            slot["statistics_length"] = len(statistics_bytes)
+            slot["n_frames"] = len(frames)
+            slot["state"] = RingBuffer.SLOT_FULL
+
+            self._counters[0] += 1
+
+        self._full_slots.release()
+        return True
+
+    def read(self, timeout=None):
+        """
+        Read the next slot. The returned frames are views on the shared memory, valid until the slot is released.
+        :param timeout: Time to wait for a slot to be written. None to wait forever.
+        :return: (header, frames, statistics) or None if no slot was written before the timeout.
+        """
+        if not self._full_slots.acquire(timeout=timeout):
+            return None
+
+        slot_index = self._counters[1] % self.n_slots
+        slot = self._slots[slot_index]
+
+        header_length = slot["header_length"]
+        statistics_length = slot["statistics_length"]
+        slot_header = self._headers[slot_index]
+
+        header = json.loads(slot_header[:header_length].tobytes().decode())
+        statistics = pickle.loads(slot_header[header_length:header_length + statistics_length].tobytes()) \
+            if statistics_length else None
+
+        slot_data = self._data[slot_index]
+        frames = []
+        offset = 0
+        for frame_length in slot["frame_lengths"][:slot["n_frames"]]:
+            frame = slot_data[offset:offset + frame_length]
+            frame.flags.writeable = False
+            frames.append(frame)
+            offset += frame_length
+
+        self._counters[1] += 1
+
+        return header, frames, statistics
+
+    def release(self):
+        """
+        Release the oldest read slot, making it available for writing.
+        """
+        if self._counters[2] >= self._counters[1]:
+            raise ValueError("No read buffer slot to release.")
+
+        slot_index = self._counters[2] % self.n_slots
+        self._slots[slot_index]["state"] = RingBuffer.SLOT_EMPTY
+        self._counters[2] += 1
+
+        self._free_slots.release()
+
+    def get_statistics(self):
+        """
+        Return the buffer counters.
+        :return: Dictionary with the number of written, read and released slots, and the current occupancy.
+        """
+        n_written, n_read, n_released = self._counters.tolist()
+
+        return {"n_slots": self.n_slots,
+                "slot_bytes": self.slot_bytes,
+                "written": n_written,
+                "read": n_read,
+                "released": n_released,
+                "occupancy": n_written - n_released}
+
+
+def _as_bytes_array(frame):
+    """
+    Return a flat uint8 view of the frame, without copying it if possible.
+    """
+    if isinstance(frame, numpy.ndarray):
+        return numpy.ascontiguousarray(frame).reshape(-1).view(numpy.uint8)
+
+    return numpy.frombuffer(frame, dtype=numpy.uint8)
+
+
+class RingBufferQueue(object):
+    """
+    Queue interface (put, get, task_done) on top of the ring buffer, to use it as the node data queue.
+
+    Messages returned by get are valid only until task_done is called for them. Processors that need the
+    message data after process_message returns have to copy it (see copy_borrowed_message).
+    """
+
+    def __init__(self, ring_buffer, receive_raw=False):
+        """
+        Constructor.
+        :param ring_buffer: Ring buffer to pass the messages through.
+        :param receive_raw: Pass the messages to the processor with the raw handler.
+        """
+        self.ring_buffer = ring_buffer
+        self.receive_raw = receive_raw
+        self._dispatcher = MessageDispatcher(receive_raw)
+
+    def put(self, message, block=True, timeout=None):
+        if not block:
+            timeout = 0
+
+        raw_message = message.raw_message
+        # The frames as received (passthrough mode) are decoded again by the reader, whatever the htype.
+        frames = getattr(raw_message, "frames", None)
+
+        if frames is None:
+            frames = raw_message.data.get("data")
+
+        if frames is None:
+            raise ValueError("Message with htype '%s' cannot be passed through the ring buffer. "
+                             "Receive the stream in raw or passthrough mode." % message.htype)
+
+        if not self.ring_buffer.write(raw_message.data["header"], frames, message.get_statistics(), timeout):
+            raise Full
+
+    def get(self, block=True, timeout=None):
+        if not block:
+            timeout = 0
+
+        slot = self.ring_buffer.read(timeout)
+
+        if slot is None:
+            raise Empty
+
+        header, frames, statistics = slot
+        message = self._dispatcher.wrap_frames(header, frames, statistics, borrowed=True)
+
+        # Messages without handlers still occupy a slot.
+        if message is None:
+            self.ring_buffer.release()
+            raise Empty
+
+        return message
+
+    def task_done(self):
+        self.ring_buffer.release()
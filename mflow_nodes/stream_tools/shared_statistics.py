@@ -0,0 +1,173 @@
+import ctypes
+from collections import OrderedDict
+from multiprocessing.sharedctypes import RawArray
+from time import time
+
+import numpy
+
+
+class SharedCounters(object):
+    """
+    Named counters in shared memory.
+
+    The counters have to be created before the processing processes are forked. The values written by the
+    processing processes are then visible to the REST process without any inter process communication.
+    """
+
+    def __init__(self, names, n_rows=1):
+        """
+        Constructor.
+        :param names: Names of the counters.
+        :param n_rows: Number of counter sets (for example, one per worker).
+        """
+        self.names = list(names)
+        self.n_rows = n_rows
+
+        self._indexes = dict((name, index) for index, name in enumerate(self.names))
+        self._buffer = RawArray(ctypes.c_double, self.n_rows * len(self.names))
+        self.values = numpy.frombuffer(self._buffer, dtype=numpy.float64).reshape(self.n_rows, len(self.names))
+
+    def get_index(self, name):
+        """
+        Return the column index of the counter, to access the values array directly on the hot path.
+        :param name: Name of the counter.
+        :return: Column index of the counter.
+        """
+        return self._indexes[name]
+
+    def add(self, name, value=1, row=0):
+        self.values[row, self._indexes[name]] += value
+
+    def set(self, name, value, row=0):
+        self.values[row, self._indexes[name]] = value
+
+    def get(self, name, row=0):
+        return self.values[row, self._indexes[name]].item()
+
+    def get_row(self, row=0):
+        """
+        Return the counters of one row.
+        :param row: Index of the row.
+        :return: Ordered dictionary of counter name and value.
+        """
+        return OrderedDict(zip(self.names, self.values[row].tolist()))
+
+    def get_rows(self):
+        return [self.get_row(row) for row in range(self.n_rows)]
+
+    def get_totals(self):
+        """
+        Return the sum of each counter over all the rows.
+        :return: Ordered dictionary of counter name and total value.
+        """
+        return OrderedDict(zip(self.names, self.values.sum(axis=0).tolist()))
+
+    def reset(self):
+        self.values[:] = 0
+
+
+class SharedStatisticsBuffer(object):
+    """
+    Fixed size ring of statistics records in shared memory.
+
+    The processing process saves a record for each processed message, the REST process reads the ring
+    without any inter process communication. The writer does not take any lock: the reader discards
+    the records that might have been overwritten while it was reading them.
+    """
+
+    record_dtype = numpy.dtype([("timestamp", numpy.float64),
+                                ("messages_received", numpy.int64),
+                                ("total_bytes_received", numpy.int64),
+                                ("messages_processed", numpy.int64)])
+
+    def __init__(self, length):
+        """
+        Constructor.
+        :param length: Number of records in the ring.
+        """
+        self.length = length
+
+        # One additional record, which might be being overwritten while the others are read.
+        self._ring_length = self.length + 1
+        self._records = numpy.frombuffer(RawArray(ctypes.c_byte, self._ring_length * self.record_dtype.itemsize),
+                                         dtype=self.record_dtype)
+        # Number of records saved since the last reset.
+        self._n_saved = numpy.frombuffer(RawArray(ctypes.c_int64, 1), dtype=numpy.int64)
+
+        self._messages_processed = 0
+
+    def save_statistics(self, statistics, n_messages=1):
+        """
+        Save the statistics of the last processed message.
+        :param statistics: mflow statistics of the message.
+        :param n_messages: Number of messages processed since the last save.
+        """
+        self._messages_processed += n_messages
+
+        index = self._n_saved[0]
+        self._records[index % self._ring_length] = (time(),
+                                              getattr(statistics, "messages_received", 0),
+                                              getattr(statistics, "total_bytes_received", 0),
+                                              self._messages_processed)
+        self._n_saved[0] = index + 1
+
+    def flush(self):
+        """
+        All the records are written immediately, nothing to flush.
+        """
+        pass
+
+    def reset(self):
+        self._n_saved[0] = 0
+        self._messages_processed = 0
+
+    def _get_records(self):
+        """
+        Return a copy of the valid records, from the oldest to the newest.
+        """
+        n_saved_before = int(self._n_saved[0])
+        records = self._records.copy()
+        n_saved_after = int(self._n_saved[0])
+
+        # The record being written after the copy could have overwritten the oldest one.
+        first_index = max(0, n_saved_after - self._ring_length + 1)
+
+        return numpy.array([records[index % self._ring_length] for index in range(first_index, n_saved_before)],
+                           dtype=self.record_dtype)
+
+    def get_statistics_raw(self):
+        """
+        Return the saved records.
+        :return: List of dictionaries, one for each record.
+        """
+        return [dict(zip(self.record_dtype.names, record.tolist())) for record in self._get_records()]
+
+    def get_statistics(self):
+        """
+        Return the current totals and the rates over the time interval covered by the ring.
+        :return: Dictionary with the statistics.
+        """
+        records = self._get_records()
+
+        if len(records) == 0:
+            return {}
+
+        first_record = records[0]
+        last_record = records[-1]
+        interval = last_record["timestamp"] - first_record["timestamp"]
+
+        statistics = OrderedDict([("timestamp", last_record["timestamp"].item()),
+                                  ("messages_received", last_record["messages_received"].item()),
+                                  ("messages_processed", last_record["messages_processed"].item()),
+                                  ("total_bytes_received", last_record["total_bytes_received"].item()),
+                                  ("interval", interval.item()),
+                                  ("messages_per_second", 0),
+                                  ("megabytes_per_second", 0)])
+
+        if interval > 0:
+            statistics["messages_per_second"] = \
+                (last_record["messages_processed"] - first_record["messages_processed"]).item() / interval
+            statistics["megabytes_per_second"] = \
+                (last_record["total_bytes_received"] - first_record["total_bytes_received"]).item() / interval / 1e6
+
+        return statistics
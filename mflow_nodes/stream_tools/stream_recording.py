@@ -0,0 +1,160 @@
+import mmap
+import os
+
+import numpy
+
+# Record of the recording index, one for each message in arrival order. Messages without a frame index
+# (for example the detector headers) have frame -1.
+RECORD_INDEX_DTYPE = numpy.dtype([("frame", "<i8"), ("offset", "<u8"), ("size", "<u8"), ("timestamp", "<f8")])
+RECORD_INDEX_FILE_EXTENSION = ".index"
+# Each message in the segment file starts with the number of parts, followed by the length of each part.
+RECORD_PREFIX_DTYPE = numpy.dtype("<u8")
+
+
+def _write_all(file_descriptor, buffers):
+    """
+    Write the buffers with as few system calls as possible, retrying the partial writes.
+    """
+    buffers = [memoryview(buffer).cast("B") for buffer in buffers]
+
+    while buffers:
+        n_written = os.writev(file_descriptor, buffers)
+
+        while buffers and n_written >= len(buffers[0]):
+            n_written -= len(buffers[0])
+            buffers.pop(0)
+
+        if buffers and n_written:
+            buffers[0] = buffers[0][n_written:]
+
+
+class StreamRecordingWriter(object):
+    """
+    Append only writer of the raw multipart messages.
+
+    The segment file holds the messages one after the other, each as:
+        [number of parts][length of each part][parts]
+    with the prefix values as little endian uint64. The index file holds one RECORD_INDEX_DTYPE record for each
+    message, pointing to the message in the segment file.
+    """
+
+    def __init__(self, filename):
+        """
+        Create (or truncate) the segment and index files.
+        :param filename: Path of the segment file. The index file is saved next to it.
+        """
+        self.filename = filename
+
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND
+        self._segment_file = os.open(filename, flags, 0o644)
+        self._index_file = open(filename + RECORD_INDEX_FILE_EXTENSION, "wb")
+
+        self._offset = 0
+        self._index_record = numpy.zeros(1, dtype=RECORD_INDEX_DTYPE)
+        self.n_messages = 0
+
+    def write(self, parts, frame_index, timestamp):
+        """
+        Append the message.
+        :param parts: List of bytes like objects: the header frame followed by the data frames.
+        :param frame_index: Frame index of the message, -1 if not available.
+        :param timestamp: Time the message was received.
+        :return: Number of bytes written to the segment file.
+        """
+        prefix = numpy.empty(len(parts) + 1, dtype=RECORD_PREFIX_DTYPE)
+        prefix[0] = len(parts)
+        prefix[1:] = [memoryview(part).nbytes for part in parts]
+
+        size = prefix.nbytes + int(prefix[1:].sum())
+        _write_all(self._segment_file, [prefix] + list(parts))
+
+        self._index_record["frame"] = frame_index
+        self._index_record["offset"] = self._offset
+        self._index_record["size"] = size
+        self._index_record["timestamp"] = timestamp
+        self._index_file.write(self._index_record.tobytes())
+
+        self._offset += size
+        self.n_messages += 1
+
+        return size
+
+    def flush(self):
+        """
+        Flush the written messages and their index to disk.
+        """
+        self._index_file.flush()
+        os.fdatasync(self._segment_file)
+        os.fdatasync(self._index_file.fileno())
+
+    def close(self):
+        self.flush()
+        os.close(self._segment_file)
+        self._index_file.close()
+
+
+class StreamRecordingReader(object):
+    """
+    Random access to the messages saved by the StreamRecordingWriter.
+    The segment file is memory mapped: the returned parts view the file, without copying it.
+    """
+
+    def __init__(self, filename):
+        """
+        Open the segment file and load its index.
+        :param filename: Path of the segment file.
+        """
+        self.index = numpy.fromfile(filename + RECORD_INDEX_FILE_EXTENSION, dtype=RECORD_INDEX_DTYPE)
+
+        # Messages written after the index was read are ignored.
+        self._segment_file = open(filename, "rb")
+        self._segment = mmap.mmap(self._segment_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.fstat(self._segment_file.fileno()).st_size else b""
+        self._segment_view = memoryview(self._segment)
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_position(self, frame_index):
+        """
+        Return the position, in the index, of the first message with the frame index.
+        :param frame_index: Frame index to seek.
+        :return: Position of the message.
+        """
+        positions = numpy.flatnonzero(self.index["frame"] == frame_index)
+
+        if not len(positions):
+            raise ValueError("Frame %d is not in the recording." % frame_index)
+
+        return int(positions[0])
+
+    def read_message(self, position):
+        """
+        Read the message parts.
+        :param position: Position of the message in the index.
+        :return: List of memoryviews: the header frame followed by the data frames.
+        """
+        offset = int(self.index["offset"][position])
+        prefix_size = RECORD_PREFIX_DTYPE.itemsize
+
+        n_parts = int(numpy.frombuffer(self._segment_view, RECORD_PREFIX_DTYPE, 1, offset)[0])
+        part_lengths = numpy.frombuffer(self._segment_view, RECORD_PREFIX_DTYPE, n_parts, offset + prefix_size)
+
+        parts = []
+        part_offset = offset + prefix_size * (n_parts + 1)
+        for part_length in part_lengths.tolist():
+            parts.append(self._segment_view[part_offset:part_offset + part_length])
+            part_offset += part_length
+
+        return parts
+
+    def close(self):
+        self._segment_file.close()
+
+        try:
+            self._segment_view.release()
+            if isinstance(self._segment, mmap.mmap):
+                self._segment.close()
+        except BufferError:
+            # Parts still in use (for example queued for sending) keep the mapping open until they are released.
+            pass
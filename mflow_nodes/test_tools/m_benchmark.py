@@ -0,0 +1,482 @@
+"""
+End-to-end throughput and latency benchmark of the mflow nodes.
+
+Each run starts a local generator -> node(s) -> sink topology, sends the frames as fast as possible (or at a fixed
+rate) and measures, at the end of the pipeline, the messages and megabytes per second, and the latency of each
+message (from the send time in its header, to the end of its processing). The first frame only connects the
+pipeline, and is not measured.
+
+The nodes run in one of two modes:
+    node            Real nodes, started with the NodeManager: the processor process, the receiving threads and the
+                    hand-off (queue or ring buffer), the overload policy and the statistics path are all measured.
+                    The generator and the sink run as threads of this process. Only tcp and ipc reach the nodes.
+                    The last node forwards the messages to the sink, where the latency is measured: the base and
+                    stats processors are chained with a forwarding proxy stage.
+    threads         Baseline: each node is a thread of this process, calling process_message on the received
+                    messages directly. The latency is measured after the processing of the last node. Supports the
+                    inproc transport.
+
+The last node runs the benchmarked processor:
+    disabled        Receive the messages only, the processing is disabled (threads mode only).
+    base            BaseProcessor, which does nothing with the messages.
+    stats           The statistics node of m_stats_node.py.
+    proxy           ProxyProcessor, forwarding the messages to the sink.
+With more than one node, the nodes before the last one are proxies.
+
+The results are written as JSON, so runs can be compared.
+"""
+import json
+import os
+from itertools import count
+import platform
+import tempfile
+from argparse import ArgumentParser
+from datetime import datetime
+from threading import Thread, Event
+from time import time
+
+import numpy
+
+from mflow_nodes import config
+from mflow_nodes.node_manager import NodeManager
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.processors.chain import ChainProcessor
+from mflow_nodes.processors.proxy import ProxyProcessor
+from mflow_nodes.stream_node import connect_stream, get_stream_message_function, get_processor_function, \
+    get_receiver_function
+from mflow_nodes.stream_tools.overload_policy import OverloadPolicy, OVERLOAD_POLICIES
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import RawMessage
+from mflow_nodes.test_tools.m_generate_test_stream import RatePacer
+from mflow_nodes.test_tools.m_stats_node import StatisticsNode
+
+TRANSPORTS = ["tcp", "ipc", "inproc"]
+PROCESSOR_TYPES = ["disabled", "base", "stats", "proxy"]
+MODE_NODE = "node"
+MODE_THREADS = "threads"
+MODES = [MODE_NODE, MODE_THREADS]
+LATENCY_PERCENTILES = [50, 99, 99.9]
+
+# First port of the tcp addresses.
+tcp_base_port = 40100
+# Receive and send timeout (in milliseconds) of the nodes, to check if the benchmark was stopped.
+stage_receive_timeout = 100
+# Time, in seconds, without messages at the sink after the last frame was sent, to end a run with dropped frames.
+pipeline_idle_timeout = 1
+# Inproc endpoints are closed with a delay: each run uses new names.
+_inproc_runs = count()
+
+
+def get_addresses(transport, n_addresses):
+    """
+    Return the addresses to connect the topology with.
+    :param transport: "tcp", "ipc" or "inproc".
+    :param n_addresses: Number of addresses.
+    :return: List of addresses.
+    """
+    if transport == "tcp":
+        return ["tcp://127.0.0.1:%d" % (tcp_base_port + index) for index in range(n_addresses)]
+
+    elif transport == "ipc":
+        return ["ipc://%s" % os.path.join(tempfile.gettempdir(), "mflow_benchmark_%d_%d" % (os.getpid(), index))
+                for index in range(n_addresses)]
+
+    elif transport == "inproc":
+        run_index = next(_inproc_runs)
+        return ["inproc://mflow_benchmark_%d_%d" % (run_index, index) for index in range(n_addresses)]
+
+    raise ValueError("Unknown transport '%s'. Use one of: %s." % (transport, TRANSPORTS))
+
+
+def get_processor(processor_type, binding_address=None):
+    """
+    Return the processor to benchmark.
+    :param processor_type: "disabled", "base", "stats" or "proxy".
+    :param binding_address: Address to forward the messages to, for the proxy.
+    :return: Processor instance, or None if the processing is disabled.
+    """
+    if processor_type == "disabled":
+        return None
+
+    elif processor_type == "base":
+        return BaseProcessor()
+
+    elif processor_type == "stats":
+        return StatisticsNode(sampling_interval=0.5)
+
+    elif processor_type == "proxy":
+        processor = ProxyProcessor(proxy_function=lambda message: True)
+        processor.binding_address = binding_address
+        return processor
+
+    raise ValueError("Unknown processor type '%s'. Use one of: %s." % (processor_type, PROCESSOR_TYPES))
+
+
+def get_node_processor(processor_type, binding_address):
+    """
+    Return the processor of a node, forwarding the messages to the next node or to the sink.
+    :param processor_type: "base", "stats" or "proxy".
+    :param binding_address: Address to forward the messages to.
+    :return: Processor instance.
+    """
+    if processor_type == "disabled":
+        raise ValueError("A node with the processing disabled does not forward the messages to measure them. "
+                         "Use the '%s' mode." % MODE_THREADS)
+
+    processor = get_processor(processor_type, binding_address)
+    if processor_type == "proxy":
+        return processor
+
+    return ChainProcessor([processor, get_processor("proxy", binding_address)], stage_names=[processor_type, "forward"])
+
+
+def start_node(connection_address, processor, passthrough, n_receiving_threads=None, handoff=None,
+               overload_policy=None, data_queue_size=None):
+    """
+    Start a node, the way start_stream_node does, without the REST api.
+    :return: Started NodeManager.
+    """
+    node_manager = NodeManager(processor_function=get_processor_function(processor=processor,
+                                                                         connection_address=connection_address,
+                                                                         receive_timeout=stage_receive_timeout,
+                                                                         passthrough=passthrough),
+                               receiver_function=get_receiver_function(connection_address=connection_address,
+                                                                       receive_timeout=stage_receive_timeout,
+                                                                       passthrough=passthrough),
+                               processor_instance=processor,
+                               data_queue_size=data_queue_size,
+                               n_receiving_threads=n_receiving_threads,
+                               handoff=handoff,
+                               overload_policy=OverloadPolicy(overload_policy),
+                               passthrough=passthrough)
+    node_manager.start()
+
+    return node_manager
+
+
+def send_frames(binding_address, frame, n_frames, rate, connected_event, stopped_event, finished_event, result):
+    """
+    Send the same preallocated frame n_frames times, with the send time in the header of each message.
+    The first frame connects the pipeline: the others are sent once it reached the end of the pipeline.
+    """
+    forwarder = MFlowForwarder()
+    forwarder.start(binding_address)
+    # Do not wait forever on a pipeline that was stopped.
+    forwarder.stream.socket.SNDTIMEO = stage_receive_timeout
+
+    header = {"htype": "array-1.0", "type": frame.dtype.name, "shape": list(frame.shape)}
+    pacer = RatePacer(rate)
+
+    for frame_index in range(n_frames):
+        pacer.wait(frame_index)
+
+        header["frame"] = frame_index
+        header["send_time"] = time()
+        message = RawMessage(header, [frame], zmq_frames=[json.dumps(header).encode(), frame])
+        while not forwarder.forward(message):
+            if stopped_event.is_set():
+                break
+
+        if stopped_event.is_set():
+            break
+
+        if frame_index == 0:
+            connected_event.wait()
+            pacer.start()
+
+    result["sent_time"] = time()
+
+    # Closing the socket earlier could drop the queued frames.
+    finished_event.wait()
+    forwarder.stop()
+
+
+def run_stage(connection_address, processor, n_frames, passthrough, stopped_event, result, latencies=None,
+              connected_event=None):
+    """
+    Receive and process the messages, until n_frames are received or the benchmark is stopped.
+    The latencies are measured at the end of the processing.
+    """
+    stream = connect_stream(connection_address, receive_timeout=stage_receive_timeout,
+                            queue_size=config.DEFAULT_ZMQ_QUEUE_LENGTH)
+    get_message = get_stream_message_function(stream, passthrough=passthrough)
+
+    n_received = 0
+    try:
+        while n_received < n_frames and not stopped_event.is_set():
+            message = get_message()
+            if message is None:
+                continue
+
+            if processor is not None:
+                processor.process_message(message)
+
+            if latencies is not None:
+                latencies[n_received] = time() - message.get_header()["send_time"]
+
+            n_received += 1
+            result["end_time"] = time()
+
+            if n_received == 1:
+                result["start_time"] = result["end_time"]
+                if connected_event is not None:
+                    connected_event.set()
+
+    finally:
+        result["received"] = n_received
+        stream.disconnect()
+
+
+def run_benchmark(transport, processor_type, frame_shape, dtype, n_frames, n_nodes=1, passthrough=False,
+                  rate=None, timeout=60, mode=MODE_NODE, n_receiving_threads=None, handoff=None,
+                  overload_policy=None, data_queue_size=None):
+    """
+    Run the topology once.
+    :param transport: "tcp", "ipc" or "inproc".
+    :param processor_type: Processor of the last node.
+    :param frame_shape: Shape of the frames.
+    :param dtype: Data type of the frames.
+    :param n_frames: Number of frames to send.
+    :param n_nodes: Number of nodes in the pipeline.
+    :param passthrough: Receive the messages in passthrough mode.
+    :param rate: Frames per second to send. Default: as fast as possible.
+    :param timeout: Maximum time, in seconds, to wait for the frames at the end of the pipeline.
+    :param mode: "node" to start real nodes, "threads" to run the processors in threads of this process.
+    :param n_receiving_threads: Receiving threads of each node, in node mode.
+    :param handoff: Hand-off of the nodes, "queue" or "ring_buffer", in node mode.
+    :param overload_policy: Overload policy of the nodes, in node mode.
+    :param data_queue_size: Size of the hand-off between the receiving threads and the processor, in node mode.
+    :return: Dictionary with the run parameters and results.
+    """
+    if mode not in MODES:
+        raise ValueError("Unknown mode '%s'. Use one of: %s." % (mode, MODES))
+
+    if mode == MODE_NODE and transport == "inproc":
+        raise ValueError("The nodes run in their own processes: the inproc transport needs the '%s' mode." %
+                         MODE_THREADS)
+
+    forwarding_types = ["proxy"] * (n_nodes - 1) + [processor_type]
+    # In node mode, the last node always forwards to the sink.
+    has_sink = mode == MODE_NODE or processor_type == "proxy"
+    addresses = get_addresses(transport, n_nodes + (1 if has_sink else 0))
+
+    frame = numpy.zeros(frame_shape, dtype=dtype)
+    latencies = numpy.zeros(n_frames)
+    connected_event = Event()
+    stopped_event = Event()
+    finished_event = Event()
+    sender_result = {"sent_time": None}
+
+    node_managers = []
+    processors = []
+
+    if mode == MODE_NODE:
+        # The sink is the only stage running in this process.
+        stages = [None]
+        stage_addresses = addresses[-1:]
+
+        # The end of the pipeline is started first, to receive from the first frame.
+        try:
+            for stage_index in reversed(range(n_nodes)):
+                processor = get_node_processor(forwarding_types[stage_index], addresses[stage_index + 1])
+                node_managers.append(start_node(addresses[stage_index], processor, passthrough,
+                                                n_receiving_threads, handoff, overload_policy, data_queue_size))
+        except Exception:
+            for node_manager in node_managers:
+                node_manager.stop()
+            raise
+
+    else:
+        processors = [get_processor(stage_type, addresses[stage_index + 1] if stage_type == "proxy" else None)
+                      for stage_index, stage_type in enumerate(forwarding_types)]
+        # The sink receives the forwarded messages of the last proxy.
+        if has_sink:
+            processors.append(None)
+
+        for processor in processors:
+            if processor is not None:
+                processor.start()
+
+        stages = processors
+        stage_addresses = addresses
+
+    results = [{"received": 0, "start_time": None, "end_time": None} for _ in stages]
+
+    # The end of the pipeline is started first, to receive from the first frame.
+    threads = []
+    for stage_index in reversed(range(len(stages))):
+        is_last = stage_index == len(stages) - 1
+        threads.append(Thread(target=run_stage,
+                              args=(stage_addresses[stage_index], stages[stage_index], n_frames, passthrough,
+                                    stopped_event, results[stage_index], latencies if is_last else None,
+                                    connected_event if is_last else None)))
+
+    sender = Thread(target=send_frames, args=(addresses[0], frame, n_frames, rate, connected_event,
+                                                 stopped_event, finished_event, sender_result))
+
+    for thread in threads:
+        thread.start()
+    sender.start()
+
+    # The last stage returns once it received all the frames.
+    _wait_for_pipeline(threads[0], results[-1], sender_result, timeout)
+
+    stopped_event.set()
+    connected_event.set()
+    finished_event.set()
+    for thread in threads + [sender]:
+        thread.join()
+
+    for processor in processors:
+        if processor is not None:
+            processor.stop()
+
+    dropped = 0
+    for node_manager in node_managers:
+        dropped += node_manager.get_handoff_statistics()["overload"]["dropped"]
+        node_manager.stop()
+
+    # The first frame, which connected the pipeline, is not measured.
+    n_received = results[-1]["received"]
+    n_measured = max(0, n_received - 1)
+    elapsed_time = results[-1]["end_time"] - results[-1]["start_time"] if n_measured else 0
+    latency_percentiles = (numpy.percentile(latencies[1:n_received], LATENCY_PERCENTILES) * 1000).tolist() \
+        if n_measured else [None] * len(LATENCY_PERCENTILES)
+
+    result = {"mode": mode,
+              "transport": transport,
+              "processor": processor_type,
+              "frame_shape": list(frame_shape),
+              "dtype": dtype,
+              "n_nodes": n_nodes,
+              "passthrough": passthrough,
+              "rate": rate,
+              "n_frames": n_frames,
+              "received": n_received,
+              "elapsed_time": elapsed_time,
+              "messages_per_second": n_measured / elapsed_time if elapsed_time else 0,
+              "megabytes_per_second": n_measured * frame.nbytes / 1024 / 1024 / elapsed_time if elapsed_time else 0}
+
+    for percentile, latency in zip(LATENCY_PERCENTILES, latency_percentiles):
+        result["latency_p%s_ms" % str(percentile).replace(".", "")] = latency
+
+    if mode == MODE_NODE:
+        result.update({"handoff": handoff or config.DEFAULT_HANDOFF,
+                       "n_receiving_threads": n_receiving_threads if n_receiving_threads is not None
+                       else config.DEFAULT_N_RECEIVING_THREADS,
+                       "overload_policy": overload_policy or config.DEFAULT_OVERLOAD_POLICY,
+                       "dropped": dropped})
+
+    return result
+
+
+def _wait_for_pipeline(sink_thread, sink_result, sender_result, timeout):
+    """
+    Wait until the sink received all the frames, or the timeout expired. Once all the frames were sent, stop
+    waiting if the sink did not receive anything for pipeline_idle_timeout seconds: the nodes dropped the rest.
+    """
+    end_time = time() + timeout
+
+    while sink_thread.is_alive() and time() < end_time:
+        sink_thread.join(0.1)
+
+        if sender_result["sent_time"] is not None:
+            last_activity_time = max(sender_result["sent_time"], sink_result["end_time"] or 0)
+
+            if time() - last_activity_time > pipeline_idle_timeout:
+                break
+
+
+def run_sweep(transports, processor_types, frame_sizes, dtypes, n_frames, max_megabytes, modes=None, **kwargs):
+    """
+    Run the benchmark for every combination of the parameters.
+    The number of frames is reduced for the large frames, to send at most max_megabytes in each run.
+    The combinations the node mode does not support (inproc, disabled processing) run only in threads mode.
+    :return: List of result dictionaries.
+    """
+    results = []
+
+    for mode in modes or MODES:
+        for transport in transports:
+            for processor_type in processor_types:
+                if mode == MODE_NODE and (transport == "inproc" or processor_type == "disabled"):
+                    print("%-7s %-6s %-8s not supported, skipped." % (mode, transport, processor_type))
+                    continue
+
+                for dtype in dtypes:
+                    for frame_size in frame_sizes:
+                        results.append(_run_sweep_benchmark(mode, transport, processor_type, frame_size, dtype,
+                                                            n_frames, max_megabytes, **kwargs))
+
+    return results
+
+
+def _run_sweep_benchmark(mode, transport, processor_type, frame_size, dtype, n_frames, max_megabytes, **kwargs):
+    frame_megabytes = frame_size * frame_size * numpy.dtype(dtype).itemsize / 1024 / 1024
+    run_frames = max(1, min(n_frames, int(max_megabytes / frame_megabytes)))
+
+    result = run_benchmark(transport, processor_type, (frame_size, frame_size), dtype, run_frames, mode=mode,
+                           **kwargs)
+
+    print("%-7s %-6s %-8s %4dx%-4d %-7s %7.0f msg/s %8.1f MB/s  latency p50 %s p99 %s p999 %s ms" %
+          (mode, transport, processor_type, frame_size, frame_size, dtype,
+           result["messages_per_second"], result["megabytes_per_second"],
+           _format_latency(result["latency_p50_ms"]), _format_latency(result["latency_p99_ms"]),
+           _format_latency(result["latency_p999_ms"])))
+
+    if "dropped" in result and result["dropped"]:
+        print("        %d frames dropped by the overload policy '%s'." % (result["dropped"], result["overload_policy"]))
+
+    return result
+
+
+def _format_latency(latency):
+    return "%.3f" % latency if latency is not None else "-"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the throughput and latency of mflow node pipelines.")
+    parser.add_argument("--transports", nargs="+", default=TRANSPORTS, choices=TRANSPORTS,
+                        help="Transports to benchmark.")
+    parser.add_argument("--processors", nargs="+", default=PROCESSOR_TYPES, choices=PROCESSOR_TYPES,
+                        help="Processors of the last node to benchmark.")
+    parser.add_argument("--frame_sizes", type=int, nargs="+", default=[4, 64, 512, 2048],
+                        help="Number of values in X and Y direction of the frames.")
+    parser.add_argument("--dtypes", nargs="+", default=["uint16"], help="Data types of the frames.")
+    parser.add_argument("--n_frames", type=int, default=2000, help="Number of frames to send in each run.")
+    parser.add_argument("--max_megabytes", type=float, default=1024,
+                        help="Maximum megabytes to send in each run. Limits the frames of the large shapes.")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES,
+                        help="Run real nodes, or the processors in threads of the benchmark as a baseline.")
+    parser.add_argument("--n_nodes", type=int, default=1, help="Number of nodes in the pipeline.")
+    parser.add_argument("--n_receiving_threads", type=int, default=None,
+                        help="Receiving threads of each node, in node mode.")
+    parser.add_argument("--handoff", choices=[config.HANDOFF_QUEUE, config.HANDOFF_RING_BUFFER], default=None,
+                        help="Hand-off between the receiving threads and the processor, in node mode.")
+    parser.add_argument("--overload_policy", choices=OVERLOAD_POLICIES, default=None,
+                        help="Overload policy of the nodes, in node mode.")
+    parser.add_argument("--data_queue_size", type=int, default=None,
+                        help="Size of the hand-off of each node, in node mode.")
+    parser.add_argument("--passthrough", action='store_true', help="Receive the messages in passthrough mode.")
+    parser.add_argument("--rate", type=float, default=None, help="Frames per second to send. "
+                                                                 "Default: as fast as possible.")
+    parser.add_argument("--timeout", type=float, default=60, help="Maximum time, in seconds, of each run.")
+    parser.add_argument("--output_file", type=str, default=None, help="JSON file to write the results to.")
+    input_args = parser.parse_args()
+
+    benchmark_results = run_sweep(input_args.transports, input_args.processors, input_args.frame_sizes,
+                                  input_args.dtypes, input_args.n_frames, input_args.max_megabytes,
+                                  modes=input_args.modes, n_nodes=input_args.n_nodes,
+                                  passthrough=input_args.passthrough, rate=input_args.rate,
+                                  timeout=input_args.timeout, n_receiving_threads=input_args.n_receiving_threads,
+                                  handoff=input_args.handoff, overload_policy=input_args.overload_policy,
+                                  data_queue_size=input_args.data_queue_size)
+
+    if input_args.output_file:
+        with open(input_args.output_file, "w") as output_file:
+            json.dump({"host": platform.node(),
+                       "time": datetime.now().isoformat(),
+                       "parameters": vars(input_args),
+                       "results": benchmark_results}, output_file, indent=4)
+
+        print("Results written to '%s'." % input_args.output_file)
@@ -1,62 +1,257 @@
+import json
 from argparse import ArgumentParser
+from multiprocessing import Process, Queue
+from time import perf_counter, sleep
 
 import numpy as np
-from types import SimpleNamespace
 
+from mflow_nodes import config
 from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import RawMessage
 
+# How the frames are distributed between multiple senders.
+SENDERS_ALL_FRAMES = "all_frames"
+SENDERS_SPLIT_FRAMES = "split_frames"
+SENDER_MODES = [SENDERS_ALL_FRAMES, SENDERS_SPLIT_FRAMES]
 
-def generate_frame_data(frame_shape, frame_number):
+
+def generate_frame_data(frame_shape, frame_number, dtype="int32"):
     """
     Generate a frame that is filled with the frame number value.
     :param frame_shape: Shape of the frame to generate.
     :param frame_number: Number to fill the frame with.
+    :param dtype: Data type of the frame.
     """
-    return np.full(shape=frame_shape, fill_value=frame_number, dtype=np.int32)
+    return np.full(shape=frame_shape, fill_value=frame_number, dtype=dtype)
 
 
-def generate_test_array_stream(binding_address="tcp://127.0.0.1:40000", frame_shape=(4, 4), number_of_frames=16):
+def generate_frame_pool(frame_shape, pool_size, dtype="int32"):
     """
-    Generate an array-1.0 stream of shape [4,4] and the specified number of frames.
-    The values for each cell in the frame corresponds to the frame number.
-    :param frame_shape: Shape (number of cells) of the frames to send.
-    :param number_of_frames: Number of frames to send.
-    :param binding_address: Address to bind the stream to.
+    Preallocate the frames to send. Frame n of the stream is the frame n % pool_size of the pool, filled with the
+    value n % pool_size.
+    :param frame_shape: Shape of the frames.
+    :param pool_size: Number of frames in the pool.
+    :param dtype: Data type of the frames.
+    :return: List of frames.
+    """
+    return [generate_frame_data(frame_shape, frame_number, dtype) for frame_number in range(pool_size)]
+
+
+class RatePacer(object):
+    """
+    Paces a sending loop to a target rate.
+
+    Each message has its own deadline, counted from the start, so the delays do not accumulate. The last part of
+    each wait is spent spinning, because sleep can overshoot the deadline by a millisecond or more.
     """
-    print("Preparing to send %d frames of shape %s." % (number_of_frames, str(frame_shape)))
 
+    def __init__(self, rate, spin_time=config.DEFAULT_GENERATOR_SPIN_TIME):
+        """
+        Constructor.
+        :param rate: Messages per second. None or 0 does not wait.
+        :param spin_time: Time, in seconds, before each deadline that is spent spinning.
+        """
+        self.rate = rate
+        self.spin_time = spin_time
+        self._start_time = perf_counter()
+
+    def start(self):
+        self._start_time = perf_counter()
+
+    def wait(self, message_index):
+        """
+        Wait for the send time of the message.
+        :param message_index: Index of the message, counted from the start.
+        """
+        if not self.rate:
+            return
+
+        deadline = self._start_time + message_index / self.rate
+        delay = deadline - perf_counter()
+
+        if delay > self.spin_time:
+            sleep(delay - self.spin_time)
+
+        while perf_counter() < deadline:
+            pass
+
+
+def get_sender_addresses(binding_address, n_senders):
+    """
+    Return the binding address of each sender: the comma separated addresses, or consecutive tcp ports starting
+    with the port of the binding address.
+    :param binding_address: Binding address, or comma separated addresses.
+    :param n_senders: Number of senders.
+    :return: List of addresses.
+    """
+    addresses = [address.strip() for address in binding_address.split(",")]
+
+    if len(addresses) == 1 and n_senders > 1:
+        if not binding_address.startswith("tcp://"):
+            raise ValueError("Provide %d comma separated addresses, or a tcp address." % n_senders)
+
+        host, port = binding_address.rsplit(":", 1)
+        addresses = ["%s:%d" % (host, int(port) + sender_index) for sender_index in range(n_senders)]
+
+    if len(addresses) != n_senders:
+        raise ValueError("%d addresses provided for %d senders." % (len(addresses), n_senders))
+
+    return addresses
+
+
+def send_array_frames(binding_address, frame_pool, frame_indexes, rate=None):
+    """
+    Send the frames of the pool as an array-1.0 stream.
+    The frames are sent without copying them, and without encoding the messages with mflow.
+    :param binding_address: Address to bind the stream to.
+    :param frame_pool: Preallocated frames to send.
+    :param frame_indexes: Frame indexes to send.
+    :param rate: Frames per second. Default: as fast as possible.
+    :return: Dictionary with the achieved send rate.
+    """
     mflow_forwarder = MFlowForwarder()
     mflow_forwarder.start(binding_address)
 
-    # Test stream is of array type.
+    frame = frame_pool[0]
     header = {"htype": "array-1.0",
-              "type": "int32",
-              "shape": list(frame_shape)}
+              "type": frame.dtype.name,
+              "shape": list(frame.shape)}
+
+    pool_size = len(frame_pool)
+    pacer = RatePacer(rate)
+    n_frames = 0
 
-    # Send 16 4x4 frames. The values of each array cell is equal to the frame number.
-    for frame_number in range(number_of_frames):
-        header["frame"] = frame_number
-        data = generate_frame_data(frame_shape, frame_number)
+    start_time = perf_counter()
+    pacer.start()
+    for message_index, frame_index in enumerate(frame_indexes):
+        pacer.wait(message_index)
 
-        print("Sending frame %d" % frame_number)
+        header["frame"] = frame_index
+        frame = frame_pool[frame_index % pool_size]
 
-        message = SimpleNamespace()
-        message.data = {"header": header, "data": [data]}
-        mflow_forwarder.forward(message)
+        mflow_forwarder.forward(RawMessage(header, [frame], zmq_frames=[json.dumps(header).encode(), frame]))
+        n_frames += 1
 
+    send_time = perf_counter() - start_time
     mflow_forwarder.stop()
 
+    n_bytes = n_frames * frame_pool[0].nbytes
+    return {"address": binding_address,
+            "frames": n_frames,
+            "bytes": n_bytes,
+            "send_time": send_time,
+            "frames_per_second": n_frames / send_time if send_time else 0,
+            "megabytes_per_second": n_bytes / 1024 / 1024 / send_time if send_time else 0}
+
+
+def _run_sender(result_queue, *args):
+    result_queue.put(send_array_frames(*args))
+
+
+def generate_test_array_stream(binding_address="tcp://127.0.0.1:40000", frame_shape=(4, 4), number_of_frames=16,
+                               dtype="int32", pool_size=None, rate=None, megabytes_rate=None, n_senders=1,
+                               sender_mode=SENDERS_ALL_FRAMES):
+    """
+    Generate an array-1.0 stream of shape [4,4] and the specified number of frames.
+    The values for each cell in the frame corresponds to the frame number, modulo the pool size.
+    :param frame_shape: Shape (number of cells) of the frames to send.
+    :param number_of_frames: Number of frames to send.
+    :param binding_address: Address to bind the stream to. Comma separated addresses for multiple senders.
+    :param dtype: Data type of the frames.
+    :param pool_size: Number of preallocated frames to cycle through.
+    :param rate: Frames per second to send. Default: as fast as possible.
+    :param megabytes_rate: Megabytes per second to send, instead of the frames rate.
+    :param n_senders: Number of sender processes, each binding its own address.
+    :param sender_mode: "all_frames": each sender sends every frame. "split_frames": the frame indexes are
+    interleaved between the senders, and the rate is the total rate.
+    :return: Dictionary with the total and the per sender send rates.
+    """
+    if sender_mode not in SENDER_MODES:
+        raise ValueError("Unknown sender mode '%s'. Use one of: %s." % (sender_mode, SENDER_MODES))
+
+    pool_size = min(pool_size or config.DEFAULT_GENERATOR_POOL_SIZE, max(1, number_of_frames))
+    frame_pool = generate_frame_pool(frame_shape, pool_size, dtype)
+
+    if megabytes_rate:
+        rate = megabytes_rate * 1024 * 1024 / frame_pool[0].nbytes
+
+    addresses = get_sender_addresses(binding_address, n_senders)
+
+    print("Preparing to send %d frames of shape %s with %d sender(s)." % (number_of_frames, str(frame_shape),
+                                                                         n_senders))
+
+    if sender_mode == SENDERS_SPLIT_FRAMES:
+        sender_frames = [range(sender_index, number_of_frames, n_senders) for sender_index in range(n_senders)]
+        sender_rate = rate / n_senders if rate else None
+    else:
+        sender_frames = [range(number_of_frames)] * n_senders
+        sender_rate = rate
+
+    if n_senders == 1:
+        sender_results = [send_array_frames(addresses[0], frame_pool, sender_frames[0], sender_rate)]
+
+    else:
+        result_queue = Queue()
+        senders = [Process(target=_run_sender, args=(result_queue, address, frame_pool, frame_indexes,
+                                                     sender_rate))
+                   for address, frame_indexes in zip(addresses, sender_frames)]
+
+        for sender in senders:
+            sender.start()
+
+        sender_results = sorted((result_queue.get() for _ in senders), key=lambda result: result["address"])
+
+        for sender in senders:
+            sender.join()
+
+    send_time = max(result["send_time"] for result in sender_results)
+    n_frames = sum(result["frames"] for result in sender_results)
+    n_bytes = sum(result["bytes"] for result in sender_results)
+
+    report = {"frames": n_frames,
+              "bytes": n_bytes,
+              "send_time": send_time,
+              "frames_per_second": n_frames / send_time if send_time else 0,
+              "megabytes_per_second": n_bytes / 1024 / 1024 / send_time if send_time else 0,
+              "senders": sender_results}
+
+    for result in sender_results:
+        print("%s: sent %d frames in %.3f s (%.1f frames/s, %.1f MB/s)." %
+              (result["address"], result["frames"], result["send_time"], result["frames_per_second"],
+               result["megabytes_per_second"]))
+
+    if n_senders > 1:
+        print("Total: sent %d frames in %.3f s (%.1f frames/s, %.1f MB/s)." %
+              (n_frames, send_time, report["frames_per_second"], report["megabytes_per_second"]))
+
+    return report
+
 
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("binding_address", type=str, help="Binding address for mflow connection.\n"
-                                                          "Example: tcp://127.0.0.1:40001")
+                                                          "Example: tcp://127.0.0.1:40001\n"
+                                                          "With multiple senders, the comma separated addresses, "
+                                                          "or the first tcp port.")
     parser.add_argument("--n_frames", type=int, default=16, help="Number of frames to generate.")
     parser.add_argument("--frame_size", type=int, default=4, help="Number of values X and Y direction, per frame.")
+    parser.add_argument("--dtype", type=str, default="int32", help="Data type of the frames.")
+    parser.add_argument("--pool_size", type=int, default=config.DEFAULT_GENERATOR_POOL_SIZE,
+                        help="Number of preallocated frames to cycle through.")
+    parser.add_argument("--rate", type=float, default=None, help="Frames per second to send.\n"
+                                                                 "Default: as fast as possible.")
+    parser.add_argument("--megabytes_rate", type=float, default=None, help="Megabytes per second to send.")
+    parser.add_argument("--n_senders", type=int, default=1, help="Number of sender processes.")
+    parser.add_argument("--sender_mode", default=SENDERS_ALL_FRAMES, choices=SENDER_MODES,
+                        help="all_frames: each sender sends every frame.\n"
+                             "split_frames: the frame indexes are interleaved between the senders.")
     input_args = parser.parse_args()
 
     try:
         generate_test_array_stream(input_args.binding_address, number_of_frames=input_args.n_frames,
-                                   frame_shape=(input_args.frame_size, input_args.frame_size))
+                                   frame_shape=(input_args.frame_size, input_args.frame_size),
+                                   dtype=input_args.dtype, pool_size=input_args.pool_size, rate=input_args.rate,
+                                   megabytes_rate=input_args.megabytes_rate, n_senders=input_args.n_senders,
+                                   sender_mode=input_args.sender_mode)
     except KeyboardInterrupt:
         print("Terminated by user.")
@@ -0,0 +1,25 @@
+from argparse import ArgumentParser
+
+from mflow_nodes.processors.recorder import RecorderProcessor
+from mflow_nodes.script_tools.helpers import setup_logging, add_default_arguments, start_stream_node_helper
+
+
+def run(input_args, parameters=None):
+    # Record the ZMQ frames as they were sent.
+    input_args.passthrough = True
+
+    processor_parameters = {"output_file": input_args.output_file}
+    processor_parameters.update(parameters or {})
+
+    start_stream_node_helper(RecorderProcessor(), input_args, processor_parameters)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Record the raw mflow messages, to replay them with m_replay.py.")
+    add_default_arguments(parser, binding_argument=False)
+    parser.add_argument("output_file", type=str, help="Segment file to record the messages to.\n"
+                                                      "The offset index is saved in <output_file>.index.")
+    arguments = parser.parse_args()
+
+    setup_logging(arguments.log_level)
+
+    run(arguments)
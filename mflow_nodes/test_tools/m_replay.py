@@ -0,0 +1,115 @@
+import json
+from argparse import ArgumentParser
+from time import time, sleep
+
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import RawMessage
+from mflow_nodes.stream_tools.stream_recording import StreamRecordingReader
+
+# Replay pacing of the recorded messages.
+REPLAY_ORIGINAL = "original"
+REPLAY_RATE = "rate"
+REPLAY_FLAT_OUT = "flat_out"
+REPLAY_MODES = [REPLAY_ORIGINAL, REPLAY_RATE, REPLAY_FLAT_OUT]
+
+
+def get_send_times(reader, start_position, mode, rate=None):
+    """
+    Return the send time of each message from the start position, relative to the start of the replay.
+    :param reader: StreamRecordingReader of the recording.
+    :param start_position: Position of the first message to replay.
+    :param mode: Replay mode, "original", "rate" or "flat_out".
+    :param rate: Messages per second, for the rate mode.
+    :return: List of relative send times, or None to send as fast as possible.
+    """
+    n_messages = len(reader) - start_position
+
+    if mode == REPLAY_ORIGINAL:
+        timestamps = reader.index["timestamp"][start_position:]
+        return (timestamps - timestamps[0]).tolist()
+
+    elif mode == REPLAY_RATE:
+        if not rate or rate <= 0:
+            raise ValueError("The rate mode needs a positive rate.")
+
+        return [message_index / rate for message_index in range(n_messages)]
+
+    elif mode == REPLAY_FLAT_OUT:
+        return None
+
+    raise ValueError("Unknown replay mode '%s'. Use one of: %s." % (mode, REPLAY_MODES))
+
+
+def replay_stream(filename, binding_address, mode=REPLAY_ORIGINAL, rate=None, start_frame=None, n_loops=1):
+    """
+    Send the recorded messages again, as they were received by the recorder.
+    Each send time is scheduled from the start of the loop, so the replay does not drift behind the recording.
+    :param filename: Segment file of the recording.
+    :param binding_address: Address to bind the stream to.
+    :param mode: Replay mode, "original" (recorded timing), "rate" (fixed rate) or "flat_out" (as fast as possible).
+    :param rate: Messages per second, for the rate mode.
+    :param start_frame: Frame index to start each loop from. Default: first recorded message.
+    :param n_loops: Number of times to replay the recording. 0 replays it until interrupted.
+    :return: Number of sent messages.
+    """
+    reader = StreamRecordingReader(filename)
+
+    if not len(reader):
+        reader.close()
+        raise ValueError("The recording '%s' has no messages." % filename)
+
+    start_position = reader.get_position(start_frame) if start_frame is not None else 0
+    send_times = get_send_times(reader, start_position, mode, rate)
+
+    print("Replaying %d messages from '%s' (mode %s)." % (len(reader) - start_position, filename, mode))
+
+    mflow_forwarder = MFlowForwarder()
+    mflow_forwarder.start(binding_address)
+
+    n_sent = 0
+    loop_index = 0
+
+    try:
+        while not n_loops or loop_index < n_loops:
+            loop_start_time = time()
+
+            for message_index, position in enumerate(range(start_position, len(reader))):
+                if send_times is not None:
+                    delay = loop_start_time + send_times[message_index] - time()
+                    if delay > 0:
+                        sleep(delay)
+
+                parts = reader.read_message(position)
+                header = json.loads(parts[0].tobytes().decode())
+                mflow_forwarder.forward(RawMessage(header, parts[1:], zmq_frames=parts))
+                n_sent += 1
+
+            loop_index += 1
+
+    finally:
+        mflow_forwarder.stop()
+        reader.close()
+
+    print("Sent %d messages." % n_sent)
+    return n_sent
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Replay a stream recorded with m_record.py.")
+    parser.add_argument("input_file", type=str, help="Segment file of the recording.")
+    parser.add_argument("binding_address", type=str, help="Binding address for mflow connection.\n"
+                                                          "Example: tcp://127.0.0.1:40001")
+    parser.add_argument("--mode", default=REPLAY_ORIGINAL, choices=REPLAY_MODES,
+                        help="original replays the recorded timing, rate sends at a fixed rate, and flat_out "
+                             "sends as fast as possible.")
+    parser.add_argument("--rate", type=float, default=None, help="Messages per second, for the rate mode.")
+    parser.add_argument("--start_frame", type=int, default=None, help="Frame index to start the replay from.")
+    parser.add_argument("--n_loops", type=int, default=1, help="Number of times to replay the recording.\n"
+                                                               "0 replays it until interrupted.")
+    input_args = parser.parse_args()
+
+    try:
+        replay_stream(input_args.input_file, input_args.binding_address, mode=input_args.mode, rate=input_args.rate,
+                      start_frame=input_args.start_frame, n_loops=input_args.n_loops)
+    except KeyboardInterrupt:
+        print("Terminated by user.")
@@ -0,0 +1,323 @@
+"""
+Detector stream simulator, to load test the series aware processors.
+
+Two protocols are simulated:
+    dectris         Each series (with ids from 1) is a dheader-1.0 message (header_detail basic or all), one
+                    dimage-1.0 message for each image, with the frame encoded as configured, and a dseries_end-1.0
+                    message.
+    sf              SwissFEL Jungfrau style array-1.0 messages, with the pulse id and the per module metadata arrays
+                    in the header. The frame index restarts with each series, the pulse id keeps increasing.
+
+The frames come from a preallocated pool of Poisson distributed counts, encoded once.
+"""
+import hashlib
+import json
+from argparse import ArgumentParser
+from time import perf_counter, sleep
+
+import numpy
+
+from mflow_nodes import config
+from mflow_nodes.stream_tools.dimage_codecs import encode_frame, encoders_mapping
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import RawMessage
+from mflow_nodes.test_tools.m_generate_test_stream import RatePacer
+
+PROTOCOL_DECTRIS = "dectris"
+PROTOCOL_SF = "sf"
+PROTOCOLS = [PROTOCOL_DECTRIS, PROTOCOL_SF]
+HEADER_DETAILS = ["basic", "all"]
+
+# Number of values in the countrate correction table of the "all" header detail.
+countrate_table_length = 1000
+
+
+def generate_frame_pool(frame_shape, pool_size, dtype, mean_counts, seed=0):
+    """
+    Preallocate the frames: Poisson distributed counts, like a detector with a low photon flux.
+    :param frame_shape: Shape of the frames.
+    :param pool_size: Number of frames.
+    :param dtype: Data type of the frames.
+    :param mean_counts: Mean counts of each pixel.
+    :param seed: Seed of the random counts, to simulate the same stream again.
+    :return: List of frames.
+    """
+    random_generator = numpy.random.RandomState(seed)
+    return [random_generator.poisson(mean_counts, size=frame_shape).astype(dtype) for _ in range(pool_size)]
+
+
+def get_detector_config(frame_shape, dtype, n_images, frame_time, detector_config=None):
+    """
+    Return the detector configuration of the dheader-1.0 part 2.
+    :param detector_config: Values to add or override.
+    """
+    detector_description = {"description": "Simulated detector",
+                            "detector_number": "SIMULATED-0",
+                            "software_version": "simulated",
+                            "bit_depth_image": numpy.dtype(dtype).itemsize * 8,
+                            "x_pixels_in_detector": frame_shape[1],
+                            "y_pixels_in_detector": frame_shape[0],
+                            "beam_center_x": frame_shape[1] / 2,
+                            "beam_center_y": frame_shape[0] / 2,
+                            "count_time": frame_time,
+                            "frame_time": frame_time,
+                            "nimages": n_images,
+                            "ntrigger": 1,
+                            "wavelength": 1.0,
+                            "detector_distance": 0.1}
+
+    detector_description.update(detector_config or {})
+    return detector_description
+
+
+def get_dheader_parts(series, header_detail, detector_config, frame_shape):
+    """
+    Return the parts of the dheader-1.0 message.
+    :param series: Series id.
+    :param header_detail: "basic" or "all" (with the flatfield, pixel mask and countrate table).
+    :param detector_config: Detector configuration (part 2).
+    :param frame_shape: Shape of the frames.
+    :return: (Header, list of parts).
+    """
+    header = {"htype": "dheader-1.0", "series": series, "header_detail": header_detail}
+    parts = [json.dumps(header).encode(), json.dumps(detector_config).encode()]
+
+    if header_detail == "all":
+        # The dectris shapes are (X, Y).
+        shape = list(frame_shape[::-1])
+        flatfield = numpy.ones(frame_shape, dtype="float32")
+        pixel_mask = numpy.zeros(frame_shape, dtype="uint32")
+        countrate_table = numpy.linspace(0, 1, 2 * countrate_table_length, dtype="float32")
+
+        parts += [json.dumps({"htype": "dflatfield-1.0", "shape": shape, "type": "float32"}).encode(),
+                  flatfield.tobytes(),
+                  json.dumps({"htype": "dpixelmask-1.0", "shape": shape, "type": "uint32"}).encode(),
+                  pixel_mask.tobytes(),
+                  json.dumps({"htype": "dcountrate_table-1.0", "shape": [2, countrate_table_length],
+                              "type": "float32"}).encode(),
+                  countrate_table.tobytes()]
+
+    return header, parts
+
+
+def encode_frame_pool(frame_pool, codec):
+    """
+    Encode the frames of the pool once.
+    :return: List of (encoded frame, part 2 of the dimage-1.0 message, md5 hash of the encoded frame).
+    """
+    encoded_pool = []
+
+    for frame in frame_pool:
+        encoded_frame, encoding = encode_frame(frame, codec)
+        part_2 = {"htype": "dimage_d-1.0",
+                  "shape": list(frame.shape[::-1]),
+                  "type": frame.dtype.name,
+                  "encoding": encoding,
+                  "size": len(encoded_frame)}
+
+        encoded_pool.append((encoded_frame, json.dumps(part_2).encode(), hashlib.md5(encoded_frame).hexdigest()))
+
+    return encoded_pool
+
+
+def get_sf_header(frame_index, pulse_id, frame_shape, dtype, n_modules):
+    """
+    Return the array-1.0 header of a Jungfrau frame, with the metadata of each module.
+    """
+    return {"htype": "array-1.0",
+            "type": dtype,
+            "shape": list(frame_shape),
+            "frame": frame_index,
+            "pulse_id": pulse_id,
+            "is_good_frame": 1,
+            "daq_rec": 0,
+            "module_number": list(range(n_modules)),
+            "pulse_ids": [pulse_id] * n_modules,
+            "framenums": [frame_index] * n_modules,
+            "daq_recs": [0] * n_modules,
+            "missing_packets_1": [0] * n_modules,
+            "missing_packets_2": [0] * n_modules,
+            "pulse_id_diff": [0] * n_modules,
+            "framenum_diff": [0] * n_modules}
+
+
+class DetectorSimulator(object):
+    """
+    Sends full acquisition series, like a detector.
+    """
+
+    def __init__(self, protocol=PROTOCOL_DECTRIS, frame_shape=(512, 1024), dtype="uint16", n_frames=100,
+                 n_series=1, rate=None, header_detail="basic", encoding="", n_modules=1, mean_counts=1.0,
+                 pool_size=None, series_interval=0, start_pulse_id=0, detector_config=None):
+        """
+        Constructor.
+        :param protocol: "dectris" or "sf".
+        :param frame_shape: Shape of the frames, (Y, X).
+        :param dtype: Data type of the frames.
+        :param n_frames: Number of images in each series.
+        :param n_series: Number of back to back series.
+        :param rate: Images per second. Default: as fast as possible.
+        :param header_detail: Dectris header detail, "basic" or "all".
+        :param encoding: Dectris frame encoding, without the byte order: "", "lz4", "bs16-lz4" or "bs32-lz4".
+        :param n_modules: Number of modules in the SF metadata arrays.
+        :param mean_counts: Mean counts of each pixel.
+        :param pool_size: Number of preallocated frames to cycle through.
+        :param series_interval: Time, in seconds, between the series.
+        :param start_pulse_id: Pulse id of the first SF frame.
+        :param detector_config: Dectris detector configuration values to add or override.
+        """
+        if protocol not in PROTOCOLS:
+            raise ValueError("Unknown protocol '%s'. Use one of: %s." % (protocol, PROTOCOLS))
+
+        if header_detail not in HEADER_DETAILS:
+            raise ValueError("Unknown header detail '%s'. Use one of: %s." % (header_detail, HEADER_DETAILS))
+
+        self.protocol = protocol
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = numpy.dtype(dtype).name
+        self.n_frames = n_frames
+        self.n_series = n_series
+        self.rate = rate
+        self.header_detail = header_detail
+        self.encoding = encoding
+        self.n_modules = n_modules
+        self.series_interval = series_interval
+        self.start_pulse_id = start_pulse_id
+        self.detector_config = detector_config
+
+        pool_size = min(pool_size or config.DEFAULT_GENERATOR_POOL_SIZE, max(1, n_frames))
+        self.frame_pool = generate_frame_pool(self.frame_shape, pool_size, self.dtype, mean_counts)
+        self._encoded_pool = encode_frame_pool(self.frame_pool, encoding) if protocol == PROTOCOL_DECTRIS else None
+
+        self._forwarder = None
+
+    def get_frame(self, frame_index):
+        """
+        Return the (not encoded) frame sent with the frame index.
+        """
+        return self.frame_pool[frame_index % len(self.frame_pool)]
+
+    def _send(self, header, parts):
+        self._forwarder.forward(RawMessage(header, parts[1:], zmq_frames=parts))
+
+    def _send_dectris_series(self, series, pacer):
+        frame_time = 1 / self.rate if self.rate else 0
+        detector_config = get_detector_config(self.frame_shape, self.dtype, self.n_frames, frame_time,
+                                              self.detector_config)
+        self._send(*get_dheader_parts(series, self.header_detail, detector_config, self.frame_shape))
+
+        header = {"htype": "dimage-1.0", "series": series}
+        n_bytes = 0
+
+        pacer.start()
+        for frame_index in range(self.n_frames):
+            pacer.wait(frame_index)
+
+            encoded_frame, part_2, frame_hash = self._encoded_pool[frame_index % len(self._encoded_pool)]
+            header["frame"] = frame_index
+            header["hash"] = frame_hash
+
+            # Times in nanoseconds from the start of the series.
+            start_time = int(frame_index * frame_time * 1e9)
+            part_4 = {"htype": "dconfig-1.0", "start_time": start_time,
+                      "stop_time": start_time + int(frame_time * 1e9), "real_time": int(frame_time * 1e9)}
+
+            self._send(header, [json.dumps(header).encode(), part_2, encoded_frame, json.dumps(part_4).encode()])
+            n_bytes += len(encoded_frame)
+
+        end_header = {"htype": "dseries_end-1.0", "series": series}
+        self._send(end_header, [json.dumps(end_header).encode()])
+
+        return n_bytes
+
+    def _send_sf_series(self, series, pacer):
+        n_bytes = 0
+        first_pulse_id = self.start_pulse_id + (series - 1) * self.n_frames
+
+        pacer.start()
+        for frame_index in range(self.n_frames):
+            pacer.wait(frame_index)
+
+            header = get_sf_header(frame_index, first_pulse_id + frame_index, self.frame_shape, self.dtype,
+                                   self.n_modules)
+            frame = self.get_frame(frame_index)
+
+            self._send(header, [json.dumps(header).encode(), frame])
+            n_bytes += frame.nbytes
+
+        return n_bytes
+
+    def run(self, binding_address):
+        """
+        Send the series.
+        :param binding_address: Address to bind the stream to.
+        :return: Dictionary with the achieved send rate.
+        """
+        self._forwarder = MFlowForwarder()
+        self._forwarder.start(binding_address)
+
+        send_series = self._send_dectris_series if self.protocol == PROTOCOL_DECTRIS else self._send_sf_series
+        pacer = RatePacer(self.rate)
+        n_bytes = 0
+
+        start_time = perf_counter()
+        try:
+            for series in range(self.n_series):
+                if series and self.series_interval:
+                    sleep(self.series_interval)
+
+                n_bytes += send_series(series + 1, pacer)
+
+        finally:
+            send_time = perf_counter() - start_time
+            self._forwarder.stop()
+            self._forwarder = None
+
+        n_frames = self.n_frames * self.n_series
+        return {"series": self.n_series,
+                "frames": n_frames,
+                "bytes": n_bytes,
+                "send_time": send_time,
+                "frames_per_second": n_frames / send_time if send_time else 0,
+                "megabytes_per_second": n_bytes / 1024 / 1024 / send_time if send_time else 0}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Simulate the stream of a Dectris (dheader, dimage, dseries_end) or a "
+                                        "SwissFEL Jungfrau (array-1.0) detector.")
+    parser.add_argument("binding_address", type=str, help="Binding address for mflow connection.\n"
+                                                          "Example: tcp://127.0.0.1:40000")
+    parser.add_argument("--protocol", default=PROTOCOL_DECTRIS, choices=PROTOCOLS, help="Detector protocol.")
+    parser.add_argument("--frame_shape", type=int, nargs=2, default=[512, 1024], help="Frame shape, Y and X.")
+    parser.add_argument("--dtype", type=str, default="uint16", help="Data type of the frames.")
+    parser.add_argument("--n_frames", type=int, default=100, help="Number of images in each series.")
+    parser.add_argument("--n_series", type=int, default=1, help="Number of back to back series.")
+    parser.add_argument("--rate", type=float, default=None, help="Images per second.\n"
+                                                                 "Default: as fast as possible.")
+    parser.add_argument("--series_interval", type=float, default=0, help="Time, in seconds, between the series.")
+    parser.add_argument("--header_detail", default="basic", choices=HEADER_DETAILS, help="Dectris header detail.")
+    parser.add_argument("--encoding", default="", choices=sorted(encoders_mapping),
+                        help="Dectris frame encoding. Default: uncompressed.")
+    parser.add_argument("--n_modules", type=int, default=1, help="Number of modules, for the SF protocol.")
+    parser.add_argument("--mean_counts", type=float, default=1.0, help="Mean counts of each pixel.")
+    parser.add_argument("--pool_size", type=int, default=config.DEFAULT_GENERATOR_POOL_SIZE,
+                        help="Number of preallocated frames to cycle through.")
+    input_args = parser.parse_args()
+
+    simulator = DetectorSimulator(protocol=input_args.protocol, frame_shape=input_args.frame_shape,
+                                  dtype=input_args.dtype, n_frames=input_args.n_frames,
+                                  n_series=input_args.n_series, rate=input_args.rate,
+                                  header_detail=input_args.header_detail, encoding=input_args.encoding,
+                                  n_modules=input_args.n_modules, mean_counts=input_args.mean_counts,
+                                  pool_size=input_args.pool_size, series_interval=input_args.series_interval)
+
+    print("Simulating %d %s series of %d frames of shape %s." % (input_args.n_series, input_args.protocol,
+                                                                 input_args.n_frames, input_args.frame_shape))
+
+    try:
+        report = simulator.run(input_args.binding_address)
+        print("Sent %d frames in %.3f s (%.1f frames/s, %.1f MB/s)." % (report["frames"], report["send_time"],
+                                                                        report["frames_per_second"],
+                                                                        report["megabytes_per_second"]))
+    except KeyboardInterrupt:
+        print("Terminated by user.")
@@ -18,7 +18,12 @@ setup(
               'mflow_nodes.test_tools'],
 
     scripts=['mflow_nodes/script_tools/m_manage.py',
+             'mflow_nodes/script_tools/m_merge_node.py',
+             'mflow_nodes/test_tools/m_benchmark.py',
              'mflow_nodes/test_tools/m_generate_test_stream.py',
+             'mflow_nodes/test_tools/m_record.py',
+             'mflow_nodes/test_tools/m_replay.py',
+             'mflow_nodes/test_tools/m_simulate_detector.py',
              'mflow_nodes/test_tools/m_stats_node.py'],
 
     include_package_data=True
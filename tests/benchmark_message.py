@@ -0,0 +1,72 @@
+"""
+Measure how many messages per second go through get_mflow_message, and through the MessageDispatcher the
+receivers use, for each message type.
+
+Each message is wrapped and its header fields are read the way a typical processor does it (frame index, header,
+frame size and dtype, each twice). The raw messages are prepared in advance, so only the wrapping and the
+accessors are measured. The best of the repeated runs is reported.
+"""
+from argparse import ArgumentParser
+from time import time
+from types import SimpleNamespace
+
+import numpy
+
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message, get_raw_mflow_message, MessageDispatcher
+
+
+def get_array_message(frame_index):
+    frame = numpy.zeros(shape=(4, 4), dtype="uint16")
+    return SimpleNamespace(data={"header": {"htype": "array-1.0", "type": "uint16", "shape": [4, 4],
+                                            "frame": frame_index},
+                                 "data": [frame]},
+                           statistics=None)
+
+
+def get_dimage_message(frame_index):
+    return SimpleNamespace(data={"header": {"htype": "dimage-1.0", "series": 1, "frame": frame_index, "hash": ""},
+                                 "part_2": {"htype": "dimage_d-1.0", "shape": [4, 4], "type": "uint16",
+                                            "encoding": "<", "size": 32},
+                                 "part_3_raw": bytes(32),
+                                 "part_4": {"htype": "dconfig-1.0", "start_time": 0, "stop_time": 0,
+                                            "real_time": 0}},
+                           statistics=None)
+
+
+def read_fields(message):
+    for _ in range(2):
+        message.get_frame_index()
+        message.get_header()
+        message.get_frame_size()
+        message.get_frame_dtype()
+
+
+def run_benchmark(message_function, raw_messages):
+    start_time = time()
+
+    for raw_message in raw_messages:
+        read_fields(message_function(raw_message))
+
+    return len(raw_messages) / (time() - start_time)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--n_messages", type=int, default=200000, help="Number of messages to wrap.")
+    parser.add_argument("--n_repeats", type=int, default=5, help="Number of runs for each message type.")
+    input_args = parser.parse_args()
+
+    benchmarks = [("array-1.0", get_mflow_message, get_array_message),
+                  ("dimage-1.0", get_mflow_message, get_dimage_message),
+                  ("raw-1.0", get_raw_mflow_message, get_array_message),
+                  ("array-1.0 dispatcher", MessageDispatcher().wrap, get_array_message),
+                  ("dimage-1.0 dispatcher", MessageDispatcher().wrap, get_dimage_message),
+                  ("raw-1.0 dispatcher", MessageDispatcher(receive_raw=True).wrap, get_array_message)]
+
+    for htype, message_function, raw_message_function in benchmarks:
+        raw_messages = [raw_message_function(frame_index) for frame_index in range(input_args.n_messages)]
+        messages_per_second = max(run_benchmark(message_function, raw_messages)
+                                  for _ in range(input_args.n_repeats))
+
+        print("%s: %.0f messages/s (%.2f us per message)." % (htype, messages_per_second,
+                                                              1e6 / messages_per_second))
@@ -0,0 +1,90 @@
+"""
+Compare the proxy forwarding throughput of the mflow path (receive, decode, encode and send the message) with the
+pass-through path (receive and send the original ZMQ frames without copying them).
+
+The sender and the sink run in threads, the proxy loop runs in the main thread.
+"""
+import json
+from argparse import ArgumentParser
+from threading import Thread
+from time import time
+
+import zmq
+
+from mflow_nodes.stream_node import connect_stream, get_stream_message_function
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+
+input_address = "tcp://127.0.0.1:40030"
+output_address = "tcp://127.0.0.1:40031"
+
+
+def send_frames(context, n_frames, frame_bytes):
+    socket = context.socket(zmq.PUSH)
+    socket.bind(input_address)
+
+    data = zmq.Frame(bytes(frame_bytes))
+    for frame_index in range(n_frames):
+        header = {"htype": "array-1.0", "type": "uint8", "shape": [frame_bytes], "frame": frame_index}
+        socket.send_multipart([json.dumps(header).encode(), data], copy=False)
+
+    socket.close(linger=-1)
+
+
+def receive_frames(context, n_frames):
+    socket = context.socket(zmq.PULL)
+    socket.connect(output_address)
+
+    for _ in range(n_frames):
+        socket.recv_multipart(copy=False)
+
+    socket.close()
+
+
+def run_benchmark(passthrough, n_frames, frame_bytes):
+    context = zmq.Context()
+
+    forwarder = MFlowForwarder()
+    forwarder.start(output_address)
+    stream = connect_stream(input_address, receive_timeout=1000, queue_size=32)
+    get_message = get_stream_message_function(stream, receive_raw=True, passthrough=passthrough)
+
+    sink = Thread(target=receive_frames, args=(context, n_frames))
+    sink.start()
+    sender = Thread(target=send_frames, args=(context, n_frames, frame_bytes))
+    sender.start()
+
+    start_time = None
+    n_forwarded = 0
+    while n_forwarded < n_frames:
+        message = get_message()
+        if message is None:
+            break
+
+        start_time = start_time or time()
+        forwarder.forward(message.raw_message)
+        n_forwarded += 1
+
+    sink.join()
+    total_time = time() - start_time
+
+    sender.join()
+    stream.disconnect()
+    forwarder.stop()
+    context.term()
+
+    return n_forwarded / total_time
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--n_frames", type=int, default=2000, help="Number of frames to forward.")
+    parser.add_argument("--frame_bytes", type=int, nargs="+", default=[1024, 1024 * 1024, 16 * 1024 * 1024],
+                        help="Frame sizes, in bytes, to compare.")
+    input_args = parser.parse_args()
+
+    for frame_bytes in input_args.frame_bytes:
+        for passthrough in (False, True):
+            frames_per_second = run_benchmark(passthrough, input_args.n_frames, frame_bytes)
+
+            print("frame_bytes=%d passthrough=%s: %.0f frames/s (%.1f MB/s)." %
+                  (frame_bytes, passthrough, frames_per_second, frames_per_second * frame_bytes / 1024 / 1024))
@@ -0,0 +1,84 @@
+"""
+Compare the inline receive loop (n_receiving_threads=0) with the decoupled receiving threads.
+
+The processor simulates a slow process_message call. With the inline loop the socket is not read while the
+processor is busy, so the ZMQ HWM fills up and the sender stalls. With the receiving threads the frames are
+received (and their headers decoded) while the processor is working.
+"""
+from argparse import ArgumentParser
+from multiprocessing import Value
+from threading import Thread
+from time import sleep, time
+
+from mflow_nodes.node_manager import NodeManager
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_node import get_processor_function, get_receiver_function
+from mflow_nodes.test_tools.m_generate_test_stream import generate_test_array_stream
+
+benchmark_address = "tcp://127.0.0.1:40000"
+
+
+class SlowProcessor(BaseProcessor):
+    def __init__(self, processing_time, processed_messages):
+        self.processing_time = processing_time
+        self._processed_messages = processed_messages
+
+    def process_message(self, message):
+        # Simulate the processing of the frame data.
+        if self.processing_time:
+            sleep(self.processing_time)
+
+        with self._processed_messages.get_lock():
+            self._processed_messages.value += 1
+
+
+def run_benchmark(n_receiving_threads, n_frames, frame_size, processing_time):
+    processed_messages = Value("L", 0)
+    processor = SlowProcessor(processing_time, processed_messages)
+
+    node = NodeManager(processor_function=get_processor_function(processor=processor,
+                                                                 connection_address=benchmark_address),
+                       receiver_function=get_receiver_function(connection_address=benchmark_address),
+                       processor_instance=processor,
+                       n_receiving_threads=n_receiving_threads)
+    node.start()
+
+    sender = Thread(target=generate_test_array_stream,
+                    kwargs={"binding_address": benchmark_address,
+                            "frame_shape": (frame_size, frame_size),
+                            "number_of_frames": n_frames,
+                            "dtype": "uint32"})
+
+    start_time = time()
+    sender.start()
+    sender.join()
+    send_time = time() - start_time
+
+    while processed_messages.value < n_frames and time() - start_time < n_frames * (processing_time + 1):
+        sleep(0.01)
+    total_time = time() - start_time
+
+    node.stop()
+
+    return send_time, total_time, processed_messages.value
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--n_frames", type=int, default=200, help="Number of frames to send.")
+    parser.add_argument("--frame_size", type=int, default=2048, help="Number of uint32 values in X and Y direction.")
+    parser.add_argument("--processing_time", type=float, default=0.005, help="Simulated processing time in seconds.")
+    parser.add_argument("--n_receiving_threads", type=int, nargs="+", default=[0, 1],
+                        help="Receiving threads configurations to compare. 0 means inline receiving.")
+    input_args = parser.parse_args()
+
+    frame_megabytes = input_args.frame_size * input_args.frame_size * 4 / 1024 / 1024
+
+    for n_receiving_threads in input_args.n_receiving_threads:
+        send_time, total_time, n_processed = run_benchmark(n_receiving_threads, input_args.n_frames,
+                                                           input_args.frame_size, input_args.processing_time)
+
+        print("n_receiving_threads=%d: sent %d frames in %.3f s (%.1f MB/s), processed %d frames in %.3f s "
+              "(%.1f frames/s)." % (n_receiving_threads, input_args.n_frames, send_time,
+                                    input_args.n_frames * frame_megabytes / send_time,
+                                    n_processed, total_time, n_processed / total_time))
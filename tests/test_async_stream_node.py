@@ -0,0 +1,99 @@
+import asyncio
+import json
+import unittest
+
+import numpy
+import zmq
+
+from mflow_nodes.async_stream_node import AsyncNodeManager
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.rest_api.async_rest_server import serve_web_interface
+
+stream_address = "tcp://127.0.0.1:40010"
+rest_port = 41010
+number_of_messages = 20
+
+
+class CollectingProcessor(BaseProcessor):
+    def __init__(self):
+        self.frame_indexes = []
+        self.threshold = 0
+
+    def process_message(self, message):
+        self.frame_indexes.append(message.get_frame_index())
+
+
+def send_messages(socket, n_messages):
+    for frame_index in range(n_messages):
+        data = numpy.full((4, 4), frame_index, dtype="uint16")
+        header = {"htype": "array-1.0", "type": "uint16", "shape": [4, 4], "frame": frame_index}
+        socket.send_multipart([json.dumps(header).encode(), data.tobytes()])
+
+
+async def http_request(method, url, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", rest_port)
+    content = json.dumps(body).encode() if body is not None else b""
+    writer.write(("%s %s HTTP/1.1\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n" %
+                  (method, url, len(content))).encode() + content)
+    response = await reader.read()
+    writer.close()
+
+    return json.loads(response.split(b"\r\n\r\n", 1)[1].decode())
+
+
+class AsyncStreamNodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        self.context = zmq.Context()
+        self.sender = self.context.socket(zmq.PUSH)
+        self.sender.bind(stream_address)
+
+    def tearDown(self):
+        self.sender.close(linger=0)
+        self.context.term()
+        self.loop.close()
+
+    def test_receive_and_control(self):
+        processor = CollectingProcessor()
+        node_manager = AsyncNodeManager(processor, stream_address,
+                                        initial_parameters={"n_messages": number_of_messages})
+
+        async def run_test():
+            server = await serve_web_interface(node_manager, "test", "127.0.0.1", rest_port)
+
+            response = await http_request("POST", "/api/v1/test/parameters", {"threshold": 10})
+            self.assertEqual("ok", response["status"])
+            self.assertEqual(10, processor.threshold, "Parameters are set directly on the processor.")
+
+            await http_request("PUT", "/api/v1/test/")
+            self.assertTrue(node_manager.is_running())
+
+            send_messages(self.sender, number_of_messages)
+
+            # The node stops by itself after n_messages.
+            for _ in range(100):
+                if not node_manager.is_running():
+                    break
+                await asyncio.sleep(0.05)
+
+            status = await http_request("GET", "/api/v1/test/status")
+            self.assertFalse(status["data"]["is_running"])
+
+            statistics = await http_request("GET", "/api/v1/test/statistics")
+            self.assertEqual(number_of_messages, statistics["data"]["statistics"]["messages_processed"])
+
+            await http_request("DELETE", "/api/v1/test/")
+            server.close()
+            await server.wait_closed()
+
+        self.loop.run_until_complete(run_test())
+        node_manager.close()
+
+        self.assertListEqual(list(range(number_of_messages)), processor.frame_indexes)
+
+
+if __name__ == '__main__':
+    unittest.main()
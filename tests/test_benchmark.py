@@ -0,0 +1,41 @@
+import unittest
+
+from mflow_nodes.test_tools.m_benchmark import run_benchmark, MODE_NODE, MODE_THREADS
+
+number_of_frames = 50
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_pipeline(self):
+        """
+        Test if the frames go through a chain of real nodes, and if the results are reported.
+        """
+        for processor_type in ("proxy", "base"):
+            result = run_benchmark("tcp", processor_type, (16, 16), "uint16", number_of_frames, n_nodes=2,
+                                   passthrough=True, timeout=10, mode=MODE_NODE)
+
+            self.assertEqual(MODE_NODE, result["mode"])
+            self.assertEqual(number_of_frames, result["received"])
+            self.assertEqual(0, result["dropped"])
+            self.assertGreater(result["messages_per_second"], 0)
+            self.assertLessEqual(result["latency_p50_ms"], result["latency_p999_ms"])
+
+    def test_threads_baseline(self):
+        """
+        Test if the threads mode runs the pipeline in this process, over inproc as well.
+        """
+        for transport in ("tcp", "inproc"):
+            result = run_benchmark(transport, "proxy", (16, 16), "uint16", number_of_frames, n_nodes=2,
+                                   passthrough=True, timeout=10, mode=MODE_THREADS)
+
+            self.assertEqual(MODE_THREADS, result["mode"])
+            self.assertEqual(number_of_frames, result["received"])
+            self.assertNotIn("dropped", result)
+
+        with self.assertRaises(ValueError):
+            run_benchmark("inproc", "proxy", (16, 16), "uint16", number_of_frames, mode=MODE_NODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from types import SimpleNamespace
+
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.processors.chain import ChainProcessor
+from mflow_nodes.processors.proxy import ProxyProcessor
+
+
+class EvenFramesFilter(BaseProcessor):
+    def __init__(self):
+        self.enabled = True
+
+    def process_message(self, message):
+        return not self.enabled or message.frame_index % 2 == 0
+
+
+class CollectingProcessor(BaseProcessor):
+    def __init__(self):
+        self.threshold = 0
+        self._frame_indexes = []
+
+    def process_message(self, message):
+        self._frame_indexes.append(message.frame_index)
+
+
+class ChainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collector = CollectingProcessor()
+        self.chain = ChainProcessor([EvenFramesFilter(), self.collector], stage_names=["filter", "collector"])
+
+    def test_drop_message(self):
+        """
+        Test if the messages dropped by a stage are not passed to the following stages.
+        """
+        self.chain.start()
+        for frame_index in range(10):
+            self.chain.process_message(SimpleNamespace(frame_index=frame_index))
+        self.chain.stop()
+
+        self.assertListEqual([0, 2, 4, 6, 8], self.collector._frame_indexes)
+
+        statistics = self.chain.get_statistics()
+        self.assertEqual(10, statistics["filter"]["messages"])
+        self.assertEqual(5, statistics["filter"]["dropped"])
+        self.assertEqual(5, statistics["collector"]["messages"])
+        self.assertEqual(0, statistics["collector"]["dropped"])
+
+    def test_namespaced_parameters(self):
+        """
+        Test if the parameters are set and reported per stage.
+        """
+        self.chain.set_parameter(("filter.enabled", False))
+        self.chain.set_parameter(("threshold", 5))
+
+        self.assertDictEqual({"filter.enabled": False, "collector.threshold": 5}, dict(self.chain.get_parameters()))
+
+        with self.assertRaises(ValueError):
+            self.chain.set_parameter(("unknown", 1))
+
+        self.chain.start()
+        self.assertTrue(self.chain.process_message(SimpleNamespace(frame_index=1)))
+        self.chain.stop()
+
+    def test_concurrent_stage(self):
+        """
+        Test if a stage running concurrently is accepted only as the last stage.
+        """
+        proxy = ProxyProcessor(proxy_function=lambda message: True)
+        proxy.set_parameter(("proxy_workers", 2))
+
+        chain = ChainProcessor([proxy, CollectingProcessor()], stage_names=["proxy", "collector"])
+        with self.assertRaises(ValueError):
+            chain.start()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import unittest
+
+import numpy
+import zmq
+
+from mflow_nodes.processors.compression import CompressionProcessor
+from mflow_nodes.stream_tools.compression import codecs_mapping, compress_array
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames, get_passthrough_mflow_message
+
+compressed_address = "tcp://127.0.0.1:40000"
+number_of_frames = 16
+
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = numpy.arange(64, dtype="uint16").reshape(8, 8)
+
+    def test_handler(self):
+        """
+        Test if the compressed array is decompressed by the handler, for every codec.
+        """
+        for codec in codecs_mapping:
+            for shuffle in (False, True):
+                header = {"htype": "array-compressed-1.0", "type": "uint16", "shape": [8, 8], "frame": 0,
+                          "codec": codec, "shuffle": shuffle}
+                message = get_mflow_message_from_frames(header, [compress_array(self.frame, codec, 1, shuffle)])
+
+                numpy.testing.assert_array_equal(self.frame, message.get_data())
+                numpy.testing.assert_array_equal(self.frame, message.get_array())
+
+    def test_compression_processor(self):
+        """
+        Test if the processor forwards all the frames compressed and in order, followed by the series end, without
+        waiting for more messages. The frames are borrowed: their buffers are overwritten once processed.
+        """
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        socket.RCVTIMEO = 2000
+        socket.connect(compressed_address)
+
+        processor = CompressionProcessor()
+        processor.binding_address = compressed_address
+        processor.n_threads = 4
+        processor.start()
+
+        for frame_index in range(number_of_frames):
+            header = {"htype": "array-1.0", "type": "uint16", "shape": [8, 8], "frame": frame_index}
+            slot_buffer = bytearray((self.frame + frame_index).tobytes())
+            processor.process_message(get_mflow_message_from_frames(header, [slot_buffer], borrowed=True))
+
+            # The ring buffer slot is written again.
+            slot_buffer[:] = bytes(len(slot_buffer))
+
+        processor.process_message(get_mflow_message_from_frames({"htype": "dseries_end-1.0", "series": 1}, []))
+
+        try:
+            received_frames = []
+            for _ in range(number_of_frames):
+                message = get_passthrough_mflow_message(socket.recv_multipart(copy=False))
+                self.assertEqual("array-compressed-1.0", message.htype)
+
+                numpy.testing.assert_array_equal(self.frame + message.get_frame_index(), message.get_data())
+                received_frames.append(message.get_frame_index())
+
+            self.assertEqual("dseries_end-1.0", json.loads(socket.recv_multipart()[0].decode())["htype"])
+        finally:
+            processor.stop()
+            socket.close()
+            context.term()
+
+        statistics = processor.get_statistics()
+
+        self.assertListEqual(list(range(number_of_frames)), received_frames)
+        self.assertEqual(number_of_frames, statistics["compressed"])
+        self.assertGreater(statistics["compression_ratio"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from threading import Thread
+
+import numpy
+import zmq
+
+from mflow_nodes.stream_tools.mflow_message import get_passthrough_mflow_message
+from mflow_nodes.test_tools.m_simulate_detector import DetectorSimulator, PROTOCOL_SF
+
+simulator_address = "tcp://127.0.0.1:40000"
+number_of_frames = 5
+number_of_series = 2
+
+
+class DetectorSimulatorTest(unittest.TestCase):
+
+    def run_simulator(self, simulator, n_messages):
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        socket.RCVTIMEO = 5000
+        socket.connect(simulator_address)
+
+        sender = Thread(target=simulator.run, args=(simulator_address,))
+        sender.start()
+
+        messages = [get_passthrough_mflow_message(socket.recv_multipart(copy=False)) for _ in range(n_messages)]
+
+        sender.join()
+        socket.close()
+        context.term()
+
+        return messages
+
+    def test_dectris_series(self):
+        simulator = DetectorSimulator(frame_shape=(6, 8), n_frames=number_of_frames, n_series=number_of_series,
+                                      header_detail="all", pool_size=3)
+
+        messages = self.run_simulator(simulator, (number_of_frames + 2) * number_of_series)
+
+        expected_htypes = ["dheader-1.0"] + ["dimage-1.0"] * number_of_frames + ["dseries_end-1.0"]
+        self.assertListEqual(expected_htypes * number_of_series, [message.htype for message in messages])
+
+        for series_messages, series in zip((messages[:7], messages[7:]), (1, 2)):
+            self.assertTrue(all(message.get_header()["series"] == series for message in series_messages))
+            self.assertEqual(number_of_frames, series_messages[0].get_data()["nimages"])
+
+            for frame_index, message in enumerate(series_messages[1:-1]):
+                self.assertEqual(frame_index, message.get_frame_index())
+                numpy.testing.assert_array_equal(simulator.get_frame(frame_index), message.get_array())
+
+    def test_sf_series(self):
+        simulator = DetectorSimulator(protocol=PROTOCOL_SF, frame_shape=(6, 8), n_frames=number_of_frames,
+                                      n_series=number_of_series, n_modules=3, start_pulse_id=1000)
+
+        messages = self.run_simulator(simulator, number_of_frames * number_of_series)
+
+        headers = [message.get_header() for message in messages]
+        self.assertListEqual(list(range(number_of_frames)) * number_of_series,
+                             [header["frame"] for header in headers])
+        self.assertListEqual(list(range(1000, 1000 + number_of_frames * number_of_series)),
+                             [header["pulse_id"] for header in headers])
+        self.assertListEqual([0, 1, 2], headers[0]["module_number"])
+        numpy.testing.assert_array_equal(simulator.get_frame(3), messages[3].get_array())
+
+
+if __name__ == '__main__':
+    unittest.main()
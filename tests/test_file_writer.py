@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from mflow_nodes.processors.file_writer import FileWriterProcessor, IndexedFileReader, get_series_filename
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames
+
+number_of_frames = 10
+
+
+class FileWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_folder = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.output_folder, "frames.raw")
+
+        self.writer = FileWriterProcessor()
+        self.writer.output_file = self.output_file
+
+    def tearDown(self):
+        shutil.rmtree(self.output_folder)
+
+    @staticmethod
+    def get_frame_message(frame_index, value=None):
+        header = {"htype": "array-1.0", "type": "int32", "shape": [4, 8], "frame": frame_index}
+        frame = numpy.full((4, 8), frame_index if value is None else value, dtype="int32")
+
+        return get_mflow_message_from_frames(header, [frame.tobytes()])
+
+    @staticmethod
+    def get_series_header_message(series, n_images):
+        series_header = {"htype": "dheader-1.0", "series": series, "header_detail": "basic"}
+        return get_mflow_message_from_frames(series_header, [json.dumps({"nimages": n_images}).encode()])
+
+    def test_series_header(self):
+        """
+        Test if the file is preallocated from the series header, and if the frames can be read in any order.
+        """
+        self.writer.start()
+
+        self.writer.process_message(self.get_series_header_message(1, number_of_frames))
+
+        # Frame 3 is missing, the others arrive out of order.
+        for frame_index in [0, 2, 1] + list(range(4, number_of_frames)):
+            self.writer.process_message(self.get_frame_message(frame_index))
+
+        self.writer.stop()
+
+        self.assertEqual(number_of_frames * 4 * 8 * 4, os.path.getsize(self.output_file))
+
+        reader = IndexedFileReader(self.output_file)
+        self.assertEqual(number_of_frames, len(reader))
+        self.assertListEqual([0, 1, 2] + list(range(4, number_of_frames)), list(reader.get_written_frames()))
+
+        for frame_index in (7, 0, 2):
+            numpy.testing.assert_array_equal(numpy.full((4, 8), frame_index, dtype="int32"),
+                                             reader.read_frame(frame_index))
+        self.assertIsNone(reader.read_frame(3))
+        reader.close()
+
+    def test_unknown_length(self):
+        """
+        Test if the file grows as needed without the series length, and is truncated to the written frames.
+        """
+        self.writer.flush_interval = 0.01
+        self.writer.start()
+
+        for frame_index in range(number_of_frames):
+            self.writer.process_message(self.get_frame_message(frame_index))
+
+        self.writer.stop()
+
+        reader = IndexedFileReader(self.output_file)
+        self.assertEqual(number_of_frames, len(reader))
+        numpy.testing.assert_array_equal(numpy.full((4, 8), 9, dtype="int32"), reader.read_frame(9))
+        reader.close()
+
+    def test_series(self):
+        """
+        Test if back to back series, with the frame indexes restarting from 0, are written to separate files.
+        """
+        self.writer.start()
+
+        for series in (1, 2):
+            self.writer.process_message(self.get_series_header_message(series, number_of_frames))
+
+            for frame_index in range(number_of_frames):
+                self.writer.process_message(self.get_frame_message(frame_index, series * 100 + frame_index))
+
+            self.writer.process_message(get_mflow_message_from_frames({"htype": "dseries_end-1.0", "series": series},
+                                                                      []))
+
+        statistics = self.writer.get_statistics()
+        self.writer.stop()
+
+        self.assertEqual(2, statistics["series"])
+        self.assertEqual(2 * number_of_frames, statistics["frames"])
+
+        for series_index, series in enumerate((1, 2)):
+            reader = IndexedFileReader(get_series_filename(self.output_file, series_index))
+            self.assertEqual(number_of_frames, len(reader))
+
+            for frame_index in (0, number_of_frames - 1):
+                numpy.testing.assert_array_equal(numpy.full((4, 8), series * 100 + frame_index, dtype="int32"),
+                                                 reader.read_frame(frame_index))
+            reader.close()
+
+    def test_restarted_stream(self):
+        """
+        Test if frame indexes going back without a series header start a new series.
+        """
+        self.writer.start()
+
+        for series in (1, 2):
+            for frame_index in range(number_of_frames):
+                self.writer.process_message(self.get_frame_message(frame_index, series * 100 + frame_index))
+
+        statistics = self.writer.get_statistics()
+        self.writer.stop()
+
+        self.assertEqual(2, statistics["series"])
+
+        for series_index, series in enumerate((1, 2)):
+            reader = IndexedFileReader(get_series_filename(self.output_file, series_index))
+            self.assertEqual(number_of_frames, len(reader))
+            numpy.testing.assert_array_equal(numpy.full((4, 8), series * 100 + 5, dtype="int32"), reader.read_frame(5))
+            reader.close()
+
+    def test_frame_counter(self):
+        """
+        Test if the frames are written relative to the first frame index, and if frames too far from it are rejected.
+        """
+        first_frame_index = 10 ** 12
+        self.writer.max_frames = number_of_frames
+        self.writer.start()
+
+        for frame_index in list(range(number_of_frames)) + [number_of_frames + 5]:
+            self.writer.process_message(self.get_frame_message(first_frame_index + frame_index, frame_index))
+
+        statistics = self.writer.get_statistics()
+        self.writer.stop()
+
+        self.assertEqual(number_of_frames, statistics["frames"])
+        self.assertEqual(1, statistics["rejected"])
+        self.assertEqual(number_of_frames * 4 * 8 * 4, os.path.getsize(self.output_file))
+
+        reader = IndexedFileReader(self.output_file)
+        self.assertListEqual(list(range(first_frame_index, first_frame_index + number_of_frames)),
+                             list(reader.get_written_frames()))
+        numpy.testing.assert_array_equal(numpy.full((4, 8), 3, dtype="int32"),
+                                         reader.read_frame(first_frame_index + 3))
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
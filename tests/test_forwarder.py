@@ -1,27 +1,66 @@
 import json
 import os
 import unittest
+from threading import Lock
 from time import sleep
+from types import SimpleNamespace
 
-from mflow_nodes.test_tools.m_generate_test_stream import generate_test_array_stream
+import zmq
+
+from mflow_nodes.stream_tools.async_forwarder import AsyncMFlowForwarder
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames, get_passthrough_mflow_message
+from mflow_nodes.test_tools.m_generate_test_stream import generate_test_array_stream, generate_frame_data
 from tests.helpers import setup_file_writing_receiver
 
 writer_address = "tcp://127.0.0.1:40000"
 output_filename = "test_forwarder_output.txt"
 number_of_frames = 16
 
+second_writer_address = "tcp://127.0.0.1:40002"
+second_output_filename = "test_forwarder_second_output.txt"
+unconnected_address = "tcp://127.0.0.1:40003"
+
+
+def forward_frames(forwarder, n_frames):
+    for frame_index in range(n_frames):
+        message = SimpleNamespace()
+        message.data = {"header": {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index},
+                        "data": [generate_frame_data((4, 4), frame_index)]}
+        forwarder.forward(message)
+
+
+class SlowForwarder(MFlowForwarder):
+    def forward(self, message):
+        sleep(0.01)
+        return super(SlowForwarder, self).forward(message)
+
 
 class ForwarderTest(unittest.TestCase):
 
     def setUp(self):
         self.receiver = setup_file_writing_receiver(writer_address, output_filename)
         self.receiver.start()
+        self.second_receiver = None
 
     def tearDown(self):
         self.receiver.stop()
-        # Remove the output file.
-        if os.path.exists(output_filename):
-            os.remove(output_filename)
+        if self.second_receiver is not None:
+            self.second_receiver.stop()
+
+        # Remove the output files.
+        for filename in (output_filename, second_output_filename):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def start_second_receiver(self):
+        self.second_receiver = setup_file_writing_receiver(second_writer_address, second_output_filename)
+        self.second_receiver.start()
+
+    @staticmethod
+    def read_frame_indexes(filename):
+        with open(filename, 'r') as input_file:
+            return [frame["frame"] for frame in json.load(input_file)]
 
     def test_forwarder(self):
         """
@@ -40,3 +79,127 @@ class ForwarderTest(unittest.TestCase):
         for index, frame in enumerate(test_data):
             # Check if they were transfered in the correct order.
             self.assertEqual(index, frame["frame"], "Frames transfered out of order.")
+
+    def test_broadcast(self):
+        """
+        Test if all frames are sent to every destination, and if a destination that does not block is skipped.
+        """
+        self.start_second_receiver()
+
+        forwarder = MFlowForwarder(distribution=MFlowForwarder.BROADCAST)
+        forwarder.start([writer_address, second_writer_address, unconnected_address], block=[True, True, False])
+        # Wait for the receivers to connect.
+        sleep(0.5)
+
+        forward_frames(forwarder, number_of_frames)
+        sleep(0.5)
+
+        statistics = forwarder.get_statistics()
+        forwarder.stop()
+
+        self.assertListEqual(list(range(number_of_frames)), self.read_frame_indexes(output_filename))
+        self.assertListEqual(list(range(number_of_frames)), self.read_frame_indexes(second_output_filename))
+        self.assertEqual(number_of_frames, statistics[2]["dropped"], "Unconnected destination should drop frames.")
+
+    def test_load_balance(self):
+        """
+        Test if each frame is sent to exactly one destination.
+        """
+        self.start_second_receiver()
+
+        forwarder = MFlowForwarder(distribution=MFlowForwarder.LOAD_BALANCE)
+        forwarder.start([writer_address, second_writer_address])
+        sleep(0.5)
+
+        forward_frames(forwarder, number_of_frames)
+        sleep(0.5)
+        forwarder.stop()
+
+        first_frames = self.read_frame_indexes(output_filename)
+        second_frames = self.read_frame_indexes(second_output_filename)
+
+        self.assertTrue(first_frames and second_frames, "Both destinations should receive frames.")
+        self.assertListEqual(list(range(number_of_frames)), sorted(first_frames + second_frames))
+
+    def test_passthrough(self):
+        """
+        Test if the messages with the original ZMQ frames are forwarded as received.
+        """
+        forwarder = MFlowForwarder()
+        forwarder.start(writer_address)
+        sleep(0.5)
+
+        for frame_index in range(number_of_frames):
+            header = {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index}
+            zmq_frames = [zmq.Frame(json.dumps(header).encode()),
+                          zmq.Frame(generate_frame_data((4, 4), frame_index).tobytes())]
+
+            message = get_passthrough_mflow_message(zmq_frames)
+            self.assertTrue(forwarder.forward(message.raw_message))
+
+        sleep(0.5)
+        forwarder.stop()
+
+        self.assertListEqual(list(range(number_of_frames)), self.read_frame_indexes(output_filename))
+
+    def test_send_queue_spill(self):
+        """
+        Test if the messages that do not fit in the outbound queue are spilled, and still sent in order.
+        """
+        forwarder = AsyncMFlowForwarder(SlowForwarder(), queue_size=2, overflow_policy="spill")
+        forwarder.start(writer_address)
+        sleep(0.5)
+
+        forward_frames(forwarder, number_of_frames)
+        forwarder.stop()
+        sleep(0.5)
+
+        statistics = forwarder.get_statistics()
+        self.assertGreater(statistics["spilled"], 0, "The slow sender should spill messages.")
+        self.assertEqual(number_of_frames, statistics["sent"])
+        self.assertEqual(0, statistics["spill_depth"])
+        self.assertListEqual(list(range(number_of_frames)), self.read_frame_indexes(output_filename))
+
+    def test_send_queue_spill_frames(self):
+        """
+        Test if the messages assembled from received frames are spilled as their frames, not as their decoded data.
+        """
+        forwarder = AsyncMFlowForwarder(SlowForwarder(), queue_size=2, overflow_policy="spill")
+        forwarder.start(writer_address)
+        sleep(0.5)
+
+        for frame_index in range(number_of_frames):
+            header = {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index}
+            message = get_mflow_message_from_frames(header, [generate_frame_data((4, 4), frame_index).tobytes()])
+            # Decoded data that cannot be pickled, like a decode in progress.
+            message.raw_message.data["decoded"] = Lock()
+            forwarder.forward(message.raw_message)
+
+        forwarder.stop()
+        sleep(0.5)
+
+        statistics = forwarder.get_statistics()
+        self.assertGreater(statistics["spilled"], 0, "The slow sender should spill messages.")
+        self.assertEqual(number_of_frames, statistics["sent"])
+        self.assertListEqual(list(range(number_of_frames)), self.read_frame_indexes(output_filename))
+
+    def test_send_queue_drop(self):
+        """
+        Test if the messages that do not fit in the outbound queue are dropped, without blocking the caller.
+        """
+        forwarder = AsyncMFlowForwarder(SlowForwarder(), queue_size=2, overflow_policy="drop")
+        forwarder.start(writer_address)
+        sleep(0.5)
+
+        forward_frames(forwarder, number_of_frames)
+        forwarder.stop()
+        sleep(0.5)
+
+        statistics = forwarder.get_statistics()
+        self.assertGreater(statistics["dropped"], 0, "The slow sender should drop messages.")
+        self.assertEqual(number_of_frames, statistics["sent"] + statistics["dropped"])
+        self.assertLessEqual(statistics["max_queue_depth"], 2)
+        self.assertGreater(statistics["average_send_latency"], 0)
+
+        received_frames = self.read_frame_indexes(output_filename)
+        self.assertListEqual(sorted(received_frames), received_frames, "Frames transfered out of order.")
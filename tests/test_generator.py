@@ -0,0 +1,52 @@
+import json
+import unittest
+from threading import Thread
+
+import zmq
+
+from mflow_nodes.test_tools.m_generate_test_stream import generate_test_array_stream, SENDERS_SPLIT_FRAMES
+
+sender_addresses = ["tcp://127.0.0.1:40000", "tcp://127.0.0.1:40001"]
+number_of_frames = 20
+
+
+class GeneratorTest(unittest.TestCase):
+
+    def test_split_frames(self):
+        """
+        Test if the senders share the frame indexes, and if the send rate is reported.
+        """
+        context = zmq.Context()
+        received_frames = [[] for _ in sender_addresses]
+
+        def receive(address, frame_indexes):
+            socket = context.socket(zmq.PULL)
+            socket.RCVTIMEO = 5000
+            socket.connect(address)
+
+            for _ in range(number_of_frames // len(sender_addresses)):
+                frame_indexes.append(json.loads(socket.recv_multipart()[0].decode())["frame"])
+
+            socket.close()
+
+        receivers = [Thread(target=receive, args=(address, frame_indexes))
+                     for address, frame_indexes in zip(sender_addresses, received_frames)]
+        for receiver in receivers:
+            receiver.start()
+
+        report = generate_test_array_stream(sender_addresses[0], number_of_frames=number_of_frames, pool_size=4,
+                                            rate=1000, n_senders=2, sender_mode=SENDERS_SPLIT_FRAMES)
+
+        for receiver in receivers:
+            receiver.join()
+        context.term()
+
+        self.assertListEqual(list(range(0, number_of_frames, 2)), received_frames[0])
+        self.assertListEqual(list(range(1, number_of_frames, 2)), received_frames[1])
+        self.assertEqual(number_of_frames, report["frames"])
+        self.assertEqual(2, len(report["senders"]))
+        self.assertGreater(report["frames_per_second"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
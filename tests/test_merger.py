@@ -0,0 +1,131 @@
+import unittest
+from time import time
+from types import SimpleNamespace
+
+from mflow_nodes.stream_tools.mflow_forwarder import MFlowForwarder
+from mflow_nodes.stream_tools.mflow_merger import MFlowMerger
+from mflow_nodes.test_tools.m_generate_test_stream import generate_frame_data
+
+input_addresses = ["tcp://127.0.0.1:40020", "tcp://127.0.0.1:40021"]
+number_of_frames = 16
+
+
+def send_series_message(forwarder, htype, series):
+    message = SimpleNamespace()
+    message.data = {"header": {"htype": htype, "series": series}, "data": []}
+    forwarder.forward(message)
+
+
+def send_frames(forwarder, frame_indexes):
+    for frame_index in frame_indexes:
+        message = SimpleNamespace()
+        message.data = {"header": {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index},
+                        "data": [generate_frame_data((4, 4), frame_index)]}
+        forwarder.forward(message)
+
+
+class MergerTest(unittest.TestCase):
+    def setUp(self):
+        self.forwarders = [MFlowForwarder() for _ in input_addresses]
+        for forwarder, address in zip(self.forwarders, input_addresses):
+            forwarder.start(address)
+
+    def tearDown(self):
+        for forwarder in self.forwarders:
+            forwarder.stop()
+
+    @staticmethod
+    def receive_messages(merger, n_messages, timeout=5):
+        messages = []
+        end_time = time() + timeout
+
+        while len(messages) < n_messages and time() < end_time:
+            for message in merger.receive():
+                header = message.get_header()
+                messages.append(header.get("frame", header["htype"]))
+
+        return messages
+
+    def receive_frame_indexes(self, merger, n_frames, timeout=5):
+        frame_indexes = []
+        end_time = time() + timeout
+
+        while len(frame_indexes) < n_frames and time() < end_time:
+            frame_indexes.extend(message.get_frame_index() for message in merger.receive())
+
+        return frame_indexes
+
+    def test_merge_in_order(self):
+        """
+        Test if the frames split over 2 inputs, arriving in the wrong order, are merged in frame order.
+        """
+        merger = MFlowMerger(input_addresses, reorder_window=number_of_frames)
+        merger.start()
+
+        # All the odd frames arrive before the even ones.
+        send_frames(self.forwarders[1], range(1, number_of_frames, 2))
+        send_frames(self.forwarders[0], range(0, number_of_frames, 2))
+
+        frame_indexes = self.receive_frame_indexes(merger, number_of_frames)
+        statistics = merger.get_statistics()
+        merger.stop()
+
+        self.assertListEqual(list(range(number_of_frames)), frame_indexes)
+        self.assertEqual([number_of_frames // 2] * 2, [input_statistics["messages"]
+                                                       for input_statistics in statistics["inputs"]])
+        self.assertEqual(0, statistics["reorder_buffer"]["occupancy"])
+
+    def test_missing_frame_timeout(self):
+        """
+        Test if a missing frame is skipped after the timeout, and if it is dropped when it arrives late.
+        """
+        merger = MFlowMerger(input_addresses, reorder_window=number_of_frames, missing_frame_timeout=0.2)
+        merger.start()
+
+        send_frames(self.forwarders[0], [0, 1, 3, 4])
+        send_frames(self.forwarders[1], [5])
+
+        frame_indexes = self.receive_frame_indexes(merger, 5)
+        self.assertListEqual([0, 1, 3, 4, 5], frame_indexes)
+
+        send_frames(self.forwarders[1], [2, 6])
+        self.assertListEqual([6], self.receive_frame_indexes(merger, 1))
+
+        statistics = merger.get_statistics()["reorder_buffer"]
+        merger.stop()
+
+        self.assertEqual(1, statistics["missing_frames"])
+        self.assertEqual(1, statistics["late_frames"])
+
+    def test_series(self):
+        """
+        Test if the frame indexes restart with each series, and if the series end does not overtake the frames.
+        """
+        merger = MFlowMerger(input_addresses, reorder_window=number_of_frames, receive_raw=True)
+        merger.start()
+
+        send_series_message(self.forwarders[0], "dheader-1.0", 1)
+        self.assertListEqual(["dheader-1.0"], self.receive_messages(merger, 1))
+
+        send_frames(self.forwarders[1], [1, 3])
+        send_frames(self.forwarders[0], [0, 2])
+        self.assertListEqual([0, 1, 2, 3], self.receive_messages(merger, 4))
+
+        send_series_message(self.forwarders[0], "dseries_end-1.0", 1)
+        send_series_message(self.forwarders[0], "dheader-1.0", 2)
+        self.assertListEqual(["dseries_end-1.0", "dheader-1.0"], self.receive_messages(merger, 2))
+
+        # Only one input delivered frames: they wait in the reorder buffer until the series end.
+        send_frames(self.forwarders[0], [0, 2])
+        send_series_message(self.forwarders[0], "dseries_end-1.0", 2)
+        self.assertListEqual([0, 2, "dseries_end-1.0"], self.receive_messages(merger, 3))
+
+        statistics = merger.get_statistics()["reorder_buffer"]
+        merger.stop()
+
+        self.assertEqual(0, statistics["late_frames"])
+        self.assertEqual(1, statistics["missing_frames"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import pickle
+import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from mflow_nodes.stream_node import decode_ahead
+from mflow_nodes.stream_tools.dimage_codecs import decoders_mapping, register_decoder
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames, handlers_mapping, \
+    MessageDispatcher
+
+
+class MessageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = numpy.arange(12, dtype="uint16").reshape(3, 4)
+        self.frame_buffer = bytearray(self.frame.tobytes())
+
+    def assert_array_view(self, message):
+        array = message.get_array()
+
+        numpy.testing.assert_array_equal(self.frame, array)
+        self.assertTrue(numpy.shares_memory(array, numpy.frombuffer(self.frame_buffer, dtype="uint8")),
+                        "The array should view the received buffer.")
+        self.assertFalse(array.flags.writeable)
+        self.assertIs(array, message.get_array(), "The array should be cached on the message.")
+
+    def test_array_1_0(self):
+        header = {"htype": "array-1.0", "type": "uint16", "shape": [3, 4], "frame": 0}
+
+        self.assert_array_view(get_mflow_message_from_frames(header, [self.frame_buffer]))
+        self.assert_array_view(get_mflow_message_from_frames(header, [self.frame_buffer], receive_raw=True))
+
+        # Frames passed through the ring buffer are flat uint8 arrays.
+        uint8_frame = numpy.frombuffer(self.frame_buffer, dtype="uint8")
+        self.assert_array_view(get_mflow_message_from_frames(header, [uint8_frame], receive_raw=True))
+
+    def test_dimage_1_0(self):
+        header = {"htype": "dimage-1.0", "series": 1, "frame": 0}
+        # The detector sends the shape as (X, Y).
+        part_2 = {"htype": "dimage_d-1.0", "shape": [4, 3], "type": "uint16", "encoding": "<", "size": 24}
+        part_4 = {"htype": "dconfig-1.0"}
+
+        message = get_mflow_message_from_frames(header, [json.dumps(part_2).encode(), self.frame_buffer,
+                                                         json.dumps(part_4).encode()])
+        self.assert_array_view(message)
+
+        part_2["encoding"] = "unknown<"
+        message = get_mflow_message_from_frames(header, [json.dumps(part_2).encode(), self.frame_buffer,
+                                                         json.dumps(part_4).encode()])
+        with self.assertRaises(ValueError):
+            message.get_array()
+
+    def test_dimage_1_0_codec(self):
+        header = {"htype": "dimage-1.0", "series": 1, "frame": 0}
+        part_2 = {"htype": "dimage_d-1.0", "shape": [4, 3], "type": "uint16", "encoding": "zlib<", "size": 24}
+        part_4 = {"htype": "dconfig-1.0"}
+        frames = [json.dumps(part_2).encode(), zlib.compress(self.frame.tobytes()), json.dumps(part_4).encode()]
+
+        register_decoder("zlib", lambda buffer, dtype, shape: numpy.frombuffer(zlib.decompress(buffer),
+                                                                               dtype=dtype).reshape(shape))
+        try:
+            numpy.testing.assert_array_equal(self.frame, get_mflow_message_from_frames(header, frames).get_data())
+
+            # Decode the frame in the background, before the processor accesses it.
+            message = get_mflow_message_from_frames(header, frames)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                decode_ahead(message, executor)
+                numpy.testing.assert_array_equal(self.frame, message.get_data())
+
+            # The decoding is kept on the wrapper: the message data can still be forwarded and pickled as received.
+            self.assertNotIn("part_3", message.raw_message.data)
+            self.assertIs(message.get_data(), message.get_array())
+            numpy.testing.assert_array_equal(self.frame, pickle.loads(pickle.dumps(message)).get_data())
+        finally:
+            del decoders_mapping["zlib"]
+
+    def test_pickle(self):
+        """
+        Test if a message passed to another process reads its fields again, with or without cached fields.
+        """
+        header = {"htype": "array-1.0", "type": "uint16", "shape": [3, 4], "frame": 7}
+
+        for read_fields in (False, True):
+            message = get_mflow_message_from_frames(header, [bytes(self.frame_buffer)])
+            if read_fields:
+                message.get_frame_index()
+
+            unpickled_message = pickle.loads(pickle.dumps(message))
+            self.assertEqual(7, unpickled_message.get_frame_index())
+            self.assertEqual([3, 4], unpickled_message.get_frame_size())
+            numpy.testing.assert_array_equal(self.frame, unpickled_message.get_array())
+
+    def test_dispatcher(self):
+        """
+        Test if the dispatcher resolves the handler when the htype changes, and drops the unknown htypes.
+        """
+        array_header = {"htype": "array-1.0", "type": "uint16", "shape": [3, 4], "frame": 0}
+        end_header = {"htype": "dseries_end-1.0", "series": 1}
+        dispatcher = MessageDispatcher()
+
+        for header in (array_header, array_header, end_header, array_header):
+            message = dispatcher.wrap_frames(dict(header), [self.frame_buffer])
+            self.assertIs(handlers_mapping[header["htype"]], message.handler)
+            self.assertEqual(header["htype"], message.htype)
+
+        self.assert_array_view(dispatcher.wrap_frames(dict(array_header), [self.frame_buffer]))
+
+        self.assertIsNone(dispatcher.wrap_frames({"htype": "unknown-1.0"}, []))
+        self.assertIs(handlers_mapping["array-1.0"],
+                      dispatcher.wrap_frames(dict(array_header), [self.frame_buffer]).handler)
+
+        raw_dispatcher = MessageDispatcher(receive_raw=True)
+        for header in (array_header, end_header, {"htype": "unknown-1.0"}):
+            message = raw_dispatcher.wrap_frames(dict(header), [self.frame_buffer])
+            self.assertIs(handlers_mapping["raw-1.0"], message.handler)
+            self.assertEqual(header["htype"], message.htype)
+
+
+if __name__ == '__main__':
+    unittest.main()
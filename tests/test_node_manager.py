@@ -0,0 +1,59 @@
+import unittest
+from multiprocessing import Process
+
+from mflow_nodes.node_manager import ParameterQueue
+
+
+class ParameterQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parameter_queue = ParameterQueue()
+
+    def test_set_parameter(self):
+        """
+        Test if a parameter put to the queue is reported as an update, and read once.
+        """
+        self.assertFalse(self.parameter_queue.has_updates())
+        self.assertListEqual([], self.parameter_queue.get_updates())
+
+        self.parameter_queue.put(("batch_size", 4))
+
+        self.assertTrue(self.parameter_queue.has_updates())
+        self.assertListEqual([("batch_size", 4)], self.parameter_queue.get_updates())
+
+    def test_no_change(self):
+        """
+        Test if nothing is reported once the updates were read.
+        """
+        self.parameter_queue.put(("batch_size", 4))
+        self.parameter_queue.get_updates()
+
+        for _ in range(3):
+            self.assertFalse(self.parameter_queue.has_updates())
+            self.assertListEqual([], self.parameter_queue.get_updates())
+
+    def test_multiple_updates(self):
+        """
+        Test if all the parameters put between two reads are returned in order, including from other processes.
+        """
+        parameters = [("batch_size", 4), ("batch_window", 20), ("batch_size", 8)]
+        for parameter in parameters:
+            self.parameter_queue.put(parameter)
+
+        self.assertListEqual(parameters, self.parameter_queue.get_updates())
+        self.assertFalse(self.parameter_queue.has_updates())
+
+        # The REST process puts the parameters, the processor process reads them.
+        process = Process(target=self.parameter_queue.put, args=(("n_messages", 100),))
+        process.start()
+        process.join()
+
+        self.parameter_queue.put(("n_messages", 200))
+
+        self.assertTrue(self.parameter_queue.has_updates())
+        self.assertListEqual([("n_messages", 100), ("n_messages", 200)], self.parameter_queue.get_updates())
+        self.assertFalse(self.parameter_queue.has_updates())
+
+
+if __name__ == '__main__':
+    unittest.main()
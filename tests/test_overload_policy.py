@@ -0,0 +1,175 @@
+import unittest
+from queue import Queue, Full
+
+import numpy
+
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames
+from mflow_nodes.stream_tools.overload_policy import OverloadPolicy, POLICY_BLOCK, POLICY_DROP_NEWEST, \
+    POLICY_DROP_OLDEST, POLICY_KEEP_EVERY_NTH, POLICY_RATE_CAP
+
+
+def get_frame_message(frame_index, receive_raw=False):
+    header = {"htype": "array-1.0", "type": "uint16", "shape": [2, 2], "frame": frame_index}
+    return get_mflow_message_from_frames(header, [numpy.zeros((2, 2), dtype="uint16").tobytes()],
+                                         receive_raw=receive_raw)
+
+
+def get_series_header_message(receive_raw=False):
+    header = {"htype": "dheader-1.0", "series": 1, "header_detail": "none"}
+    return get_mflow_message_from_frames(header, [b"{}"], receive_raw=receive_raw)
+
+
+def get_queued_frames(data_queue):
+    frame_indexes = []
+    while not data_queue.empty():
+        message = data_queue.get()
+        frame_indexes.append(message.get_frame_index() if message.htype == "array-1.0" else message.htype)
+        data_queue.task_done()
+
+    return frame_indexes
+
+
+class OverloadPolicyTest(unittest.TestCase):
+
+    def test_block(self):
+        policy = OverloadPolicy(POLICY_BLOCK)
+        data_queue = Queue(maxsize=2)
+
+        for frame_index in range(2):
+            policy.put(data_queue, get_frame_message(frame_index), timeout=0.1)
+
+        self.assertRaises(Full, policy.put, data_queue, get_frame_message(2), timeout=0.1)
+
+        # Raw series headers have no frame index: they must not stop the receiver.
+        data_queue = Queue()
+        policy.put(data_queue, get_series_header_message(receive_raw=True))
+        self.assertEqual(data_queue.qsize(), 1)
+
+        statistics = policy.get_statistics()
+        self.assertEqual(statistics["received"], 3)
+        self.assertEqual(statistics["accepted"], 3)
+        self.assertEqual(statistics["dropped"], 0)
+
+    def test_drop_newest(self):
+        policy = OverloadPolicy(POLICY_DROP_NEWEST)
+        data_queue = Queue(maxsize=2)
+
+        for frame_index in range(5):
+            policy.put(data_queue, get_frame_message(frame_index))
+
+        self.assertListEqual(get_queued_frames(data_queue), [0, 1])
+
+        statistics = policy.get_statistics()
+        self.assertEqual(statistics["received"], 5)
+        self.assertEqual(statistics["accepted"], 2)
+        self.assertEqual(statistics["dropped"], 3)
+        self.assertListEqual(statistics["dropped_ranges"], [[2, 4]])
+
+    def test_drop_oldest(self):
+        policy = OverloadPolicy(POLICY_DROP_OLDEST)
+        data_queue = Queue(maxsize=2)
+
+        for frame_index in range(5):
+            policy.put(data_queue, get_frame_message(frame_index))
+
+        self.assertListEqual(get_queued_frames(data_queue), [3, 4])
+
+        statistics = policy.get_statistics()
+        self.assertEqual(statistics["accepted"], 5)
+        self.assertEqual(statistics["dropped"], 3)
+        self.assertListEqual(statistics["dropped_ranges"], [[0, 2]])
+
+    def test_drop_oldest_series_header(self):
+        """
+        Test if the series headers in the data queue are kept, in order, when the oldest frames are dropped.
+        """
+        policy = OverloadPolicy(POLICY_DROP_OLDEST)
+        data_queue = Queue(maxsize=3)
+
+        policy.put(data_queue, get_series_header_message())
+        for frame_index in range(4):
+            policy.put(data_queue, get_frame_message(frame_index))
+
+        self.assertListEqual(get_queued_frames(data_queue), ["dheader-1.0", 2, 3])
+        self.assertListEqual(policy.get_statistics()["dropped_ranges"], [[0, 1]])
+
+        # Without frames to drop, the new frame is dropped.
+        data_queue = Queue(maxsize=1)
+        policy.put(data_queue, get_series_header_message())
+        policy.put(data_queue, get_frame_message(10))
+
+        self.assertListEqual(get_queued_frames(data_queue), ["dheader-1.0"])
+        self.assertListEqual(policy.get_statistics()["dropped_ranges"], [[0, 1], [10, 10]])
+
+    def test_keep_every_nth(self):
+        policy = OverloadPolicy(POLICY_KEEP_EVERY_NTH, keep_every_nth=3)
+        data_queue = Queue()
+
+        policy.put(data_queue, get_series_header_message(receive_raw=True))
+        for frame_index in range(7):
+            policy.put(data_queue, get_frame_message(frame_index, receive_raw=True))
+
+        # The series header is always queued, and does not count as one of the n messages.
+        header_message = data_queue.get()
+        data_queue.task_done()
+        self.assertEqual(header_message.get_header()["htype"], "dheader-1.0")
+        self.assertListEqual(get_queued_frames(data_queue), [0, 3, 6])
+
+        statistics = policy.get_statistics()
+        self.assertEqual(statistics["received"], 8)
+        self.assertEqual(statistics["accepted"], 4)
+        self.assertEqual(statistics["dropped"], 4)
+        self.assertListEqual(statistics["dropped_ranges"], [[1, 2], [4, 5]])
+
+    def test_retry_admitted_message(self):
+        """
+        Test if a message admitted by keep_every_nth, but retried after a queue timeout, is not decided again.
+        """
+        policy = OverloadPolicy(POLICY_KEEP_EVERY_NTH, keep_every_nth=2)
+        data_queue = Queue(maxsize=1)
+
+        policy.put(data_queue, get_frame_message(0), timeout=0.1)
+        policy.put(data_queue, get_frame_message(1), timeout=0.1)
+
+        message = get_frame_message(2)
+        self.assertRaises(Full, policy.put, data_queue, message, timeout=0.1)
+        self.assertRaises(Full, policy.put, data_queue, message, timeout=0.1)
+
+        self.assertListEqual(get_queued_frames(data_queue), [0])
+        policy.put(data_queue, message, timeout=0.1)
+        policy.put(data_queue, get_frame_message(3), timeout=0.1)
+
+        # The cadence is unchanged by the retries.
+        self.assertListEqual(get_queued_frames(data_queue), [2])
+
+        statistics = policy.get_statistics()
+        self.assertEqual(statistics["received"], 4)
+        self.assertEqual(statistics["accepted"], 2)
+        self.assertEqual(statistics["dropped"], 2)
+
+    def test_rate_cap(self):
+        policy = OverloadPolicy(POLICY_RATE_CAP, max_rate=2)
+        data_queue = Queue()
+
+        # Sent in a burst: only the first message fits in the token bucket.
+        for frame_index in range(4):
+            policy.put(data_queue, get_frame_message(frame_index))
+
+        self.assertListEqual(get_queued_frames(data_queue), [0])
+
+        statistics = policy.get_statistics()
+        self.assertEqual(statistics["accepted"], 1)
+        self.assertEqual(statistics["dropped"], 3)
+        self.assertListEqual(statistics["dropped_ranges"], [[1, 3]])
+
+        policy.reset()
+        self.assertEqual(policy.get_statistics()["received"], 0)
+
+    def test_invalid_parameters(self):
+        self.assertRaises(ValueError, OverloadPolicy, "unknown")
+        self.assertRaises(ValueError, OverloadPolicy, POLICY_KEEP_EVERY_NTH)
+        self.assertRaises(ValueError, OverloadPolicy, POLICY_RATE_CAP, max_rate=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
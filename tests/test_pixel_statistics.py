@@ -0,0 +1,78 @@
+import unittest
+
+import numpy
+import zmq
+
+from mflow_nodes.processors.pixel_statistics import PixelStatisticsProcessor, MAP_NAMES
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames, get_passthrough_mflow_message
+
+maps_address = "tcp://127.0.0.1:40000"
+number_of_frames = 20
+
+
+class PixelStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        random_generator = numpy.random.RandomState(0)
+        self.frames = random_generator.randint(0, 1000, size=(number_of_frames, 4, 5)).astype("uint16")
+        self.messages = [get_mflow_message_from_frames({"htype": "array-1.0", "type": "uint16", "shape": [4, 5],
+                                                        "frame": frame_index}, [frame.tobytes()])
+                         for frame_index, frame in enumerate(self.frames)]
+
+        self.processor = PixelStatisticsProcessor()
+
+    def assert_maps(self, maps):
+        numpy.testing.assert_allclose(self.frames.mean(axis=0), maps["mean"])
+        numpy.testing.assert_allclose(self.frames.var(axis=0, ddof=1), maps["variance"])
+        numpy.testing.assert_array_equal(self.frames.min(axis=0), maps["min"])
+        numpy.testing.assert_array_equal(self.frames.max(axis=0), maps["max"])
+
+    def test_per_frame(self):
+        self.processor.start()
+
+        for message in self.messages:
+            self.processor.process_message(message)
+
+        self.assert_maps(self.processor.get_maps())
+        self.assertEqual(number_of_frames, self.processor.get_statistics()["frames"])
+        self.processor.stop()
+
+    def test_batches(self):
+        self.processor.start()
+
+        # Batches of different sizes, the first one starting the maps.
+        for batch_start, batch_end in ((0, 3), (3, 10), (10, 12), (12, 20)):
+            self.processor.process_messages(self.messages[batch_start:batch_end])
+
+        self.assert_maps(self.processor.get_maps())
+        self.processor.stop()
+
+    def test_forward_maps(self):
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        socket.RCVTIMEO = 2000
+        socket.connect(maps_address)
+
+        self.processor.binding_address = maps_address
+        self.processor.start()
+
+        for message in self.messages:
+            self.processor.process_message(message)
+
+        self.processor.set_parameter(("forward_maps", True))
+        self.assertFalse(self.processor.forward_maps, "The trigger should be cleared.")
+
+        maps = {}
+        for _ in MAP_NAMES:
+            message = get_passthrough_mflow_message(socket.recv_multipart(copy=False))
+            maps[message.get_header()["map"]] = message.get_data()
+
+        self.processor.stop()
+        socket.close()
+        context.term()
+
+        self.assert_maps(maps)
+
+
+if __name__ == '__main__':
+    unittest.main()
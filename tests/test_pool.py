@@ -0,0 +1,139 @@
+import json
+import unittest
+from threading import Thread
+from time import sleep, time
+
+import zmq
+
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.processors.pool import ProcessPoolProcessor, get_pool_processors
+from mflow_nodes.processors.proxy import ProxyProcessor, ProxyFunctionProcessor
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames
+
+proxy_address = "tcp://127.0.0.1:40002"
+number_of_frames = 12
+
+
+def get_message(frame_index):
+    header = {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index}
+    return get_mflow_message_from_frames(header, [bytes(64)])
+
+
+def get_series_message(htype, series):
+    return get_mflow_message_from_frames({"htype": htype, "series": series}, [b"{}"] if htype == "dheader-1.0" else [])
+
+
+def even_frames(message):
+    return message.get_frame_index() % 2 == 0
+
+
+class SlowFirstFramesProcessor(BaseProcessor):
+    """
+    The earlier frames take longer, so the workers complete them out of order.
+    """
+    def process_message(self, message):
+        sleep((number_of_frames - message.get_frame_index()) * 0.005)
+
+
+class CollectingProcessor(BaseProcessor):
+    def __init__(self):
+        self.frame_indexes = []
+
+    def process_message(self, message):
+        self.frame_indexes.append(message.get_frame_index() if message.htype == "array-1.0" else message.htype)
+
+    def wait_for(self, n_messages, timeout=5):
+        end_time = time() + timeout
+        while len(self.frame_indexes) < n_messages and time() < end_time:
+            sleep(0.01)
+
+
+class ProcessPoolTest(unittest.TestCase):
+
+    def test_reorder(self):
+        """
+        Test if the messages are passed to the output processor in frame index order.
+        """
+        output_processor = CollectingProcessor()
+        pool = ProcessPoolProcessor(SlowFirstFramesProcessor(), n_workers=3, reorder=True,
+                                    output_processor=output_processor)
+        pool.start()
+
+        for frame_index in range(number_of_frames):
+            pool.process_message(get_message(frame_index))
+
+        pool.stop()
+
+        self.assertListEqual(list(range(number_of_frames)), output_processor.frame_indexes)
+        self.assertEqual(number_of_frames, pool.get_statistics()["total"]["messages"])
+
+    def test_reorder_series(self):
+        """
+        Test if the series ends and the frames of the next series, with restarted frame indexes, do not overtake
+        the frames still being processed.
+        """
+        output_processor = CollectingProcessor()
+        pool = ProcessPoolProcessor(SlowFirstFramesProcessor(), n_workers=3, reorder=True,
+                                    output_processor=output_processor)
+        pool.start()
+
+        expected_messages = []
+        for series in (1, 2):
+            pool.process_message(get_series_message("dheader-1.0", series))
+            for frame_index in range(4):
+                pool.process_message(get_message(frame_index))
+            pool.process_message(get_series_message("dseries_end-1.0", series))
+
+            expected_messages += ["dheader-1.0"] + list(range(4)) + ["dseries_end-1.0"]
+
+        # The results are passed on without waiting for more messages or for the pool to stop.
+        output_processor.wait_for(len(expected_messages))
+        received_messages = list(output_processor.frame_indexes)
+        pool.stop()
+
+        self.assertListEqual(expected_messages, received_messages)
+
+    def test_proxy_in_pool(self):
+        """
+        Test if the proxy function runs in the workers, and the forwarding proxy binds only once.
+        """
+        worker_processor, output_processor = get_pool_processors(ProxyProcessor(proxy_function=even_frames))
+        self.assertIsInstance(worker_processor, ProxyFunctionProcessor)
+
+        pool = ProcessPoolProcessor(worker_processor, n_workers=2, reorder=True, output_processor=output_processor)
+        pool.set_parameter(("binding_address", proxy_address))
+        self.assertEqual(proxy_address, pool.get_parameters()["binding_address"])
+        pool.start()
+
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        socket.RCVTIMEO = 2000
+        socket.connect(proxy_address)
+
+        received_frames = []
+
+        def receive():
+            for _ in range(0, number_of_frames, 2):
+                received_frames.append(json.loads(socket.recv_multipart()[0].decode())["frame"])
+
+        receiving_thread = Thread(target=receive)
+        receiving_thread.start()
+
+        try:
+            for frame_index in range(number_of_frames):
+                pool.process_message(get_message(frame_index))
+
+            self.assertTrue(pool.is_running(), "A pool worker died.")
+        finally:
+            # The last messages are forwarded when the pool stops.
+            pool.stop()
+            receiving_thread.join()
+            socket.close()
+            context.term()
+
+        self.assertListEqual(list(range(0, number_of_frames, 2)), received_frames)
+        self.assertEqual(number_of_frames // 2, pool.get_statistics()["output"]["forwarded"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,20 +1,43 @@
 import json
 import os
+import random
 import unittest
-from time import sleep
+from multiprocessing import Process
+from time import sleep, time
+
+import numpy
+import zmq
 
 from mflow_nodes.processors.proxy import ProxyProcessor
 from mflow_nodes.stream_node import get_processor_function, get_receiver_function
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames
 from mflow_nodes.node_manager import NodeManager
 from mflow_nodes.test_tools.m_generate_test_stream import generate_test_array_stream
 from tests.helpers import setup_file_writing_receiver
 
 proxy_address = "tcp://127.0.0.1:40000"
 writer_address = "tcp://127.0.0.1:40001"
+forward_address = "tcp://127.0.0.1:40003"
 output_filename = "test_proxy_output.txt"
 number_of_frames = 16
 
 
+def run_proxy(processor, parameters):
+    """
+    Run the proxy on the test frames, like the node processor process does.
+    """
+    for parameter in parameters.items():
+        processor.set_parameter(parameter)
+
+    processor.start()
+
+    for frame_index in range(number_of_frames):
+        header = {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index}
+        processor.process_message(get_mflow_message_from_frames(header, [bytes(64)]))
+
+    processor.stop()
+
+
 class ProxyTest(unittest.TestCase):
     def setUp(self):
         # Setup receiving node.
@@ -32,7 +55,8 @@ class ProxyTest(unittest.TestCase):
         initial_parameters = {
             "binding_address": writer_address
         }
-        self.proxy = NodeManager(processor_function=get_processor_function(connection_address=proxy_address, processor=processor),
+        self.proxy = NodeManager(processor_function=get_processor_function(connection_address=proxy_address,
+                                                                           processor=processor),
                                  receiver_function=get_receiver_function(connection_address=proxy_address),
                                  processor_instance=processor,
                                  initial_parameters=initial_parameters)
@@ -65,3 +89,110 @@ class ProxyTest(unittest.TestCase):
         for index, frame_index in enumerate(x for x in range(number_of_frames) if x % 2 == 0):
             # Check if they were transfered in the correct order.
             self.assertEqual(frame_index, test_data[index]["frame"], "Wrong frames were transfered.")
+
+
+def read_forwarded_frames(n_frames, timeout=5):
+    end_time = time() + timeout
+    frame_indexes = []
+
+    while len(frame_indexes) < n_frames and time() < end_time:
+        sleep(0.05)
+        with open(output_filename, 'r') as input_file:
+            frame_indexes = [header["frame"] for header in json.load(input_file)]
+
+    return frame_indexes
+
+
+class ConcurrentProxyTest(unittest.TestCase):
+    def setUp(self):
+        self.receiver = setup_file_writing_receiver(writer_address, output_filename)
+        self.receiver.start()
+
+    def tearDown(self):
+        self.receiver.stop()
+        if os.path.exists(output_filename):
+            os.remove(output_filename)
+
+    def test_concurrent_proxy_function(self):
+        """
+        Test if the frames are forwarded in order, when the proxy function runs concurrently.
+        """
+        def proxy_function(message):
+            # Later frames often finish before the earlier ones.
+            sleep(random.uniform(0, 0.01))
+            return message.get_frame_index() % 2 == 0
+
+        processor = ProxyProcessor(proxy_function=proxy_function)
+        processor.set_parameter(("binding_address", writer_address))
+        processor.set_parameter(("proxy_workers", 4))
+        processor.set_parameter(("max_in_flight", 8))
+        processor.start()
+
+        for frame_index in range(number_of_frames):
+            header = {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index}
+            processor.process_message(get_mflow_message_from_frames(header, [bytes(64)]))
+
+        # The last frames are forwarded without waiting for more messages.
+        forwarded_frames = read_forwarded_frames(number_of_frames // 2)
+
+        statistics = processor.get_statistics()
+        processor.stop()
+
+        self.assertListEqual(list(range(0, number_of_frames, 2)), forwarded_frames)
+        self.assertLessEqual(statistics["max_in_flight"], 8)
+        self.assertGreater(statistics["average_proxy_function_time"], 0)
+
+    def test_statistics_from_another_process(self):
+        """
+        Test if the statistics read in the REST process report the parameters set in the processor process.
+        """
+        def proxy_function(message):
+            sleep(0.01)
+            return True
+
+        processor = ProxyProcessor(proxy_function=proxy_function)
+        processor.set_parameter(("binding_address", writer_address))
+
+        proxy_process = Process(target=run_proxy, args=(processor, {"send_queue_size": 4, "proxy_workers": 2}))
+        proxy_process.start()
+        proxy_process.join()
+
+        statistics = processor.get_statistics()
+        self.assertEqual(number_of_frames, statistics["forwarded"])
+        self.assertEqual(number_of_frames, statistics["send"]["sent"])
+        # The proxy function time is shared by the 2 workers.
+        self.assertGreater(statistics["utilization"], 0)
+        self.assertLessEqual(statistics["utilization"], 1)
+
+    def test_send_queue_borrowed_messages(self):
+        """
+        Test if the messages sent from the background sender are not overwritten when their ring buffer slot is.
+        """
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        socket.RCVTIMEO = 2000
+        socket.connect(forward_address)
+
+        processor = ProxyProcessor(proxy_function=lambda message: True)
+        processor.set_parameter(("binding_address", forward_address))
+        processor.set_parameter(("send_queue_size", number_of_frames))
+        processor.start()
+
+        try:
+            for frame_index in range(number_of_frames):
+                header = {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index}
+                slot_buffer = bytearray(numpy.full((4, 4), frame_index, dtype="int32").tobytes())
+                processor.process_message(get_mflow_message_from_frames(header, [slot_buffer], borrowed=True))
+
+                # The ring buffer slot is written again.
+                slot_buffer[:] = bytes(len(slot_buffer))
+
+            for frame_index in range(number_of_frames):
+                header, data = socket.recv_multipart()
+                self.assertEqual(frame_index, json.loads(header.decode())["frame"])
+                numpy.testing.assert_array_equal(numpy.full((4, 4), frame_index, dtype="int32"),
+                                                 numpy.frombuffer(data, dtype="int32").reshape(4, 4))
+        finally:
+            processor.stop()
+            socket.close()
+            context.term()
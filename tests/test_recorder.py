@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from threading import Thread
+
+import numpy
+import zmq
+
+from mflow_nodes.processors.recorder import RecorderProcessor
+from mflow_nodes.stream_tools.mflow_message import get_passthrough_mflow_message
+from mflow_nodes.stream_tools.stream_recording import StreamRecordingReader
+from mflow_nodes.test_tools.m_replay import replay_stream, get_send_times, REPLAY_FLAT_OUT, REPLAY_RATE
+
+replay_address = "tcp://127.0.0.1:40000"
+number_of_frames = 10
+
+
+class RecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_folder = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.output_folder, "stream.segment")
+
+        self.recorder = RecorderProcessor()
+        self.recorder.output_file = self.output_file
+
+    def tearDown(self):
+        shutil.rmtree(self.output_folder)
+
+    @staticmethod
+    def get_frame_parts(frame_index):
+        header = {"htype": "array-1.0", "type": "uint16", "shape": [4, 8], "frame": frame_index}
+        frame = numpy.full((4, 8), frame_index, dtype="uint16")
+
+        return [json.dumps(header).encode(), frame.tobytes()]
+
+    def record_frames(self):
+        self.recorder.start()
+
+        for frame_index in range(number_of_frames):
+            zmq_frames = [zmq.Frame(part) for part in self.get_frame_parts(frame_index)]
+            self.recorder.process_message(get_passthrough_mflow_message(zmq_frames))
+
+        self.recorder.stop()
+
+    def test_record(self):
+        self.record_frames()
+
+        reader = StreamRecordingReader(self.output_file)
+        self.assertEqual(number_of_frames, len(reader))
+        self.assertListEqual(list(range(number_of_frames)), reader.index["frame"].tolist())
+
+        position = reader.get_position(7)
+        self.assertListEqual(self.get_frame_parts(7), [part.tobytes() for part in reader.read_message(position)])
+        self.assertRaises(ValueError, reader.get_position, number_of_frames)
+
+        # The rate mode spaces the messages evenly.
+        self.assertListEqual([0, 0.5, 1], get_send_times(reader, number_of_frames - 3, REPLAY_RATE, rate=2))
+        reader.close()
+
+    def test_replay(self):
+        self.record_frames()
+
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        socket.RCVTIMEO = 2000
+        socket.connect(replay_address)
+
+        received_parts = []
+
+        def receive(n_messages):
+            for _ in range(n_messages):
+                received_parts.append(socket.recv_multipart())
+
+        start_frame = 6
+        n_loops = 2
+        n_messages = (number_of_frames - start_frame) * n_loops
+
+        receiving_thread = Thread(target=receive, args=(n_messages,))
+        receiving_thread.start()
+
+        self.assertEqual(n_messages, replay_stream(self.output_file, replay_address, mode=REPLAY_FLAT_OUT,
+                                                   start_frame=start_frame, n_loops=n_loops))
+
+        receiving_thread.join()
+        socket.close()
+        context.term()
+
+        expected_parts = [self.get_frame_parts(frame_index) for frame_index in range(start_frame, number_of_frames)]
+        self.assertListEqual(expected_parts * n_loops, received_parts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+
+import numpy
+import zmq
+
+from mflow_nodes.processors.reduction import BinningProcessor, ROIProcessor, SummationProcessor, \
+    ReductionProcessor
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames, get_passthrough_mflow_message
+
+reduced_address = "tcp://127.0.0.1:40000"
+number_of_frames = 6
+
+
+class ReductionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.PULL)
+        self.socket.RCVTIMEO = 2000
+        self.socket.connect(reduced_address)
+
+        self.frames = [numpy.arange(48, dtype="uint16").reshape(6, 8) + frame_index
+                       for frame_index in range(number_of_frames)]
+
+    def tearDown(self):
+        self.socket.close()
+        self.context.term()
+
+    def run_processor(self, processor, parameters, n_expected_messages):
+        """
+        Process the test frames, and return the received reduced messages.
+        """
+        processor.set_parameter(("binding_address", reduced_address))
+        for parameter in parameters.items():
+            processor.set_parameter(parameter)
+
+        processor.start()
+
+        for frame_index, frame in enumerate(self.frames):
+            header = {"htype": "array-1.0", "type": "uint16", "shape": [6, 8], "frame": frame_index}
+            processor.process_message(get_mflow_message_from_frames(header, [frame.tobytes()]))
+
+        messages = [get_passthrough_mflow_message(self.socket.recv_multipart(copy=False))
+                    for _ in range(n_expected_messages)]
+        processor.stop()
+
+        return messages
+
+    def test_pass_through(self):
+        messages = self.run_processor(ReductionProcessor(), {}, number_of_frames)
+
+        for frame_index, (frame, message) in enumerate(zip(self.frames, messages)):
+            self.assertEqual(frame_index, message.get_frame_index())
+            numpy.testing.assert_array_equal(frame, message.get_data())
+
+    def test_binning(self):
+        messages = self.run_processor(BinningProcessor(), {"binning_factor": 4, "binning_mode": "mean"},
+                                      number_of_frames)
+
+        for frame, message in zip(self.frames, messages):
+            expected_frame = frame[:4, :8].reshape(1, 4, 2, 4).mean(axis=(1, 3))
+            numpy.testing.assert_array_equal(expected_frame, message.get_data())
+
+    def test_roi(self):
+        rois = [[0, 2, 0, 3], [3, 6, 4, 8]]
+        messages = self.run_processor(ROIProcessor(), {"rois": rois}, number_of_frames * len(rois))
+
+        for message_index, message in enumerate(messages):
+            frame = self.frames[message_index // len(rois)]
+            y_start, y_stop, x_start, x_stop = rois[message_index % len(rois)]
+
+            self.assertEqual(message_index % len(rois), message.get_header()["roi"])
+            numpy.testing.assert_array_equal(frame[y_start:y_stop, x_start:x_stop], message.get_data())
+
+    def test_summation(self):
+        messages = self.run_processor(SummationProcessor(), {"n_frames": 3}, number_of_frames // 3)
+
+        for summed_index, message in enumerate(messages):
+            expected_frame = numpy.sum(self.frames[summed_index * 3:(summed_index + 1) * 3], axis=0)
+
+            self.assertEqual(summed_index, message.get_frame_index())
+            self.assertEqual(summed_index * 3, message.get_header()["first_frame"])
+            numpy.testing.assert_array_equal(expected_frame, message.get_data())
+
+    def test_summation_series(self):
+        """
+        Test if the series headers and ends are forwarded, and if the partial sum is forwarded at the series end.
+        """
+        processor = SummationProcessor()
+        processor.set_parameter(("binding_address", reduced_address))
+        processor.set_parameter(("n_frames", 4))
+        processor.start()
+
+        for series in (1, 2):
+            processor.process_message(get_mflow_message_from_frames({"htype": "dheader-1.0", "series": series},
+                                                                    [b"{}"]))
+
+            for frame_index, frame in enumerate(self.frames):
+                header = {"htype": "array-1.0", "type": "uint16", "shape": [6, 8], "frame": frame_index}
+                processor.process_message(get_mflow_message_from_frames(header, [frame.tobytes()]))
+
+            processor.process_message(get_mflow_message_from_frames({"htype": "dseries_end-1.0", "series": series},
+                                                                    []))
+
+        messages = [get_passthrough_mflow_message(self.socket.recv_multipart(copy=False)) for _ in range(8)]
+        statistics = processor.get_statistics()
+        processor.stop()
+
+        for series in range(2):
+            header, first_sum, partial_sum, end = messages[series * 4:(series + 1) * 4]
+
+            self.assertEqual("dheader-1.0", header.htype)
+            self.assertEqual("dseries_end-1.0", end.htype)
+
+            self.assertEqual([0, 0, 4], [first_sum.get_frame_index(), first_sum.get_header()["first_frame"],
+                                         first_sum.get_header()["n_frames"]])
+            numpy.testing.assert_array_equal(numpy.sum(self.frames[:4], axis=0), first_sum.get_data())
+
+            # The last frames of the series are not summed with the next series.
+            self.assertEqual([1, 4, 2], [partial_sum.get_frame_index(), partial_sum.get_header()["first_frame"],
+                                         partial_sum.get_header()["n_frames"]])
+            numpy.testing.assert_array_equal(numpy.sum(self.frames[4:], axis=0), partial_sum.get_data())
+
+        self.assertEqual(4, statistics["passed"])
+        self.assertEqual(4, statistics["forwarded"])
+
+
+if __name__ == '__main__':
+    unittest.main()
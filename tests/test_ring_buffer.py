@@ -0,0 +1,144 @@
+import json
+import unittest
+from multiprocessing import Process, Queue
+from queue import Empty
+
+import numpy
+import zmq
+
+from mflow_nodes import config
+from mflow_nodes.node_manager import NodeManager
+from mflow_nodes.stream_tools.mflow_message import copy_borrowed_message, get_passthrough_mflow_message
+from mflow_nodes.stream_tools.ring_buffer import RingBuffer, RingBufferQueue
+
+number_of_frames = 64
+frame_shape = [64, 64]
+
+
+def read_frames(ring_buffer, results_queue):
+    """
+    Read all the frames and report their header frame index and first and last value.
+    """
+    for _ in range(number_of_frames):
+        header, frames, _ = ring_buffer.read(timeout=5)
+        data = numpy.frombuffer(frames[0], dtype=header["type"])
+        results_queue.put((header["frame"], int(data[0]), int(data[-1])))
+        ring_buffer.release()
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def test_write_read(self):
+        """
+        Test if the frames are passed to another process in the correct order, through a smaller buffer.
+        """
+        ring_buffer = RingBuffer(n_slots=4, slot_bytes=numpy.prod(frame_shape) * 4)
+        results_queue = Queue()
+
+        reader = Process(target=read_frames, args=(ring_buffer, results_queue))
+        reader.start()
+
+        for frame_index in range(number_of_frames):
+            data = numpy.full(frame_shape, fill_value=frame_index, dtype="uint32")
+            header = {"htype": "array-1.0", "type": "uint32", "shape": frame_shape, "frame": frame_index}
+            self.assertTrue(ring_buffer.write(header, [data], timeout=5), "Slot not available.")
+
+        results = [results_queue.get(timeout=5) for _ in range(number_of_frames)]
+        reader.join()
+
+        self.assertEqual([(index, index, index) for index in range(number_of_frames)], results)
+        self.assertEqual(ring_buffer.get_statistics()["occupancy"], 0)
+
+    def test_full_buffer(self):
+        """
+        Test if writing to a full buffer times out and if releasing a slot frees it.
+        """
+        ring_buffer = RingBuffer(n_slots=2, slot_bytes=16)
+
+        self.assertTrue(ring_buffer.write({"frame": 0}, [b"0" * 16], timeout=0))
+        self.assertTrue(ring_buffer.write({"frame": 1}, [b"1" * 8, b"2" * 8], timeout=0))
+        self.assertFalse(ring_buffer.write({"frame": 2}, [b"3"], timeout=0))
+
+        header, frames, _ = ring_buffer.read(timeout=0)
+        self.assertEqual(header["frame"], 0)
+        self.assertEqual(frames[0].tobytes(), b"0" * 16)
+        self.assertFalse(frames[0].flags.writeable, "Frames must be read only.")
+
+        ring_buffer.release()
+        self.assertTrue(ring_buffer.write({"frame": 2}, [b"3"], timeout=0))
+
+        header, frames, _ = ring_buffer.read(timeout=0)
+        self.assertEqual([frame.tobytes() for frame in frames], [b"1" * 8, b"2" * 8])
+
+        with self.assertRaises(ValueError):
+            ring_buffer.write({"frame": 3}, [b"4" * 17])
+
+    def test_queue(self):
+        """
+        Test if array-1.0 messages are reconstructed as numpy views on the buffer.
+        """
+        ring_queue = RingBufferQueue(RingBuffer(n_slots=2, slot_bytes=numpy.prod(frame_shape) * 4))
+
+        with self.assertRaises(Empty):
+            ring_queue.get(timeout=0)
+
+        ring_queue.ring_buffer.write({"htype": "array-1.0", "type": "uint32", "shape": frame_shape, "frame": 3},
+                                     [numpy.arange(numpy.prod(frame_shape), dtype="uint32")])
+
+        message = ring_queue.get(timeout=0)
+        self.assertEqual(message.get_frame_index(), 3)
+        self.assertEqual(list(message.get_data().shape), frame_shape)
+        self.assertEqual(message.get_data()[-1, -1], numpy.prod(frame_shape) - 1)
+
+        ring_queue.task_done()
+        self.assertEqual(ring_queue.ring_buffer.get_statistics()["occupancy"], 0)
+
+    def test_copy_borrowed_message(self):
+        """
+        Test if the copy of a message keeps its frame after the slot is released and written again.
+        """
+        ring_queue = RingBufferQueue(RingBuffer(n_slots=1, slot_bytes=numpy.prod(frame_shape) * 4))
+        header = {"htype": "array-1.0", "type": "uint32", "shape": frame_shape}
+
+        ring_queue.ring_buffer.write(dict(header, frame=0), [numpy.zeros(frame_shape, dtype="uint32")])
+        message = copy_borrowed_message(ring_queue.get(timeout=0))
+        ring_queue.task_done()
+
+        ring_queue.ring_buffer.write(dict(header, frame=1), [numpy.ones(frame_shape, dtype="uint32")])
+
+        self.assertEqual(message.get_frame_index(), 0)
+        self.assertEqual(message.get_array().sum(), 0)
+        self.assertIs(message, copy_borrowed_message(message), "Only borrowed messages have to be copied.")
+
+    def test_queue_passthrough(self):
+        """
+        Test if the messages decoded from several parts are passed as received, and decoded again by the reader.
+        """
+        # The slot holds also the json parts.
+        ring_queue = RingBufferQueue(RingBuffer(n_slots=2, slot_bytes=numpy.prod(frame_shape) * 4 + 1024))
+
+        frame = numpy.arange(numpy.prod(frame_shape), dtype="uint32").reshape(frame_shape)
+        part_2 = {"htype": "dimage_d-1.0", "shape": frame_shape[::-1], "type": "uint32", "encoding": "<"}
+        zmq_frames = [zmq.Frame(json.dumps({"htype": "dimage-1.0", "series": 1, "frame": 5}).encode()),
+                      zmq.Frame(json.dumps(part_2).encode()), zmq.Frame(frame.tobytes()),
+                      zmq.Frame(json.dumps({"htype": "dconfig-1.0"}).encode())]
+
+        ring_queue.put(get_passthrough_mflow_message(zmq_frames), timeout=0)
+
+        message = ring_queue.get(timeout=0)
+        self.assertEqual("dimage-1.0", message.htype)
+        self.assertEqual(5, message.get_frame_index())
+        numpy.testing.assert_array_equal(frame, message.get_data())
+        ring_queue.task_done()
+
+    def test_node_manager_mode(self):
+        """
+        Test if the ring buffer hand-off is rejected for the messages decoded by mflow.
+        """
+        with self.assertRaises(ValueError):
+            NodeManager(processor_function=None, receiver_function=None, handoff=config.HANDOFF_RING_BUFFER)
+
+        for mode in ({"receive_raw": True}, {"passthrough": True}):
+            node_manager = NodeManager(processor_function=None, receiver_function=None,
+                                       handoff=config.HANDOFF_RING_BUFFER, **mode)
+            self.assertEqual(config.HANDOFF_RING_BUFFER, node_manager.handoff)
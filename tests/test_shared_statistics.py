@@ -0,0 +1,51 @@
+import unittest
+from multiprocessing import Process
+from types import SimpleNamespace
+
+from mflow_nodes.stream_tools.shared_statistics import SharedStatisticsBuffer, SharedCounters
+
+number_of_messages = 50
+buffer_length = 16
+
+
+def save_statistics(statistics_buffer, counters):
+    for message_index in range(number_of_messages):
+        statistics_buffer.save_statistics(SimpleNamespace(messages_received=message_index + 1,
+                                                          total_bytes_received=(message_index + 1) * 1000))
+        counters.add("messages", row=1)
+
+
+class SharedStatisticsTest(unittest.TestCase):
+
+    def test_statistics_from_child_process(self):
+        """
+        Test if the statistics saved by a child process are visible to the parent.
+        """
+        statistics_buffer = SharedStatisticsBuffer(buffer_length)
+        counters = SharedCounters(["messages"], n_rows=2)
+
+        writer = Process(target=save_statistics, args=(statistics_buffer, counters))
+        writer.start()
+        writer.join()
+
+        records = statistics_buffer.get_statistics_raw()
+        self.assertEqual(buffer_length, len(records), "Ring should hold only the last records.")
+        self.assertEqual(list(range(number_of_messages - buffer_length + 1, number_of_messages + 1)),
+                         [record["messages_processed"] for record in records])
+
+        statistics = statistics_buffer.get_statistics()
+        self.assertEqual(number_of_messages, statistics["messages_processed"])
+        self.assertEqual(number_of_messages * 1000, statistics["total_bytes_received"])
+
+        self.assertEqual(number_of_messages, counters.get("messages", row=1))
+        self.assertEqual(number_of_messages, counters.get_totals()["messages"])
+
+    def test_reset(self):
+        statistics_buffer = SharedStatisticsBuffer(buffer_length)
+        self.assertEqual({}, statistics_buffer.get_statistics())
+
+        statistics_buffer.save_statistics(None)
+        self.assertEqual(1, len(statistics_buffer.get_statistics_raw()))
+
+        statistics_buffer.reset()
+        self.assertEqual([], statistics_buffer.get_statistics_raw())
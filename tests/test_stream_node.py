@@ -0,0 +1,116 @@
+import unittest
+from queue import Queue
+from threading import Event, Thread
+from time import sleep
+
+from mflow_nodes import config
+from mflow_nodes.node_manager import ParameterQueue
+from mflow_nodes.processors.base import BaseProcessor
+from mflow_nodes.stream_node import get_processor_function
+from mflow_nodes.stream_tools.mflow_message import get_mflow_message_from_frames, ReceiveStatistics
+from mflow_nodes.stream_tools.shared_statistics import SharedStatisticsBuffer
+
+
+def get_message(frame_index):
+    header = {"htype": "array-1.0", "type": "int32", "shape": [4, 4], "frame": frame_index}
+    return get_mflow_message_from_frames(header, [bytes(64)], ReceiveStatistics())
+
+
+class BatchRecordingProcessor(BaseProcessor):
+    def __init__(self):
+        self.batches = []
+
+    def process_messages(self, messages):
+        self.batches.append([message.get_frame_index() for message in messages])
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.processor = BatchRecordingProcessor()
+        self.data_queue = Queue()
+        self.running_event = Event()
+        self.parameter_queue = ParameterQueue()
+        self.processor_thread = None
+
+    def tearDown(self):
+        self.stop_processor()
+
+    def start_processor(self, batch_size, batch_window, n_messages=None):
+        self.parameter_queue.put((config.PARAMETER_BATCH_SIZE, batch_size))
+        self.parameter_queue.put((config.PARAMETER_BATCH_WINDOW, batch_window))
+        if n_messages:
+            self.parameter_queue.put((config.PARAMETER_N_MESSAGES, n_messages))
+
+        processor_function = get_processor_function(self.processor, connection_address=None)
+        self.processor_thread = Thread(target=processor_function,
+                                       args=(self.running_event, SharedStatisticsBuffer(100), self.parameter_queue,
+                                             self.data_queue))
+        self.processor_thread.start()
+
+    def stop_processor(self):
+        if self.processor_thread is not None:
+            self.running_event.clear()
+            self.processor_thread.join()
+            self.processor_thread = None
+
+    def put_messages(self, frame_indexes):
+        for frame_index in frame_indexes:
+            self.data_queue.put(get_message(frame_index))
+
+    def test_batch_size(self):
+        """
+        Test if the batches are limited to batch_size, and the last one to the messages left to reach n_messages.
+        """
+        self.put_messages(range(12))
+        self.start_processor(batch_size=4, batch_window=1000, n_messages=10)
+
+        # The node stops by itself once it processed n_messages.
+        self.processor_thread.join(5)
+        self.assertFalse(self.processor_thread.is_alive())
+
+        self.assertListEqual([[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]], self.processor.batches)
+        self.assertEqual(2, self.data_queue.qsize())
+
+    def test_batch_window(self):
+        """
+        Test if a batch is closed once the window after its first message expired, even if it is not full.
+        """
+        self.start_processor(batch_size=100, batch_window=50)
+
+        self.put_messages(range(3))
+        sleep(0.3)
+        self.put_messages(range(3, 5))
+        sleep(0.3)
+
+        self.stop_processor()
+
+        self.assertListEqual([[0, 1, 2], [3, 4]], self.processor.batches)
+
+    def test_partial_batch_at_end(self):
+        """
+        Test if the messages at the end of the stream, fewer than batch_size, are processed after the window.
+        """
+        self.put_messages(range(6))
+        self.start_processor(batch_size=4, batch_window=50)
+        sleep(0.3)
+
+        self.stop_processor()
+
+        self.assertListEqual([[0, 1, 2, 3], [4, 5]], self.processor.batches)
+
+    def test_process_messages(self):
+        """
+        Test if the default process_messages processes the batch one message at the time, in order.
+        """
+        frame_indexes = []
+        processor = BaseProcessor()
+        processor.process_message = lambda message: frame_indexes.append(message.get_frame_index())
+
+        processor.process_messages([get_message(frame_index) for frame_index in range(5)])
+
+        self.assertListEqual(list(range(5)), frame_indexes)
+
+
+if __name__ == '__main__':
+    unittest.main()